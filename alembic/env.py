@@ -39,6 +39,8 @@ def do_run_migrations(connection: Connection) -> None:
         connection=connection,
         target_metadata=target_metadata,
         compare_type=True,
+        # каждая миграция — своя транзакция: онлайн-шаги app.migrations коммитят её посреди миграции
+        transaction_per_migration=True,
     )
 
     with context.begin_transaction():
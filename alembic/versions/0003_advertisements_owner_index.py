@@ -0,0 +1,26 @@
+# Индекс по владельцу объявления:
+# - ON DELETE SET NULL при удалении пользователя больше не делает seq scan по advertisements
+# - "мои объявления" (GET /user/{user_id}/advertisement) отдаются index scan-ом с keyset-пагинацией
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_advertisements_owner_created",
+        "advertisements",
+        ["owner_id", sa.text("created_at DESC"), sa.text("id DESC")],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_advertisements_owner_created", table_name="advertisements")
@@ -0,0 +1,122 @@
+# Переводим advertisements на декларативное партиционирование по created_at (помесячно).
+#
+# - PRIMARY KEY становится (id, created_at): ключ партиционирования обязан входить в PK
+# - партиции создаются на весь диапазон существующих данных + 3 месяца вперёд,
+#   дальше их досоздаёт app.partitions.ensure_partitions (фоновая задача в lifespan)
+# - DEFAULT-партицию НЕ создаём: с ней нельзя делать DETACH PARTITION ... CONCURRENTLY
+#
+# ВАЖНО: миграция копирует таблицу целиком под ACCESS EXCLUSIVE — запускать в окно обслуживания.
+
+from __future__ import annotations
+
+from alembic import op
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+INDEXES = (
+    "CREATE INDEX ix_advertisements_title ON advertisements (title)",
+    "CREATE INDEX ix_advertisements_author ON advertisements (author)",
+    "CREATE INDEX ix_advertisements_price ON advertisements (price)",
+    "CREATE INDEX ix_advertisements_created_at ON advertisements (created_at)",
+    "CREATE INDEX ix_advertisements_owner_created ON advertisements (owner_id, created_at DESC, id DESC)",
+)
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE advertisements DROP CONSTRAINT fk_advertisements_owner_id_users")
+    op.execute("ALTER TABLE advertisements RENAME TO advertisements_old")
+    op.execute("ALTER TABLE advertisements_old RENAME CONSTRAINT advertisements_pkey TO advertisements_old_pkey")
+    for name in ("title", "author", "price", "created_at", "owner_created"):
+        op.execute(f"DROP INDEX ix_advertisements_{name}")
+
+    op.execute(
+        """
+        CREATE TABLE advertisements (
+            id integer NOT NULL DEFAULT nextval('advertisements_id_seq'::regclass),
+            title varchar(255) NOT NULL,
+            description text NOT NULL,
+            price numeric(12, 2) NOT NULL,
+            author varchar(120) NOT NULL,
+            created_at timestamptz NOT NULL DEFAULT now(),
+            owner_id integer,
+            CONSTRAINT advertisements_pkey PRIMARY KEY (id, created_at),
+            CONSTRAINT fk_advertisements_owner_id_users
+                FOREIGN KEY (owner_id) REFERENCES users (id) ON DELETE SET NULL
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    # sequence должна пережить DROP старой таблицы
+    op.execute("ALTER SEQUENCE advertisements_id_seq OWNED BY advertisements.id")
+
+    # партиции: от месяца самой старой записи (или текущего) до текущего + 3
+    op.execute(
+        """
+        DO $$
+        DECLARE
+            m date := date_trunc('month', coalesce(
+                (SELECT min(created_at) FROM advertisements_old), now()
+            ) AT TIME ZONE 'UTC')::date;
+            last date := (date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months')::date;
+        BEGIN
+            WHILE m <= last LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF advertisements FOR VALUES FROM (%L) TO (%L)',
+                    'advertisements_p' || to_char(m, 'YYYYMM'),
+                    m::text || ' 00:00:00+00',
+                    (m + interval '1 month')::date::text || ' 00:00:00+00'
+                );
+                m := (m + interval '1 month')::date;
+            END LOOP;
+        END $$
+        """
+    )
+
+    op.execute(
+        "INSERT INTO advertisements (id, title, description, price, author, created_at, owner_id) "
+        "SELECT id, title, description, price, author, created_at, owner_id FROM advertisements_old"
+    )
+    op.execute("DROP TABLE advertisements_old")
+
+    # индексы строим после заливки данных — так быстрее; на партиции они распространяются сами
+    for stmt in INDEXES:
+        op.execute(stmt)
+    op.execute("ANALYZE advertisements")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE advertisements DROP CONSTRAINT fk_advertisements_owner_id_users")
+    op.execute("ALTER TABLE advertisements RENAME TO advertisements_part")
+    op.execute("ALTER TABLE advertisements_part RENAME CONSTRAINT advertisements_pkey TO advertisements_part_pkey")
+    for name in ("title", "author", "price", "created_at", "owner_created"):
+        op.execute(f"DROP INDEX ix_advertisements_{name}")
+
+    op.execute(
+        """
+        CREATE TABLE advertisements (
+            id integer NOT NULL DEFAULT nextval('advertisements_id_seq'::regclass),
+            title varchar(255) NOT NULL,
+            description text NOT NULL,
+            price numeric(12, 2) NOT NULL,
+            author varchar(120) NOT NULL,
+            created_at timestamptz NOT NULL DEFAULT now(),
+            owner_id integer,
+            CONSTRAINT advertisements_pkey PRIMARY KEY (id),
+            CONSTRAINT fk_advertisements_owner_id_users
+                FOREIGN KEY (owner_id) REFERENCES users (id) ON DELETE SET NULL
+        )
+        """
+    )
+    op.execute("ALTER SEQUENCE advertisements_id_seq OWNED BY advertisements.id")
+    op.execute(
+        "INSERT INTO advertisements (id, title, description, price, author, created_at, owner_id) "
+        "SELECT id, title, description, price, author, created_at, owner_id FROM advertisements_part"
+    )
+    # DROP родителя удаляет и все его партиции
+    op.execute("DROP TABLE advertisements_part")
+    for stmt in INDEXES:
+        op.execute(stmt)
@@ -0,0 +1,48 @@
+# Индексы под реальные формы запросов AdvertisementCRUD.search:
+# - сортировка всегда ORDER BY created_at DESC, id DESC       -> (created_at DESC, id DESC)
+# - "цена в диапазоне, новые сверху"                         -> (price, created_at DESC)
+# - диапазоны created_from/created_to по всей истории         -> BRIN (created_at), почти бесплатный по размеру
+# - title/description/author/q — это ILIKE '%...%'            -> trigram GIN (pg_trgm); btree тут бесполезен
+#
+# Одноколоночные ix_advertisements_created_at и ix_advertisements_price заменяются составными
+# (их ведущие колонки покрывают те же запросы).
+# Регрессии планов ловит tests/test_query_plans.py.
+
+from __future__ import annotations
+
+from alembic import op
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # pg_trgm — trusted extension (PG13+), владелец БД может создать его без superuser
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    op.drop_index("ix_advertisements_created_at", table_name="advertisements")
+    op.drop_index("ix_advertisements_price", table_name="advertisements")
+
+    op.execute("CREATE INDEX ix_advertisements_created_id ON advertisements (created_at DESC, id DESC)")
+    op.execute("CREATE INDEX ix_advertisements_price_created ON advertisements (price, created_at DESC)")
+    op.execute("CREATE INDEX ix_advertisements_created_brin ON advertisements USING brin (created_at)")
+
+    for column in ("title", "description", "author"):
+        op.execute(
+            f"CREATE INDEX ix_advertisements_{column}_trgm ON advertisements USING gin ({column} gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    for column in ("author", "description", "title"):
+        op.drop_index(f"ix_advertisements_{column}_trgm", table_name="advertisements")
+
+    op.drop_index("ix_advertisements_created_brin", table_name="advertisements")
+    op.drop_index("ix_advertisements_price_created", table_name="advertisements")
+    op.drop_index("ix_advertisements_created_id", table_name="advertisements")
+
+    op.create_index("ix_advertisements_price", "advertisements", ["price"])
+    op.create_index("ix_advertisements_created_at", "advertisements", ["created_at"])
@@ -0,0 +1,54 @@
+# Сохранённые поиски и "входящие" с совпадениями (перколятор — app/percolator.py)
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "saved_searches",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("name", sa.String(length=100), nullable=False),
+        sa.Column("title", sa.String(length=255), nullable=True),
+        sa.Column("description", sa.String(length=255), nullable=True),
+        sa.Column("author", sa.String(length=120), nullable=True),
+        sa.Column("q", sa.String(length=255), nullable=True),
+        sa.Column("price_from", sa.Numeric(12, 2), nullable=True),
+        sa.Column("price_to", sa.Numeric(12, 2), nullable=True),
+        sa.Column("created_from", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("created_to", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+    )
+    op.create_index("ix_saved_searches_user_id", "saved_searches", ["user_id"])
+
+    op.create_table(
+        "search_inbox",
+        sa.Column("id", sa.BigInteger(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column(
+            "saved_search_id",
+            sa.Integer(),
+            sa.ForeignKey("saved_searches.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("advertisement_id", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.UniqueConstraint("saved_search_id", "advertisement_id", name="uq_search_inbox_search_ad"),
+    )
+    op.execute("CREATE INDEX ix_search_inbox_user_id ON search_inbox (user_id, id DESC)")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_search_inbox_user_id", table_name="search_inbox")
+    op.drop_table("search_inbox")
+    op.drop_index("ix_saved_searches_user_id", table_name="saved_searches")
+    op.drop_table("saved_searches")
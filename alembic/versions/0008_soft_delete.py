@@ -0,0 +1,76 @@
+# Мягкое удаление и срок жизни объявлений:
+# - deleted_at / expires_at (nullable, без DEFAULT — ALTER без переписывания таблицы)
+# - индексы поиска становятся частичными WHERE deleted_at IS NULL: удалённые строки,
+#   ждущие purge, не раздувают их
+# - маленькие частичные индексы под очереди purge (deleted_at / expires_at)
+# - archive.advertisements_purged — куда purge переносит строки при PURGE_ARCHIVE=1
+#
+# ix_advertisements_owner_created остаётся полным: он обслуживает ON DELETE SET NULL.
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("advertisements", sa.Column("deleted_at", sa.DateTime(timezone=True), nullable=True))
+    op.add_column("advertisements", sa.Column("expires_at", sa.DateTime(timezone=True), nullable=True))
+
+    op.drop_index("ix_advertisements_created_id", table_name="advertisements")
+    op.drop_index("ix_advertisements_price_created", table_name="advertisements")
+    op.execute(
+        "CREATE INDEX ix_advertisements_created_id ON advertisements (created_at DESC, id DESC) "
+        "WHERE deleted_at IS NULL"
+    )
+    op.execute(
+        "CREATE INDEX ix_advertisements_price_created ON advertisements (price, created_at DESC) "
+        "WHERE deleted_at IS NULL"
+    )
+
+    op.execute("CREATE INDEX ix_advertisements_deleted_at ON advertisements (deleted_at) WHERE deleted_at IS NOT NULL")
+    op.execute(
+        "CREATE INDEX ix_advertisements_expires_at ON advertisements (expires_at) "
+        "WHERE expires_at IS NOT NULL AND deleted_at IS NULL"
+    )
+
+    op.execute("CREATE SCHEMA IF NOT EXISTS archive")
+    op.create_table(
+        "advertisements_purged",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("title", sa.String(length=255), nullable=False),
+        sa.Column("description", sa.Text(), nullable=False),
+        sa.Column("price", sa.Numeric(12, 2), nullable=False),
+        sa.Column("author", sa.String(length=100), nullable=False),
+        sa.Column("owner_id", sa.Integer(), nullable=True),
+        sa.Column("deleted_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("purged_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("id", "created_at"),
+        schema="archive",
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("advertisements_purged", schema="archive")
+
+    op.drop_index("ix_advertisements_expires_at", table_name="advertisements")
+    op.drop_index("ix_advertisements_deleted_at", table_name="advertisements")
+
+    # до 0008 удалённых строк не было — вычищаем, иначе они "оживут"
+    op.execute("DELETE FROM advertisements WHERE deleted_at IS NOT NULL")
+
+    op.drop_index("ix_advertisements_price_created", table_name="advertisements")
+    op.drop_index("ix_advertisements_created_id", table_name="advertisements")
+    op.execute("CREATE INDEX ix_advertisements_created_id ON advertisements (created_at DESC, id DESC)")
+    op.execute("CREATE INDEX ix_advertisements_price_created ON advertisements (price, created_at DESC)")
+
+    op.drop_column("advertisements", "expires_at")
+    op.drop_column("advertisements", "deleted_at")
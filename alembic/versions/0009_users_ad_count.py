@@ -0,0 +1,29 @@
+# Денормализованный счётчик объявлений пользователя: users.ad_count
+# (неудалённые объявления, deleted_at IS NULL). Дальше его поддерживает AdvertisementCRUD,
+# сверка — `python -m app.counters reconcile`.
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # константный DEFAULT — ADD COLUMN без переписывания таблицы (PG11+)
+    op.add_column("users", sa.Column("ad_count", sa.Integer(), server_default="0", nullable=False))
+    op.execute(
+        "UPDATE users u SET ad_count = c.n "
+        "FROM (SELECT owner_id, count(*) AS n FROM advertisements "
+        "      WHERE deleted_at IS NULL AND owner_id IS NOT NULL GROUP BY owner_id) c "
+        "WHERE c.owner_id = u.id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("users", "ad_count")
@@ -0,0 +1,55 @@
+# Статистика цен по дням и авторам (app/rollups.py):
+# - advertisements.updated_at + индекс: по нему находим изменённые с последнего водяного знака строки
+# - advertisement_stats_daily — сама сводка, rollup_watermarks — водяные знаки
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # now() — STABLE: значение вычисляется один раз, ADD COLUMN без переписывания таблицы (PG11+).
+    # Все существующие строки получают время миграции — первый пересчёт обработает их все.
+    op.add_column(
+        "advertisements",
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+    )
+    op.execute("CREATE INDEX ix_advertisements_updated_at ON advertisements (updated_at)")
+
+    op.create_table(
+        "advertisement_stats_daily",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("author", sa.String(length=100), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.Column("price_min", sa.Numeric(12, 2), nullable=False),
+        sa.Column("price_max", sa.Numeric(12, 2), nullable=False),
+        sa.Column("price_avg", sa.Numeric(14, 4), nullable=False),
+        sa.Column("price_p50", sa.Numeric(14, 4), nullable=False),
+        sa.Column("price_p90", sa.Numeric(14, 4), nullable=False),
+        sa.Column("refreshed_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("day", "author"),
+    )
+    op.create_index(
+        "ix_advertisement_stats_daily_author_day", "advertisement_stats_daily", ["author", "day"]
+    )
+
+    op.create_table(
+        "rollup_watermarks",
+        sa.Column("name", sa.String(length=64), primary_key=True),
+        sa.Column("value", sa.DateTime(timezone=True), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("rollup_watermarks")
+    op.drop_index("ix_advertisement_stats_daily_author_day", table_name="advertisement_stats_daily")
+    op.drop_table("advertisement_stats_daily")
+    op.drop_index("ix_advertisements_updated_at", table_name="advertisements")
+    op.drop_column("advertisements", "updated_at")
@@ -0,0 +1,24 @@
+# Префиксный индекс для автодополнения GET /advertisement/suggest (app/suggest.py):
+# lower(title) с text_pattern_ops — побайтовое сравнение, диапазон "начинается с" работает
+# при любой collation БД. Частичный, как и остальные индексы поиска (только неудалённые).
+
+from __future__ import annotations
+
+from alembic import op
+
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "CREATE INDEX ix_advertisements_title_lower_prefix ON advertisements "
+        "(lower(title) text_pattern_ops) WHERE deleted_at IS NULL"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_advertisements_title_lower_prefix", table_name="advertisements")
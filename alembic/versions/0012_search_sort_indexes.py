@@ -0,0 +1,21 @@
+# Индекс под сортировки поиска по цене (sort=price_asc|price_desc) с keyset-курсором (price, id).
+# price_desc читает тот же индекс в обратном порядке. newest/oldest обслуживает
+# ix_advertisements_created_id. Частичный — как и остальные индексы поиска.
+
+from __future__ import annotations
+
+from alembic import op
+
+
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE INDEX ix_advertisements_price_id ON advertisements (price, id) WHERE deleted_at IS NULL")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_advertisements_price_id", table_name="advertisements")
@@ -0,0 +1,34 @@
+# Журнал аудита изменений пользователей и объявлений (app/audit.py)
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0013"
+down_revision = "0012"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "audit_log",
+        sa.Column("id", sa.BigInteger(), primary_key=True),
+        sa.Column("occurred_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("actor_id", sa.Integer(), nullable=True),
+        sa.Column("action", sa.String(length=64), nullable=False),
+        sa.Column("entity", sa.String(length=32), nullable=False),
+        sa.Column("entity_id", sa.Integer(), nullable=False),
+        sa.Column("changes", postgresql.JSONB(), nullable=False),
+    )
+    op.execute("CREATE INDEX ix_audit_log_entity ON audit_log (entity, entity_id, id DESC)")
+    op.execute("CREATE INDEX ix_audit_log_actor ON audit_log (actor_id, id DESC)")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_audit_log_actor", table_name="audit_log")
+    op.drop_index("ix_audit_log_entity", table_name="audit_log")
+    op.drop_table("audit_log")
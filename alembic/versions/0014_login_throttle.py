@@ -0,0 +1,29 @@
+# Состояние ограничения попыток входа (LOGIN_THROTTLE_BACKEND=db): token bucket-ы и паузы после неудач.
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0014"
+down_revision = "0013"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "login_throttle",
+        sa.Column("key", sa.String(length=300), primary_key=True),
+        sa.Column("tokens", sa.Float(), nullable=True),
+        sa.Column("failures", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("locked_until", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_login_throttle_updated_at", "login_throttle", ["updated_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_login_throttle_updated_at", table_name="login_throttle")
+    op.drop_table("login_throttle")
@@ -0,0 +1,23 @@
+# Справочник пользователей GET /user: поиск по началу имени и фильтр по группе с keyset-пагинацией.
+# username COLLATE "C" — побайтовый порядок: индекс отдаёт и диапазон "начинается с",
+# и ORDER BY username COLLATE "C" (text_pattern_ops годится только для диапазона).
+
+from __future__ import annotations
+
+from alembic import op
+
+
+revision = "0015"
+down_revision = "0014"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute('CREATE INDEX ix_users_username_c ON users (username COLLATE "C")')
+    op.execute('CREATE INDEX ix_users_group_id ON users ("group", id)')
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_group_id", table_name="users")
+    op.drop_index("ix_users_username_c", table_name="users")
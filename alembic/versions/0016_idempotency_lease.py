@@ -0,0 +1,23 @@
+# Аренда захвата Idempotency-Key (IDEMPOTENCY_BACKEND=db): незавершённый захват держится до
+# locked_until, а не весь TTL ответа — ключ, брошенный умершим воркером, перехватывает повтор.
+# Уже висящие захваты (response IS NULL) отпускаем сразу.
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0016"
+down_revision = "0015"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("idempotency_keys", sa.Column("locked_until", sa.DateTime(timezone=True), nullable=True))
+    op.execute("UPDATE idempotency_keys SET locked_until = now() WHERE response IS NULL")
+
+
+def downgrade() -> None:
+    op.drop_column("idempotency_keys", "locked_until")
@@ -0,0 +1,36 @@
+# archive.advertisements_purged.author — varchar(120), как advertisements.author (0001) и схема API.
+# С varchar(100) архивная вставка падала на авторе длиной 101–120, и purge бесконечно повторял
+# одну и ту же (самую старую) пачку. Увеличение длины varchar — без переписывания таблицы.
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0017"
+down_revision = "0016"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.alter_column(
+        "advertisements_purged",
+        "author",
+        type_=sa.String(length=120),
+        existing_type=sa.String(length=100),
+        existing_nullable=False,
+        schema="archive",
+    )
+
+
+def downgrade() -> None:
+    op.alter_column(
+        "advertisements_purged",
+        "author",
+        type_=sa.String(length=100),
+        existing_type=sa.String(length=120),
+        existing_nullable=False,
+        schema="archive",
+    )
@@ -0,0 +1,35 @@
+# advertisement_stats_daily.author — varchar(120), как advertisements.author.
+# С varchar(100) один автор длиной 101–120 ронял recompute_days для всей пачки дней,
+# водяной знак сводки не сдвигался и /advertisement/stats переставал обновляться.
+# Увеличение длины varchar — без переписывания таблицы и перестроения индексов.
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0018"
+down_revision = "0017"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.alter_column(
+        "advertisement_stats_daily",
+        "author",
+        type_=sa.String(length=120),
+        existing_type=sa.String(length=100),
+        existing_nullable=False,
+    )
+
+
+def downgrade() -> None:
+    op.alter_column(
+        "advertisement_stats_daily",
+        "author",
+        type_=sa.String(length=100),
+        existing_type=sa.String(length=120),
+        existing_nullable=False,
+    )
@@ -0,0 +1,36 @@
+# Автодополнение: индекс lower(title) COLLATE "C" вместо lower(title) text_pattern_ops (0011).
+# text_pattern_ops годится только для диапазона "начинается с": ORDER BY lower(title) идёт
+# в collation БД, и на популярном коротком префиксе планировщик сортировал все совпадения
+# ради первых limit. С COLLATE "C" индекс отдаёт и диапазон, и GROUP BY/ORDER BY по тому же
+# выражению (как ix_users_username_c в 0015) — скан останавливается на limit.
+# Индекс строится онлайн (app/migrations.py), старый удаляется после.
+
+from __future__ import annotations
+
+from app.migrations import create_index_concurrently, drop_index_concurrently
+
+
+revision = "0019"
+down_revision = "0018"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    create_index_concurrently(
+        "ix_advertisements_title_lower_c",
+        "advertisements",
+        ['(lower(title) COLLATE "C")'],
+        where="deleted_at IS NULL",
+    )
+    drop_index_concurrently("ix_advertisements_title_lower_prefix")
+
+
+def downgrade() -> None:
+    create_index_concurrently(
+        "ix_advertisements_title_lower_prefix",
+        "advertisements",
+        ["lower(title) text_pattern_ops"],
+        where="deleted_at IS NULL",
+    )
+    drop_index_concurrently("ix_advertisements_title_lower_c")
@@ -0,0 +1,187 @@
+# Журнал аудита изменений пользователей и объявлений ("кто что изменил").
+#
+# Запись в audit_log прямо в транзакции PATCH/DELETE добавила бы запросу задержку и блокировки,
+# поэтому обработчики только кладут событие в ограниченную очередь процесса (record() — без await),
+# а фоновый писатель из lifespan сбрасывает её пачками (multi-row INSERT):
+# как только набралось AUDIT_BATCH_SIZE событий или прошло AUDIT_FLUSH_INTERVAL_MS с первого в пачке.
+#
+# Переполнение очереди (БД недоступна/медленная) не тормозит запросы, а теряет события по политике
+# AUDIT_OVERFLOW: drop_newest — отбрасываем новое, drop_oldest — вытесняем самое старое.
+# Потери и ошибки записи видны в GET /admin/metrics ("audit"). На shutdown очередь дописывается.
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+
+from app.config import get_settings
+from app.crud import AuditLogCRUD
+from app.db import get_sessionmaker
+
+logger = logging.getLogger(__name__)
+
+# значения этих полей в журнал не пишем
+REDACTED_FIELDS = frozenset({"password", "password_hash"})
+
+
+def redact(changes: dict) -> dict:
+    return {key: ("***" if key in REDACTED_FIELDS else value) for key, value in changes.items()}
+
+
+class AuditWriter:
+    def __init__(self, *, queue_size: int, batch_size: int, flush_interval_ms: float, overflow: str = "drop_newest"):
+        if overflow not in ("drop_newest", "drop_oldest"):
+            raise ValueError(f"unknown audit overflow policy: {overflow}")
+        self.batch_size = max(batch_size, 1)
+        self.flush_interval = flush_interval_ms / 1000
+        self.overflow = overflow
+
+        self._queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=max(queue_size, 1))
+        self._task: asyncio.Task | None = None
+        self._collecting: list[dict] = []  # пачка, которая сейчас набирается
+        self._writing: asyncio.Task | None = None
+        self._closing = False
+
+        # метрики (GET /admin/metrics)
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0  # потеряно из-за переполнения очереди
+        self.failed = 0  # потеряно из-за ошибок записи
+        self.high_watermark = 0  # максимальная длина очереди
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def record(
+        self,
+        *,
+        action: str,
+        entity: str,
+        entity_id: int,
+        actor_id: int | None,
+        changes: dict | None = None,
+    ) -> bool:
+        """Кладёт событие в очередь, не дожидаясь записи. False — событие потеряно (переполнение/shutdown)."""
+        if self._closing:
+            self.dropped += 1
+            return False
+        entry = {
+            "occurred_at": datetime.now(timezone.utc),
+            "actor_id": actor_id,
+            "action": action,
+            "entity": entity,
+            "entity_id": entity_id,
+            "changes": redact(changes or {}),
+        }
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.overflow == "drop_newest":
+                return False
+            self._queue.get_nowait()  # drop_oldest: вытесняем самое старое
+            self._queue.put_nowait(entry)
+        self.enqueued += 1
+        self.high_watermark = max(self.high_watermark, self._queue.qsize())
+        return True
+
+    async def _next_batch(self) -> list[dict]:
+        # ждём первое событие, затем добираем до batch_size, но не дольше flush_interval.
+        # Набираемая пачка хранится в self._collecting — при отмене на shutdown она не теряется.
+        batch = self._collecting
+        batch.append(await self._queue.get())
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        self._collecting = []
+        return batch
+
+    def _drain_nowait(self) -> list[dict]:
+        batch = []
+        while not self._queue.empty() and len(batch) < self.batch_size:
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _write(self, batch: list[dict]) -> None:
+        try:
+            async with get_sessionmaker()() as db:
+                await AuditLogCRUD(db).insert_many(batch)
+        except Exception:
+            self.failed += len(batch)
+            logger.exception("failed to write %d audit entries", len(batch))
+            return
+        self.written += len(batch)
+        self.batches += 1
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            # shield: отмена цикла на shutdown не обрывает начатый INSERT
+            self._writing = asyncio.ensure_future(self._write(batch))
+            await asyncio.shield(self._writing)
+            self._writing = None
+
+    async def close(self) -> None:
+        # shutdown: новые события не принимаем, останавливаем цикл и дописываем очередь
+        self._closing = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._writing is not None:
+            await self._writing
+            self._writing = None
+        if self._collecting:
+            batch, self._collecting = self._collecting, []
+            await self._write(batch)
+        while batch := self._drain_nowait():
+            await self._write(batch)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "queue_size": self._queue.maxsize,
+            "high_watermark": self.high_watermark,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "overflow": self.overflow,
+        }
+
+
+_writer: AuditWriter | None = None
+
+
+def get_audit_writer() -> AuditWriter:
+    global _writer
+    if _writer is None:
+        settings = get_settings()
+        _writer = AuditWriter(
+            queue_size=settings.audit_queue_size,
+            batch_size=settings.audit_batch_size,
+            flush_interval_ms=settings.audit_flush_interval_ms,
+            overflow=settings.audit_overflow,
+        )
+    return _writer
+
+
+async def close_audit_writer() -> None:
+    global _writer
+    if _writer is not None:
+        await _writer.close()
+    _writer = None
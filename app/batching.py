@@ -0,0 +1,136 @@
+# Group commit для создания объявлений (опционально, ADS_WRITE_BATCH_ENABLED=1).
+#
+# Одновременные POST /advertisement, пришедшие в пределах окна (несколько мс),
+# собираются в один multi-row INSERT ... RETURNING в одной транзакции:
+# один COMMIT (один сброс WAL) на пачку вместо одного на объявление.
+# Каждый вызывающий получает обратно свою строку.
+#
+# Цена — до window_ms дополнительной задержки на запрос; выигрыш — пропускная способность
+# под пиковой нагрузкой. Замер: python -m bench.bench_write_batching
+
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from app.config import get_settings
+from app.crud import AdvertisementCRUD
+from app.db import get_sessionmaker
+from app.models import Advertisement
+
+logger = logging.getLogger(__name__)
+
+
+class AdvertisementWriteBatcher:
+    def __init__(self, *, window_ms: float, max_batch: int):
+        self.window = window_ms / 1000
+        self.max_batch = max(max_batch, 1)
+
+        self._pending: list[tuple[dict, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._flushes: set[asyncio.Task] = set()
+
+        # метрики (GET /admin/metrics)
+        self.rows = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.fallbacks = 0  # пачек, упавших целиком и вставленных по одной
+
+    async def submit(self, **values) -> Advertisement:
+        loop = asyncio.get_running_loop()
+        fut: asyncio.Future = loop.create_future()
+        self._pending.append((values, fut))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush_now)
+
+        return await fut
+
+    def _flush_now(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending[: self.max_batch], self._pending[self.max_batch :]
+        if self._pending:
+            # остаток — следующей пачкой через окно (или сразу, если снова набралось max_batch)
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush_now)
+        if not batch:
+            return
+
+        task = asyncio.ensure_future(self._flush(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: list[tuple[dict, asyncio.Future]]) -> None:
+        Session = get_sessionmaker()
+        try:
+            async with Session() as db:
+                ads = await AdvertisementCRUD(db).create_many([values for values, _ in batch])
+        except Exception:
+            # Одна "плохая" строка не должна ронять всю пачку: повторяем по одной
+            logger.exception("batched insert of %d advertisements failed, retrying one by one", len(batch))
+            self.fallbacks += 1
+            await self._flush_one_by_one(batch)
+            return
+
+        self.batches += 1
+        self.rows += len(ads)
+        self.largest_batch = max(self.largest_batch, len(ads))
+        for (_, fut), ad in zip(batch, ads):
+            if not fut.done():  # вызывающий мог отвалиться (отмена) — строка всё равно вставлена
+                fut.set_result(ad)
+
+    async def _flush_one_by_one(self, batch: list[tuple[dict, asyncio.Future]]) -> None:
+        Session = get_sessionmaker()
+        for values, fut in batch:
+            try:
+                async with Session() as db:
+                    ad = await AdvertisementCRUD(db).create(**values)
+            except Exception as e:
+                if not fut.done():
+                    fut.set_exception(e)
+                continue
+            self.rows += 1
+            if not fut.done():
+                fut.set_result(ad)
+
+    async def close(self) -> None:
+        # shutdown: досылаем всё накопленное и ждём незавершённые пачки
+        while self._pending:
+            self._flush_now()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "rows": self.rows,
+            "batches": self.batches,
+            "avg_batch": round(self.rows / self.batches, 2) if self.batches else 0,
+            "largest_batch": self.largest_batch,
+            "fallbacks": self.fallbacks,
+            "pending": len(self._pending),
+        }
+
+
+_batcher: AdvertisementWriteBatcher | None = None
+
+
+def get_ad_write_batcher() -> AdvertisementWriteBatcher:
+    global _batcher
+    if _batcher is None:
+        settings = get_settings()
+        _batcher = AdvertisementWriteBatcher(
+            window_ms=settings.ads_write_batch_window_ms,
+            max_batch=settings.ads_write_batch_max,
+        )
+    return _batcher
+
+
+async def close_ad_write_batcher() -> None:
+    global _batcher
+    if _batcher is not None:
+        await _batcher.close()
+    _batcher = None
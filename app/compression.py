@@ -0,0 +1,176 @@
+# Сжатие ответов: zstd (если установлен zstandard) или gzip, выбор — по заголовку Accept-Encoding.
+#
+# - тела меньше minimum_size отдаются как есть (сжатие съест больше CPU, чем сэкономит трафика)
+# - стриминговые ответы (more_body=True) сжимаются по кускам с flush после каждого куска,
+#   чтобы клиент получал данные сразу, а не после конца стрима
+# - уже сжатые ответы (есть Content-Encoding) и исключённые типы (SSE) не трогаем
+#
+# Чистый ASGI-middleware (как starlette.middleware.gzip), без буферизации всего стрима.
+
+from __future__ import annotations
+
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:  # опциональная зависимость: без неё работает только gzip
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+def parse_accept_encoding(value: str) -> dict[str, float]:
+    # "gzip;q=0.8, zstd, *;q=0" -> {"gzip": 0.8, "zstd": 1.0, "*": 0.0}
+    result: dict[str, float] = {}
+    for part in value.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, val = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(val)
+                except ValueError:
+                    q = 0.0
+        result[token] = q
+    return result
+
+
+class _Encoder:
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        self.level = level
+        if encoding == "zstd":
+            self._stream = zstandard.ZstdCompressor(level=level).compressobj()
+        else:
+            # wbits=16+MAX_WBITS -> gzip-обёртка вместо raw zlib
+            self._stream = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress_all(self, body: bytes) -> bytes:
+        if self.encoding == "zstd":
+            return zstandard.ZstdCompressor(level=self.level).compress(body)
+        return self._stream.compress(body) + self._stream.flush()
+
+    def compress_chunk(self, chunk: bytes) -> bytes:
+        if self.encoding == "zstd":
+            return self._stream.compress(chunk) + self._stream.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return self._stream.compress(chunk) + self._stream.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._stream.flush()
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        zstd_level: int = 3,
+        excluded_media_types: tuple[str, ...] = ("text/event-stream",),
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = {"gzip": gzip_level}
+        if zstandard is not None:
+            self.levels["zstd"] = zstd_level
+        self.excluded_media_types = excluded_media_types
+
+    def choose_encoding(self, accept_encoding: str) -> str | None:
+        accepted = parse_accept_encoding(accept_encoding)
+        best, best_q = None, 0.0
+        # при равном q предпочитаем zstd: сжимает лучше и быстрее gzip
+        for encoding in ("zstd", "gzip"):
+            if encoding not in self.levels:
+                continue
+            q = accepted.get(encoding, accepted.get("*", 0.0))
+            if q > best_q:
+                best, best_q = encoding, q
+        return best
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self.choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self.start_message: Message | None = None
+        self.encoder: _Encoder | None = None
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # заголовки отправим, когда увидим первый кусок тела и решим, сжимать ли
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            media_type = headers.get("content-type", "").split(";")[0].strip().lower()
+            if "content-encoding" in headers or media_type in self.middleware.excluded_media_types:
+                self.passthrough = True
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            if self.start_message is not None:
+                await self._send(self.start_message)
+                self.start_message = None
+            await self._send(message)
+            return
+
+        body: bytes = message.get("body", b"")
+        more_body: bool = message.get("more_body", False)
+
+        if self.start_message is not None:
+            assert self.encoder is None
+            headers = MutableHeaders(raw=self.start_message["headers"])
+
+            if not more_body:
+                # обычный ответ целиком
+                if len(body) < self.middleware.minimum_size:
+                    await self._send(self.start_message)
+                    await self._send(message)
+                    self.start_message = None
+                    return
+                encoder = _Encoder(self.encoding, self.middleware.levels[self.encoding])
+                body = encoder.compress_all(body)
+                headers["Content-Encoding"] = self.encoding
+                headers["Content-Length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+                await self._send(self.start_message)
+                await self._send({"type": "http.response.body", "body": body})
+                self.start_message = None
+                return
+
+            # стриминговый ответ: длина заранее неизвестна
+            self.encoder = _Encoder(self.encoding, self.middleware.levels[self.encoding])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if "content-length" in headers:
+                del headers["Content-Length"]
+            await self._send(self.start_message)
+            self.start_message = None
+
+        assert self.encoder is not None
+        if more_body:
+            chunk = self.encoder.compress_chunk(body) if body else b""
+            if chunk:
+                await self._send({"type": "http.response.body", "body": chunk, "more_body": True})
+        else:
+            chunk = self.encoder.compress_chunk(body) if body else b""
+            await self._send({"type": "http.response.body", "body": chunk + self.encoder.finish()})
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import os
+import tempfile
 from functools import lru_cache
+from typing import Literal, Optional
 
-from pydantic import Field
+from pydantic import Field, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -20,6 +23,11 @@ class Settings(BaseSettings):
     jwt_secret: str = Field("CHANGE_ME", validation_alias="JWT_SECRET")  # в .env!
     jwt_algorithm: str = Field("HS256", validation_alias="JWT_ALGORITHM")
     jwt_exp_hours: int = Field(48, validation_alias="JWT_EXP_HOURS")
+    # Стоимость bcrypt (2^rounds итераций). Подобрать под железо: python -m app.security calibrate.
+    # Хэши с другой стоимостью пересчитываются при следующем успешном входе
+    bcrypt_rounds: int = Field(12, ge=4, le=31, validation_alias="BCRYPT_ROUNDS")
+    # LRU проверенных токенов в процессе (app/security.py); 0 — без кэша
+    jwt_cache_size: int = Field(10000, ge=0, validation_alias="JWT_CACHE_SIZE")
 
     # “первый админ” через env (bootstrap)
     # ВАЖНО:
@@ -28,8 +36,117 @@ class Settings(BaseSettings):
     bootstrap_root_username: str | None = Field(default=None, validation_alias="BOOTSTRAP_ROOT_USERNAME")
     bootstrap_root_password: str | None = Field(default=None, validation_alias="BOOTSTRAP_ROOT_PASSWORD")
 
+    # Партиции advertisements (см. app/partitions.py): сколько месяцев вперёд держать готовыми
+    # и как часто фоновая задача из lifespan это проверяет (секунды).
+    # DEFAULT-партиции нет: если готовых месяцев впереди меньше min — ERROR в лог на каждом проходе
+    partitions_months_ahead: int = Field(6, ge=1, validation_alias="PARTITIONS_MONTHS_AHEAD")
+    partitions_min_months_ahead: int = Field(2, ge=0, validation_alias="PARTITIONS_MIN_MONTHS_AHEAD")
+    partitions_maintenance_interval: int = Field(6 * 3600, validation_alias="PARTITIONS_MAINTENANCE_INTERVAL")
+
+    # Single-flight для горячих чтений (app/singleflight.py): одновременные одинаковые
+    # GET /advertisement/{id} и поиски ждут один запрос в БД. Таймауты — секунды ожидания на ключ.
+    singleflight_enabled: bool = Field(True, validation_alias="SINGLEFLIGHT_ENABLED")
+    singleflight_get_timeout: float = Field(5.0, validation_alias="SINGLEFLIGHT_GET_TIMEOUT")
+    singleflight_search_timeout: float = Field(10.0, validation_alias="SINGLEFLIGHT_SEARCH_TIMEOUT")
+
+    # Сжатие ответов (app/compression.py): gzip/zstd по Accept-Encoding.
+    # Уровни — компромисс CPU против трафика (замер: python -m bench.bench_compression)
+    compression_enabled: bool = Field(True, validation_alias="COMPRESSION_ENABLED")
+    compression_minimum_size: int = Field(1024, validation_alias="COMPRESSION_MINIMUM_SIZE")
+    compression_gzip_level: int = Field(6, ge=1, le=9, validation_alias="COMPRESSION_GZIP_LEVEL")
+    compression_zstd_level: int = Field(3, ge=1, le=22, validation_alias="COMPRESSION_ZSTD_LEVEL")
+
+    # Group commit для POST /advertisement (app/batching.py), по умолчанию выключен:
+    # создания в пределах окна (мс) склеиваются в один INSERT ... RETURNING, не больше max штук
+    ads_write_batch_enabled: bool = Field(False, validation_alias="ADS_WRITE_BATCH_ENABLED")
+    ads_write_batch_window_ms: float = Field(5.0, validation_alias="ADS_WRITE_BATCH_WINDOW_MS")
+    ads_write_batch_max: int = Field(100, ge=1, validation_alias="ADS_WRITE_BATCH_MAX")
+
+    # Idempotency-Key (app/idempotency.py): memory — один узел, db — общая таблица для всех воркеров.
+    # TTL — сколько хранить ответ; wait_timeout — сколько дубль ждёт первое выполнение (иначе 409);
+    # lease — сколько держится незавершённый захват ключа (db): после него ключ перехватывает повтор.
+    # Lease должен быть больше самого долгого выполнения, иначе медленный запрос выполнится дважды
+    idempotency_backend: Literal["memory", "db"] = Field("memory", validation_alias="IDEMPOTENCY_BACKEND")
+    idempotency_ttl_seconds: int = Field(24 * 3600, validation_alias="IDEMPOTENCY_TTL_SECONDS")
+    idempotency_wait_timeout: float = Field(10.0, validation_alias="IDEMPOTENCY_WAIT_TIMEOUT")
+    idempotency_lease_seconds: int = Field(60, ge=1, validation_alias="IDEMPOTENCY_LEASE_SECONDS")
+
+    # Живая лента GET /advertisement/stream (app/events.py): NOTIFY из CRUD, один LISTEN на воркер.
+    # Очередь подписчика ограничена: медленный клиент при переполнении получает event: overflow и отключается
+    events_notify_enabled: bool = Field(True, validation_alias="EVENTS_NOTIFY_ENABLED")
+    events_subscriber_queue_size: int = Field(256, ge=1, validation_alias="EVENTS_SUBSCRIBER_QUEUE_SIZE")
+    events_heartbeat_seconds: float = Field(15.0, validation_alias="EVENTS_HEARTBEAT_SECONDS")
+
+    # Сохранённые поиски и перколятор (app/percolator.py): индекс в памяти воркера,
+    # полная перезагрузка раз в PERCOLATOR_REFRESH_SECONDS (подхватывает изменения с других воркеров)
+    percolator_enabled: bool = Field(True, validation_alias="PERCOLATOR_ENABLED")
+    percolator_refresh_seconds: float = Field(60.0, validation_alias="PERCOLATOR_REFRESH_SECONDS")
+    saved_searches_per_user: int = Field(50, ge=1, validation_alias="SAVED_SEARCHES_PER_USER")
+
+    # Срок жизни и очистка объявлений (app/purge.py). ADVERTISEMENT_TTL_DAYS не задан — объявления бессрочные.
+    advertisement_ttl_days: Optional[int] = Field(None, ge=1, validation_alias="ADVERTISEMENT_TTL_DAYS")
+    purge_enabled: bool = Field(True, validation_alias="PURGE_ENABLED")
+    purge_interval_seconds: float = Field(60.0, validation_alias="PURGE_INTERVAL_SECONDS")
+    purge_batch_size: int = Field(500, ge=1, validation_alias="PURGE_BATCH_SIZE")
+    purge_retention_seconds: int = Field(24 * 3600, ge=0, validation_alias="PURGE_RETENTION_SECONDS")
+    purge_archive: bool = Field(False, validation_alias="PURGE_ARCHIVE")
+
+    # Сводка статистики цен по дням/авторам (app/rollups.py)
+    stats_rollup_enabled: bool = Field(True, validation_alias="STATS_ROLLUP_ENABLED")
+    stats_rollup_interval_seconds: float = Field(60.0, validation_alias="STATS_ROLLUP_INTERVAL_SECONDS")
+    stats_rollup_overlap_seconds: int = Field(300, ge=0, validation_alias="STATS_ROLLUP_OVERLAP_SECONDS")
+
+    # Автодополнение заголовков (app/suggest.py): LRU-кэш коротких префиксов
+    suggest_cache_size: int = Field(10_000, ge=1, validation_alias="SUGGEST_CACHE_SIZE")
+    suggest_cache_ttl: float = Field(30.0, validation_alias="SUGGEST_CACHE_TTL")
+    suggest_cache_prefix_len: int = Field(6, ge=1, validation_alias="SUGGEST_CACHE_PREFIX_LEN")
+    suggest_warm_prefixes: int = Field(200, ge=0, validation_alias="SUGGEST_WARM_PREFIXES")
+
+    # Журнал аудита (app/audit.py): очередь процесса + фоновая запись пачками
+    audit_enabled: bool = Field(True, validation_alias="AUDIT_ENABLED")
+    audit_queue_size: int = Field(10_000, ge=1, validation_alias="AUDIT_QUEUE_SIZE")
+    audit_batch_size: int = Field(500, ge=1, validation_alias="AUDIT_BATCH_SIZE")
+    audit_flush_interval_ms: float = Field(200.0, gt=0, validation_alias="AUDIT_FLUSH_INTERVAL_MS")
+    audit_overflow: Literal["drop_newest", "drop_oldest"] = Field("drop_newest", validation_alias="AUDIT_OVERFLOW")
+
+    # Ограничение попыток входа (app/login_throttle.py): 429 до поиска пользователя и bcrypt.
+    # memory — один узел, db — общая таблица для всех воркеров
+    login_throttle_enabled: bool = Field(True, validation_alias="LOGIN_THROTTLE_ENABLED")
+    login_throttle_backend: Literal["memory", "db"] = Field("memory", validation_alias="LOGIN_THROTTLE_BACKEND")
+    login_throttle_max_keys: int = Field(100_000, ge=1, validation_alias="LOGIN_THROTTLE_MAX_KEYS")
+    login_user_burst: int = Field(10, ge=1, validation_alias="LOGIN_USER_BURST")
+    login_user_per_minute: float = Field(10.0, gt=0, validation_alias="LOGIN_USER_PER_MINUTE")
+    login_ip_burst: int = Field(30, ge=1, validation_alias="LOGIN_IP_BURST")
+    login_ip_per_minute: float = Field(60.0, gt=0, validation_alias="LOGIN_IP_PER_MINUTE")
+    login_backoff_after: int = Field(3, ge=1, validation_alias="LOGIN_BACKOFF_AFTER")
+    login_backoff_base_seconds: float = Field(1.0, gt=0, validation_alias="LOGIN_BACKOFF_BASE_SECONDS")
+    login_backoff_max_seconds: float = Field(300.0, gt=0, validation_alias="LOGIN_BACKOFF_MAX_SECONDS")
+    login_backoff_reset_seconds: float = Field(900.0, gt=0, validation_alias="LOGIN_BACKOFF_RESET_SECONDS")
+
+    # Профилирование запросов по требованию admin (app/profiling.py)
+    profiling_enabled: bool = Field(True, validation_alias="PROFILING_ENABLED")
+    profiling_dir: str = Field(
+        os.path.join(tempfile.gettempdir(), "ads-profiles"), validation_alias="PROFILING_DIR"
+    )
+    profiling_max_files: int = Field(200, ge=1, validation_alias="PROFILING_MAX_FILES")
+    profiling_max_sql: int = Field(1000, ge=1, validation_alias="PROFILING_MAX_SQL")
+
+    # Создание root (BOOTSTRAP_ROOT_*) — в фоне после старта: запрос к users и bcrypt-хэш
+    # не задерживают первый ответ реплики. false — как раньше, старт ждёт bootstrap
+    bootstrap_root_background: bool = Field(True, validation_alias="BOOTSTRAP_ROOT_BACKGROUND")
+
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
+    @model_validator(mode="after")
+    def _check_embedded_backends(self) -> Settings:
+        # Общие для воркеров хранилища в БД написаны под PostgreSQL (make_interval, EXTRACT(EPOCH ...)).
+        # Встроенный SQLite — один процесс, ему хватает memory; падаем при старте, а не 500 на /login
+        if self.database_url.startswith("sqlite"):
+            for name in ("login_throttle_backend", "idempotency_backend"):
+                if getattr(self, name) == "db":
+                    raise ValueError(f"{name.upper()}=db requires PostgreSQL; use memory with a SQLite DATABASE_URL")
+        return self
+
 
 @lru_cache
 def get_settings() -> Settings:
@@ -0,0 +1,57 @@
+# Сверка денормализованного счётчика users.ad_count с advertisements (миграция 0009).
+#
+# Счётчик поддерживается AdvertisementCRUD в тех же транзакциях, что и объявления; этот
+# инструмент нужен после ручных правок в БД, восстановления из бэкапа и т.п.
+# Идёт пачками по пользователям (короткие транзакции, блокируется только пачка строк users).
+#
+# CLI:
+#   python -m app.counters reconcile [--batch-size 1000]
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+
+from app.crud import UserCRUD
+from app.db import close_engine, get_sessionmaker
+
+logger = logging.getLogger(__name__)
+
+
+async def reconcile_ad_counts(*, batch_size: int = 1000) -> dict:
+    """Пересчитывает ad_count всех пользователей. Возвращает {"batches": ..., "fixed": ...}."""
+    session_factory = get_sessionmaker()
+    after_id, batches, fixed = 0, 0, 0
+    while True:
+        async with session_factory() as db:
+            batch_fixed, last_id = await UserCRUD(db).reconcile_ad_counts(after_id=after_id, limit=batch_size)
+        if last_id is None:
+            break
+        fixed += batch_fixed
+        batches += 1
+        after_id = last_id
+    if fixed:
+        logger.warning("ad_count drift fixed for %d users", fixed)
+    return {"batches": batches, "fixed": fixed}
+
+
+async def _cli(args: argparse.Namespace) -> None:
+    try:
+        if args.command == "reconcile":
+            result = await reconcile_ad_counts(batch_size=args.batch_size)
+            print(f"batches: {result['batches']}, fixed: {result['fixed']}")
+    finally:
+        await close_engine()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="denormalised counters maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_reconcile = sub.add_parser("reconcile")
+    p_reconcile.add_argument("--batch-size", type=int, default=1000)
+    asyncio.run(_cli(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
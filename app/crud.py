@@ -1,24 +1,52 @@
 from __future__ import annotations
 
-from datetime import datetime
+import asyncio
+import json
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal
-from typing import Optional
+from typing import Optional, Sequence
 
-from sqlalchemy import and_, delete, select, update
+from sqlalchemy import ARRAY, Integer, Select, and_, any_, bindparam, delete, func, insert, literal, literal_column, or_, select, text, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models import Advertisement, User  # ПО ЗАДАНИЮ. Дополнил импорты
-from app.security import hash_password, verify_password  # ПО ЗАДАНИЮ. Дополнил импорты
+from app.config import get_settings
+from app.models import (
+    Advertisement,
+    AuditLogEntry,
+    AdvertisementDailyStats,
+    PurgedAdvertisement,
+    RollupWatermark,
+    SavedSearch,
+    SearchInboxItem,
+    User,
+)  # ПО ЗАДАНИЮ. Дополнил импорты
+from app.security import hash_password, password_needs_rehash, verify_password  # ПО ЗАДАНИЮ. Дополнил импорты
 
 # ПО ЗАДАНИЮ. Добавляем UserCRUD + права на объявления
 
 
+# Сортировки справочника пользователей GET /user -> колонки ключа keyset-курсора
+USER_SORTS = {
+    "id": ("id",),
+    "username": ("username",),  # username уникален — сам себе ключ
+    "ad_count": ("ad_count", "id"),
+    "-ad_count": ("ad_count", "id"),
+}
+
+
+def user_sort_key(user, sort: str) -> tuple:
+    return tuple(getattr(user, column) for column in USER_SORTS[sort])
+
+
 class UserCRUD:
     def __init__(self, db: AsyncSession):
         self.db = db
 
     async def create(self, *, username: str, password: str, group: str = "user") -> User:
-        user = User(username=username, password_hash=hash_password(password), group=group)
+        # bcrypt — сотни мс CPU: в потоке, чтобы не останавливать цикл событий (и остальные запросы)
+        user = User(username=username, password_hash=await asyncio.to_thread(hash_password, password), group=group)
         self.db.add(user)
         await self.db.commit()
         await self.db.refresh(user)
@@ -32,10 +60,62 @@ class UserCRUD:
         res = await self.db.execute(select(User).where(User.username == username))
         return res.scalar_one_or_none()
 
-    async def list(self, *, limit: int = 50, offset: int = 0) -> list[User]:
-        stmt = select(User).order_by(User.id.asc()).limit(min(max(limit, 1), 200)).offset(max(offset, 0))
+    async def list(
+        self,
+        *,
+        limit: int = 50,
+        offset: int = 0,
+        sort: str = "id",
+        username_prefix: Optional[str] = None,
+        group: Optional[str] = None,
+        after: tuple | None = None,
+        compact: bool = False,
+    ) -> list:
+        """
+        Справочник пользователей для admin.
+
+        - username_prefix — "начинается с" (с учётом регистра, как и логин) по индексу
+          ix_users_username_c (username COLLATE "C"): диапазон prefix <= username < next(prefix).
+          C-collation, а не text_pattern_ops: такой индекс отдаёт и диапазон, и ORDER BY username
+        - group — по индексу ix_users_group_id (group, id): WHERE group = ... ORDER BY id
+        - after — ключ последней строки предыдущей страницы (user_sort_key), вместо offset
+        - compact — id/username/group и колонки ключа сортировки (строки Row): из них
+          строится курсор следующей страницы (user_sort_key), created_at не читается
+        """
+        # SQLite сравнивает строки побайтово и без COLLATE "C" (а такой collation у него нет)
+        username = User.username.collate("C") if self.db.bind.dialect.name == "postgresql" else User.username
+        order = {
+            "id": (User.id.asc(),),
+            "username": (username.asc(),),
+            "ad_count": (User.ad_count.asc(), User.id.asc()),
+            "-ad_count": (User.ad_count.desc(), User.id.asc()),
+        }[sort]
+
+        if compact:
+            brief = ("id", "username", "group")
+            columns = [getattr(User, c) for c in (*brief, *(c for c in USER_SORTS[sort] if c not in brief))]
+        else:
+            columns = [User]
+        stmt = select(*columns)
+        if username_prefix:
+            upper = username_prefix[:-1] + chr(ord(username_prefix[-1]) + 1)
+            stmt = stmt.where(username >= username_prefix, username < upper)
+        if group is not None:
+            stmt = stmt.where(User.group == group)
+        if after is not None:
+            if sort == "id":
+                stmt = stmt.where(User.id > after[0])
+            elif sort == "username":
+                stmt = stmt.where(username > after[0])
+            elif sort == "ad_count":
+                stmt = stmt.where(tuple_(User.ad_count, User.id) > tuple_(*after))
+            else:
+                # ad_count по убыванию, id по возрастанию — сравнение кортежей не подходит
+                stmt = stmt.where(or_(User.ad_count < after[0], and_(User.ad_count == after[0], User.id > after[1])))
+
+        stmt = stmt.order_by(*order).limit(min(max(limit, 1), 200)).offset(max(offset, 0))
         res = await self.db.execute(stmt)
-        return list(res.scalars().all())
+        return list(res.all() if compact else res.scalars().all())
 
     async def patch(
         self,
@@ -49,7 +129,7 @@ class UserCRUD:
         if username is not None:
             values["username"] = username
         if password is not None:
-            values["password_hash"] = hash_password(password)
+            values["password_hash"] = await asyncio.to_thread(hash_password, password)
         if group is not None:
             values["group"] = group
 
@@ -76,10 +156,127 @@ class UserCRUD:
         user = await self.get_by_username(username)
         if not user:
             return None
-        if not verify_password(password, user.password_hash):
+        # проверка и перехэширование — bcrypt, как в create(): в потоке, не на цикле событий
+        if not await asyncio.to_thread(verify_password, password, user.password_hash):
             return None
+        if password_needs_rehash(user.password_hash):
+            # BCRYPT_ROUNDS изменили — пароль в открытом виде есть только сейчас, пересчитываем хэш.
+            # Условие по старому хэшу: параллельная смена пароля не перетирается
+            new_hash = await asyncio.to_thread(hash_password, password)
+            await self.db.execute(
+                update(User)
+                .where(User.id == user.id, User.password_hash == user.password_hash)
+                .values(password_hash=new_hash)
+            )
+            await self.db.commit()
         return user
 
+    async def reconcile_ad_counts(self, *, after_id: int = 0, limit: int = 1000) -> tuple[int, int | None]:
+        """
+        Пересчитывает users.ad_count для пачки пользователей с id > after_id.
+        Возвращает (сколько исправлено, последний id пачки или None, если пользователи кончились).
+
+        Сначала блокируем строки пачки (FOR UPDATE), потом считаем НОВЫМ запросом (новый снимок):
+        транзакции, успевшие изменить счётчик, уже видны в подсчёте, а начатые позже
+        ждут блокировку и применят свои +1/-1 поверх пересчитанного значения.
+        """
+        res = await self.db.execute(
+            select(User.id).where(User.id > after_id).order_by(User.id).limit(limit).with_for_update()
+        )
+        ids = list(res.scalars().all())
+        if not ids:
+            await self.db.commit()
+            return 0, None
+
+        actual = (
+            select(func.count())
+            .where(Advertisement.owner_id == User.id, Advertisement.deleted_at.is_(None))
+            .scalar_subquery()
+        )
+        res = await self.db.execute(
+            update(User)
+            .where(User.id.between(ids[0], ids[-1]), User.ad_count != actual)
+            .values(ad_count=actual)
+            .returning(User.id)
+            .execution_options(synchronize_session=False)
+        )
+        fixed = len(res.scalars().all())
+        await self.db.commit()
+        return fixed, ids[-1]
+
+
+# Канал LISTEN/NOTIFY для живой ленты GET /advertisement/stream (см. app/events.py)
+ADVERTISEMENT_EVENTS_CHANNEL = "advertisement_events"
+# Встроенный SQLite: NOTIFY нет — события копятся в session.info и после COMMIT
+# отдаются брокеру этого процесса (app/events.py)
+LOCAL_EVENTS_KEY = "advertisement_events"
+
+
+def upsert_insert(db: AsyncSession, model):
+    # INSERT ... ON CONFLICT: у диалектов PostgreSQL и SQLite одинаковый API on_conflict_do_*
+    if db.bind.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert  # диалект уже загружен engine-ом
+
+        return sqlite_insert(model)
+    return pg_insert(model)
+
+
+async def _bump_ad_counts(db: AsyncSession, deltas: Counter) -> None:
+    # users.ad_count += delta в той же транзакции, что и изменение объявлений.
+    # Сортировка по id — одинаковый порядок блокировок строк users у конкурирующих транзакций.
+    rows = [{"uid": uid, "delta": delta} for uid, delta in sorted(deltas.items()) if uid is not None and delta]
+    if not rows:
+        return
+    users = User.__table__
+    await db.execute(
+        update(users).where(users.c.id == bindparam("uid")).values(ad_count=users.c.ad_count + bindparam("delta")),
+        rows,
+    )
+
+
+async def _notify_advertisement_events(db: AsyncSession, op: str, ad_ids: Sequence[int]) -> None:
+    # pg_notify в той же транзакции: слушатели получат событие только после COMMIT
+    # (и не получат вовсе при ROLLBACK). Payload маленький — {"op", "id"}, саму строку
+    # слушатель дочитывает сам (лимит NOTIFY — 8000 байт, description может быть больше).
+    if not ad_ids or not get_settings().events_notify_enabled:
+        return
+    if db.bind.dialect.name == "sqlite":
+        db.info.setdefault(LOCAL_EVENTS_KEY, []).extend({"op": op, "id": ad_id} for ad_id in ad_ids)
+        return
+    if db.bind.dialect.name != "postgresql":
+        return
+    payloads = [json.dumps({"op": op, "id": ad_id}) for ad_id in ad_ids]
+    await db.execute(
+        text("SELECT pg_notify(:channel, p) FROM unnest(CAST(:payloads AS text[])) AS p"),
+        {"channel": ADVERTISEMENT_EVENTS_CHANNEL, "payloads": payloads},
+    )
+
+
+# Допустимые сортировки поиска: имя -> (колонка ключа, по убыванию?). Второй ключ — id в том же
+# направлении (стабильный порядок и keyset-курсор). У каждой — свой индекс, обратный порядок
+# того же индекса читается Index Scan Backward:
+#   newest/oldest       -> ix_advertisements_created_id (created_at DESC, id DESC)
+#   price_asc/price_desc -> ix_advertisements_price_id (price, id)          (миграция 0012)
+SEARCH_SORTS: dict[str, tuple[str, bool]] = {
+    "newest": ("created_at", True),
+    "oldest": ("created_at", False),
+    "price_asc": ("price", False),
+    "price_desc": ("price", True),
+}
+
+
+def search_sort_key(ad: Advertisement, sort: str) -> tuple:
+    # значения ключа сортировки строки — для курсора следующей страницы
+    column, _ = SEARCH_SORTS[sort]
+    return getattr(ad, column), ad.id
+
+
+def contains_pattern(value: str) -> str:
+    # ILIKE '%value%' с экранированными %, _ и \ (ESCAPE '\'): value ищется как есть,
+    # как в AdvertisementFilter.matches (лента, перколятор) — "50%_off" не шаблон
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
 
 # ------------------------------------ Оставляем без изменений
 class AdvertisementCRUD:
@@ -94,6 +291,7 @@ class AdvertisementCRUD:
         price: Decimal,
         author: str,
         owner_id: int | None = None,  # ПО ЗАДАНИЮ. Добавили owner_id
+        expires_at: datetime | None = None,
     ) -> Advertisement:
         ad = Advertisement(
             title=title,
@@ -101,21 +299,102 @@ class AdvertisementCRUD:
             price=price,
             author=author,
             owner_id=owner_id,  # ПО ЗАДАНИЮ. Привязали объявление к владельцу
+            expires_at=expires_at,
         )
         self.db.add(ad)
+        await self.db.flush()  # id нужен для NOTIFY до COMMIT
+        await _bump_ad_counts(self.db, Counter({owner_id: 1}))
+        await _notify_advertisement_events(self.db, "created", [ad.id])
         await self.db.commit()
         await self.db.refresh(ad)
         return ad
 
+    async def create_many(self, rows: Sequence[dict]) -> list[Advertisement]:
+        # Групповая вставка (app/batching.py): один multi-row INSERT ... RETURNING и один COMMIT
+        # (= один сброс WAL) на всю пачку. sort_by_parameter_order гарантирует, что
+        # i-я возвращённая строка соответствует i-му элементу rows.
+        if not rows:
+            return []
+        res = await self.db.scalars(
+            insert(Advertisement).returning(Advertisement, sort_by_parameter_order=True),
+            list(rows),
+        )
+        ads = list(res.all())
+        await _bump_ad_counts(self.db, Counter(ad.owner_id for ad in ads))
+        await _notify_advertisement_events(self.db, "created", [ad.id for ad in ads])
+        await self.db.commit()
+        return ads
+
+    # Все чтения и изменения — только по живым объявлениям (не удалённым и не истёкшим),
+    # см. Advertisement.active_clause()
+
     async def get(self, ad_id: int) -> Optional[Advertisement]:
-        res = await self.db.execute(select(Advertisement).where(Advertisement.id == ad_id))
+        res = await self.db.execute(
+            select(Advertisement).where(Advertisement.id == ad_id, Advertisement.active_clause())
+        )
         return res.scalar_one_or_none()
 
+    async def get_many(self, ad_ids: Sequence[int]) -> list[Advertisement]:
+        # Один запрос вместо N: WHERE id = ANY($1::INTEGER[]).
+        # В отличие от IN (...) форма запроса не зависит от числа id —
+        # asyncpg переиспользует один подготовленный statement. Порядок не гарантирован.
+        if not ad_ids:
+            return []
+        if self.db.bind.dialect.name == "postgresql":
+            by_ids = Advertisement.id == any_(bindparam("ad_ids", list(ad_ids), type_=ARRAY(Integer)))
+        else:
+            by_ids = Advertisement.id.in_(list(ad_ids))
+        stmt = select(Advertisement).where(by_ids, Advertisement.active_clause())
+        res = await self.db.execute(stmt)
+        return list(res.scalars().all())
+
+    async def list_by_owner(
+        self,
+        owner_id: int,
+        *,
+        limit: int = 50,
+        after: tuple[datetime, int] | None = None,
+    ) -> list[Advertisement]:
+        # keyset-пагинация по индексу ix_advertisements_owner_created:
+        # after = (created_at, id) последнего объявления предыдущей страницы
+        stmt = select(Advertisement).where(Advertisement.owner_id == owner_id, Advertisement.active_clause())
+        if after is not None:
+            bound = tuple_(*after, types=(Advertisement.created_at.type, Advertisement.id.type))
+            stmt = stmt.where(tuple_(Advertisement.created_at, Advertisement.id) < bound)
+        stmt = stmt.order_by(Advertisement.created_at.desc(), Advertisement.id.desc()).limit(min(max(limit, 1), 200))
+        res = await self.db.execute(stmt)
+        return list(res.scalars().all())
+
+    async def reassign_owner(self, from_owner_id: int, to_owner_id: int) -> int:
+        # Массовая передача объявлений другому владельцу (для admin), одним UPDATE.
+        # Удалённые (ждут purge) остаются у прежнего владельца — ad_count их не учитывает.
+        res = await self.db.execute(
+            update(Advertisement)
+            .where(Advertisement.owner_id == from_owner_id, Advertisement.deleted_at.is_(None))
+            .values(owner_id=to_owner_id, updated_at=func.now())
+        )
+        moved = res.rowcount or 0
+        deltas = Counter()
+        deltas[from_owner_id] -= moved
+        deltas[to_owner_id] += moved  # from == to — в сумме 0
+        await _bump_ad_counts(self.db, deltas)
+        await self.db.commit()
+        return moved
+
     async def delete(self, ad_id: int) -> bool:
-        res = await self.db.execute(delete(Advertisement).where(Advertisement.id == ad_id).returning(Advertisement.id))
-        deleted = res.scalar_one_or_none()
+        # Мягкое удаление: один UPDATE флага. Физический DELETE (и VACUUM после него) —
+        # забота фонового purge, не запроса.
+        res = await self.db.execute(
+            update(Advertisement)
+            .where(Advertisement.id == ad_id, Advertisement.active_clause())
+            .values(deleted_at=func.now(), updated_at=func.now())
+            .returning(Advertisement.id, Advertisement.owner_id)
+        )
+        deleted = res.one_or_none()
         if deleted is None:
             return False
+        await _bump_ad_counts(self.db, Counter({deleted.owner_id: -1}))
+        await _notify_advertisement_events(self.db, "deleted", [deleted.id])
         await self.db.commit()
         return True
 
@@ -144,18 +423,19 @@ class AdvertisementCRUD:
 
         stmt = (
             update(Advertisement)
-            .where(Advertisement.id == ad_id)
-            .values(**values)
+            .where(Advertisement.id == ad_id, Advertisement.active_clause())
+            .values(**values, updated_at=func.now())
             .returning(Advertisement)
         )
         res = await self.db.execute(stmt)
         updated = res.scalar_one_or_none()
         if updated is None:
             return None
+        await _notify_advertisement_events(self.db, "updated", [updated.id])
         await self.db.commit()
         return updated
 
-    async def search(
+    def search_stmt(
         self,
         *,
         title: Optional[str] = None,
@@ -166,24 +446,45 @@ class AdvertisementCRUD:
         price_to: Optional[Decimal] = None,
         created_from: Optional[datetime] = None,
         created_to: Optional[datetime] = None,
+        sort: str = "newest",
+        after: tuple | None = None,
         limit: int = 50,
         offset: int = 0,
-    ) -> list[Advertisement]:
-        filters = []
+    ) -> Select:
+        # Отдельно от search(), чтобы план запроса можно было проверить EXPLAIN-ом
+        # (tests/test_query_plans.py) ровно на том SQL, который уходит в БД.
+        # sort — ключ SEARCH_SORTS; after — search_sort_key() последней строки предыдущей страницы
+        # (keyset: глубина страницы не влияет на стоимость, в отличие от offset).
+        # deleted_at IS NULL совпадает с предикатом частичных индексов (миграция 0008)
+        filters = [Advertisement.active_clause()]
 
+        # title/description/author/q — ILIKE '%...%' (подстрока, без шаблонов — contains_pattern),
+        # обслуживаются trigram GIN-индексами (миграция 0005)
         if title:
-            filters.append(Advertisement.title.ilike(f"%{title}%"))
+            filters.append(Advertisement.title.ilike(contains_pattern(title), escape="\\"))
         if description:
-            filters.append(Advertisement.description.ilike(f"%{description}%"))
+            filters.append(Advertisement.description.ilike(contains_pattern(description), escape="\\"))
         if author:
-            filters.append(Advertisement.author.ilike(f"%{author}%"))
+            filters.append(Advertisement.author.ilike(contains_pattern(author), escape="\\"))
 
         # q — общий поиск по title/description/author
-        if q:
+        if q and self.db.bind.dialect.name == "sqlite" and len(q) >= 3:
+            # встроенный SQLite: FTS5 с trigram-токенизатором (app/models.py) — тот же поиск подстроки
+            # без учёта регистра, но по индексу. Короче 3 символов trigram-индекс (как и pg_trgm) не помогает
+            phrase = '"' + q.replace('"', '""') + '"'
+            filters.append(
+                Advertisement.id.in_(
+                    select(literal_column("rowid"))
+                    .select_from(text("advertisements_fts"))
+                    .where(text("advertisements_fts MATCH :fts_phrase").bindparams(fts_phrase=phrase))
+                )
+            )
+        elif q:
+            pattern = contains_pattern(q)
             filters.append(
-                (Advertisement.title.ilike(f"%{q}%"))
-                | (Advertisement.description.ilike(f"%{q}%"))
-                | (Advertisement.author.ilike(f"%{q}%"))
+                (Advertisement.title.ilike(pattern, escape="\\"))
+                | (Advertisement.description.ilike(pattern, escape="\\"))
+                | (Advertisement.author.ilike(pattern, escape="\\"))
             )
 
         if price_from is not None:
@@ -196,11 +497,355 @@ class AdvertisementCRUD:
         if created_to is not None:
             filters.append(Advertisement.created_at <= created_to)
 
-        stmt = select(Advertisement).order_by(Advertisement.created_at.desc())
+        column, descending = SEARCH_SORTS[sort]
+        key = getattr(Advertisement, column)
+        if after is not None:
+            # сравнение строк (key, id) < / > (..) — один диапазон по составному индексу
+            # types — чтобы граница прошла через тот же bind-обработчик, что и колонка (UtcDateTime на SQLite)
+            row, bound = tuple_(key, Advertisement.id), tuple_(*after, types=(key.type, Advertisement.id.type))
+            filters.append(row < bound if descending else row > bound)
 
-        if filters:
-            stmt = stmt.where(and_(*filters))
+        # Партиционирование по created_at (миграция 0004):
+        # - created_from/created_to отсекают лишние партиции (partition pruning)
+        # - ORDER BY created_at DESC/ASC + LIMIT идёт по партициям по порядку
+        #   (ordered Append) и останавливается, как только набран limit;
+        #   для price_* — Merge Append индексных сканов партиций
+        order = (key.desc(), Advertisement.id.desc()) if descending else (key.asc(), Advertisement.id.asc())
+        stmt = select(Advertisement).where(and_(*filters)).order_by(*order)
+        return stmt.limit(min(max(limit, 1), 200)).offset(max(offset, 0))
 
-        stmt = stmt.limit(min(max(limit, 1), 200)).offset(max(offset, 0))
+    async def search(self, **filters) -> list[Advertisement]:
+        # Параметры — см. search_stmt()
+        res = await self.db.execute(self.search_stmt(**filters))
+        return list(res.scalars().all())
+
+    def suggest_stmt(self, prefix: str, *, limit: int = 10):
+        # prefix — уже в нижнем регистре (app/suggest.py). Диапазон prefix <= lower(title) < next(prefix).
+        # На PostgreSQL — lower(title) COLLATE "C" (побайтовое сравнение, порядок UTF-8 = порядок
+        # кодовых точек): индекс ix_advertisements_title_lower_c (миграция 0019) отдаёт и диапазон,
+        # и GROUP BY/ORDER BY по тому же выражению — без Sort, скан останавливается на limit.
+        # В отличие от LIKE, работает и в generic-плане подготовленного запроса.
+        # На SQLite обычные >= / < (BINARY collation и так побайтовая), lower() — юникодный (app/db.py).
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        title_lower = func.lower(Advertisement.title)
+        if self.db.bind.dialect.name == "postgresql":
+            title_lower = title_lower.collate("C")
+        return (
+            select(func.min(Advertisement.title))
+            .where(title_lower >= prefix, title_lower < upper, Advertisement.active_clause())
+            .group_by(title_lower)
+            .order_by(title_lower)
+            .limit(min(max(limit, 1), 50))
+        )
+
+    async def suggest_titles(self, prefix: str, *, limit: int = 10) -> list[str]:
+        res = await self.db.execute(self.suggest_stmt(prefix, limit=limit))
+        return list(res.scalars().all())
+
+    async def recent_titles(self, *, limit: int) -> list[str]:
+        # для прогрева кэша подсказок — по индексу ix_advertisements_created_id
+        stmt = (
+            select(Advertisement.title)
+            .where(Advertisement.active_clause())
+            .order_by(Advertisement.created_at.desc(), Advertisement.id.desc())
+            .limit(limit)
+        )
+        res = await self.db.execute(stmt)
+        return list(res.scalars().all())
+
+    # ---- purge (app/purge.py): небольшими пачками, FOR UPDATE SKIP LOCKED —
+    # строки, занятые запросами или другим воркером, пропускаются, а не ждут
+
+    async def expire_due(self, *, limit: int) -> list[int]:
+        """Помечает удалёнными истёкшие объявления (deleted_at = expires_at). Возвращает их id."""
+        batch = (
+            select(Advertisement.id, Advertisement.created_at)
+            .where(Advertisement.deleted_at.is_(None), Advertisement.expires_at <= func.now())
+            .order_by(Advertisement.expires_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .cte("batch")
+        )
+        res = await self.db.execute(
+            update(Advertisement)
+            .where(Advertisement.id == batch.c.id, Advertisement.created_at == batch.c.created_at)
+            .values(deleted_at=Advertisement.expires_at, updated_at=func.now())
+            .returning(Advertisement.id, Advertisement.owner_id)
+        )
+        rows = res.all()
+        expired = [row.id for row in rows]
+        deltas = Counter()
+        for row in rows:
+            deltas[row.owner_id] -= 1
+        await _bump_ad_counts(self.db, deltas)
+        await _notify_advertisement_events(self.db, "deleted", expired)
+        await self.db.commit()
+        return expired
+
+    async def purge_deleted(self, *, older_than: timedelta, limit: int, archive: bool = False) -> int:
+        """
+        Физически удаляет объявления, удалённые раньше чем older_than назад.
+        archive=True — переносит их в archive.advertisements_purged тем же запросом (DELETE ... RETURNING).
+        """
+        if self.db.bind.dialect.name == "sqlite":
+            return await self._purge_deleted_sqlite(older_than=older_than, limit=limit, archive=archive)
+
+        batch = (
+            select(Advertisement.id, Advertisement.created_at)
+            .where(Advertisement.deleted_at < func.now() - older_than)
+            .order_by(Advertisement.deleted_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .cte("batch")
+        )
+        purge = delete(Advertisement).where(
+            Advertisement.id == batch.c.id, Advertisement.created_at == batch.c.created_at
+        )
+        if archive:
+            columns = [c.key for c in PurgedAdvertisement.__table__.c if c.key != "purged_at"]
+            moved = purge.returning(*(Advertisement.__table__.c[name] for name in columns)).cte("moved")
+            stmt = (
+                insert(PurgedAdvertisement)
+                .from_select(columns, select(*(moved.c[name] for name in columns)))
+                .returning(PurgedAdvertisement.id)
+            )
+        else:
+            stmt = purge.returning(Advertisement.id)
+        res = await self.db.execute(stmt)
+        purged = len(res.scalars().all())
+        await self.db.commit()
+        return purged
+
+    async def _purge_deleted_sqlite(self, *, older_than: timedelta, limit: int, archive: bool) -> int:
+        # SQLite: DML внутри CTE нет — копия в archive и удаление отдельными запросами одной транзакции
+        # (писатель в SQLite один, SKIP LOCKED не нужен)
+        cutoff = datetime.now(timezone.utc) - older_than
+        ids = list(
+            (
+                await self.db.execute(
+                    select(Advertisement.id)
+                    .where(Advertisement.deleted_at < cutoff)
+                    .order_by(Advertisement.deleted_at)
+                    .limit(limit)
+                )
+            ).scalars()
+        )
+        if not ids:
+            return 0
+        if archive:
+            columns = [c.key for c in PurgedAdvertisement.__table__.c if c.key != "purged_at"]
+            await self.db.execute(
+                insert(PurgedAdvertisement).from_select(
+                    columns,
+                    select(*(Advertisement.__table__.c[name] for name in columns)).where(Advertisement.id.in_(ids)),
+                )
+            )
+        res = await self.db.execute(delete(Advertisement).where(Advertisement.id.in_(ids)).returning(Advertisement.id))
+        purged = len(res.scalars().all())
+        await self.db.commit()
+        return purged
+
+
+# Сохранённые поиски и "входящие" с совпадениями (перколятор — app/percolator.py)
+class SavedSearchCRUD:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def create(self, *, user_id: int, name: str, **filters) -> SavedSearch:
+        saved = SavedSearch(user_id=user_id, name=name, **filters)
+        self.db.add(saved)
+        await self.db.commit()
+        await self.db.refresh(saved)
+        return saved
+
+    async def get(self, search_id: int) -> Optional[SavedSearch]:
+        res = await self.db.execute(select(SavedSearch).where(SavedSearch.id == search_id))
+        return res.scalar_one_or_none()
+
+    async def list_for_user(self, user_id: int) -> list[SavedSearch]:
+        res = await self.db.execute(
+            select(SavedSearch).where(SavedSearch.user_id == user_id).order_by(SavedSearch.id.asc())
+        )
+        return list(res.scalars().all())
+
+    async def count_for_user(self, user_id: int) -> int:
+        res = await self.db.execute(select(func.count()).select_from(SavedSearch).where(SavedSearch.user_id == user_id))
+        return res.scalar_one()
+
+    async def list_all(self, *, batch: int = 10_000) -> list[SavedSearch]:
+        # Для загрузки перколятора: keyset-проход по id пачками, без OFFSET
+        result: list[SavedSearch] = []
+        last_id = 0
+        while True:
+            res = await self.db.execute(
+                select(SavedSearch).where(SavedSearch.id > last_id).order_by(SavedSearch.id.asc()).limit(batch)
+            )
+            chunk = list(res.scalars().all())
+            if not chunk:
+                return result
+            result.extend(chunk)
+            last_id = chunk[-1].id
+
+    async def delete(self, search_id: int) -> bool:
+        res = await self.db.execute(delete(SavedSearch).where(SavedSearch.id == search_id).returning(SavedSearch.id))
+        deleted = res.scalar_one_or_none()
+        if deleted is None:
+            return False
+        await self.db.commit()
+        return True
+
+    async def add_inbox_items(self, rows: Sequence[dict]) -> None:
+        # rows: {"user_id", "saved_search_id", "advertisement_id"}; повтор той же пары — молча пропускаем.
+        # INSERT ... SELECT из saved_searches: поиск, удалённый на другом воркере (перколятор узнает
+        # об этом только при перезагрузке), просто не вставляется — а не роняет FK всю пачку
+        if not rows:
+            return
+        by_ad: dict[int, list[int]] = {}
+        for row in rows:
+            by_ad.setdefault(row["advertisement_id"], []).append(row["saved_search_id"])
+        for ad_id, search_ids in by_ad.items():
+            await self.db.execute(
+                upsert_insert(self.db, SearchInboxItem)
+                .from_select(
+                    ["user_id", "saved_search_id", "advertisement_id"],
+                    select(SavedSearch.user_id, SavedSearch.id, literal(ad_id, Integer)).where(
+                        SavedSearch.id.in_(search_ids)
+                    ),
+                )
+                .on_conflict_do_nothing(index_elements=["saved_search_id", "advertisement_id"])  # uq_search_inbox_search_ad
+            )
+        await self.db.commit()
+
+    async def list_inbox(self, user_id: int, *, limit: int = 50, before_id: int | None = None) -> list[SearchInboxItem]:
+        stmt = select(SearchInboxItem).where(SearchInboxItem.user_id == user_id)
+        if before_id is not None:
+            stmt = stmt.where(SearchInboxItem.id < before_id)
+        stmt = stmt.order_by(SearchInboxItem.id.desc()).limit(min(max(limit, 1), 200))
+        res = await self.db.execute(stmt)
+        return list(res.scalars().all())
+
+
+# Статистика цен по дням/авторам (app/rollups.py). Пересчёт — PostgreSQL (percentile_cont, GROUPING SETS).
+_RECOMPUTE_DAILY_STATS = text(
+    """
+    INSERT INTO advertisement_stats_daily
+        (day, author, count, price_min, price_max, price_avg, price_p50, price_p90, refreshed_at)
+    SELECT s.day,
+           COALESCE(s.author, ''),
+           count(*),
+           min(s.price),
+           max(s.price),
+           avg(s.price),
+           CAST(percentile_cont(0.5) WITHIN GROUP (ORDER BY s.price) AS numeric),
+           CAST(percentile_cont(0.9) WITHIN GROUP (ORDER BY s.price) AS numeric),
+           now()
+    FROM (
+        SELECT CAST(a.created_at AT TIME ZONE 'UTC' AS date) AS day, a.author, a.price
+        FROM advertisements a
+        WHERE a.deleted_at IS NULL
+          AND a.created_at >= CAST(:day_from AS timestamp) AT TIME ZONE 'UTC'
+          AND a.created_at < CAST(:day_to AS timestamp) AT TIME ZONE 'UTC'
+    ) s
+    GROUP BY GROUPING SETS ((s.day, s.author), (s.day))
+    """
+)
+
+
+def day_ranges(days: Sequence[date]) -> list[tuple[date, date]]:
+    """Дни -> непрерывные полуинтервалы [from, to): [1, 2, 3, 10] -> [(1, 4), (10, 11)]."""
+    ranges: list[tuple[date, date]] = []
+    for day in sorted(set(days)):
+        if ranges and ranges[-1][1] == day:
+            ranges[-1] = (ranges[-1][0], day + timedelta(days=1))
+        else:
+            ranges.append((day, day + timedelta(days=1)))
+    return ranges
+
+
+class MarketStatsCRUD:
+    WATERMARK = "advertisement_stats_daily"
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_watermark(self) -> Optional[datetime]:
+        return await self.db.scalar(select(RollupWatermark.value).where(RollupWatermark.name == self.WATERMARK))
+
+    async def set_watermark(self, value: datetime) -> None:
+        stmt = upsert_insert(self.db, RollupWatermark).values(name=self.WATERMARK, value=value)
+        await self.db.execute(stmt.on_conflict_do_update(index_elements=["name"], set_={"value": stmt.excluded.value}))
+        await self.db.commit()
+
+    async def changed_days(self, since: Optional[datetime]) -> list[date]:
+        # дни (UTC, по created_at), в которых что-то менялось после since; since=None — все дни
+        day = func.date(func.timezone("UTC", Advertisement.created_at))
+        stmt = select(day).distinct().order_by(day)
+        if since is not None:
+            stmt = stmt.where(Advertisement.updated_at > since)  # ix_advertisements_updated_at
+        res = await self.db.execute(stmt)
+        return list(res.scalars().all())
+
+    async def recompute_days(self, days: Sequence[date]) -> None:
+        # Дни пересчитываются целиком (удалить + вставить) в одной транзакции:
+        # читатели видят либо старую, либо новую сводку за день.
+        # Скан — по непрерывным диапазонам дней: правка годовой давности и сегодняшняя
+        # читают два дня, а не весь год между ними
+        if not days:
+            return
+        await self.db.execute(delete(AdvertisementDailyStats).where(AdvertisementDailyStats.day.in_(list(days))))
+        for day_from, day_to in day_ranges(days):
+            await self.db.execute(_RECOMPUTE_DAILY_STATS, {"day_from": day_from, "day_to": day_to})
+        await self.db.commit()
+
+    async def list(
+        self,
+        *,
+        author: Optional[str] = None,
+        day_from: date,
+        day_to: date,
+    ) -> list[AdvertisementDailyStats]:
+        # author=None — строки "все авторы" (author = ''); индекс (author, day)
+        stmt = (
+            select(AdvertisementDailyStats)
+            .where(
+                AdvertisementDailyStats.author == (author or ""),
+                AdvertisementDailyStats.day.between(day_from, day_to),
+            )
+            .order_by(AdvertisementDailyStats.day)
+        )
+        res = await self.db.execute(stmt)
+        return list(res.scalars().all())
+
+
+class AuditLogCRUD:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def insert_many(self, rows: Sequence[dict]) -> None:
+        # пачка из app/audit.py: один INSERT ... VALUES (...), (...), ... и один COMMIT
+        if not rows:
+            return
+        await self.db.execute(insert(AuditLogEntry).values(list(rows)))
+        await self.db.commit()
+
+    async def list(
+        self,
+        *,
+        entity: str | None = None,
+        entity_id: int | None = None,
+        actor_id: int | None = None,
+        limit: int = 50,
+        before_id: int | None = None,
+    ) -> list[AuditLogEntry]:
+        stmt = select(AuditLogEntry)
+        if entity is not None:
+            stmt = stmt.where(AuditLogEntry.entity == entity)
+        if entity_id is not None:
+            stmt = stmt.where(AuditLogEntry.entity_id == entity_id)
+        if actor_id is not None:
+            stmt = stmt.where(AuditLogEntry.actor_id == actor_id)
+        if before_id is not None:
+            stmt = stmt.where(AuditLogEntry.id < before_id)
+        stmt = stmt.order_by(AuditLogEntry.id.desc()).limit(min(max(limit, 1), 200))
         res = await self.db.execute(stmt)
         return list(res.scalars().all())
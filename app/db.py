@@ -1,9 +1,16 @@
 # ВНЕСЕНЫ ИЗМЕНЕИЯ ДОПЛНИТЕЛЬНО ПО ЗАДАНИЮ. движок + get_db + close_engine
 from __future__ import annotations
 
-from typing import AsyncGenerator
-
+import zlib
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncGenerator, AsyncIterator
+
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.sql.functions import now
 
 from app.config import get_settings
 
@@ -19,13 +26,7 @@ def get_engine() -> AsyncEngine:
     # Поэтому при пересоздании loop (pytest/anyio) мы должны уметь пересоздать engine.
     if _engine is None:
         settings = get_settings()
-
-        # future=True в SQLAlchemy 2.x не нужен, но можно оставить — не мешает.
-        _engine = create_async_engine(
-            settings.database_url,
-            future=True,
-            pool_pre_ping=True,
-        )
+        _engine = create_engine_for(settings.database_url)
 
         _sessionmaker = async_sessionmaker(
             bind=_engine,
@@ -36,6 +37,73 @@ def get_engine() -> AsyncEngine:
     return _engine
 
 
+# -------------------- встроенный SQLite --------------------
+# DATABASE_URL=sqlite+aiosqlite:///./ads.db — один узел без PostgreSQL: edge-развёртывание
+# и быстрый локальный прогон тестов/бенчмарков. Только файл: базу в памяти (sqlite+aiosqlite://)
+# можно держать лишь на одном соединении (StaticPool), а на нём транзакции параллельных запросов
+# перемешиваются — rollback одной сессии откатывал незакоммиченные записи другой.
+# Схему создаёт create_embedded_schema() (миграции Alembic — только для PostgreSQL).
+# Отличия от PostgreSQL закрыты в CRUD ветками по db.bind.dialect.name; чего нет совсем:
+# партиций, LISTEN/NOTIFY между процессами, сводки статистики (app/rollups.py).
+
+
+def _is_memory_sqlite(url: URL) -> bool:
+    return url.database in (None, "", ":memory:")
+
+
+def _archive_path(url: URL) -> str:
+    # схема archive (PurgedAdvertisement) — отдельный файл рядом с основным
+    path = Path(url.database)
+    return str(path.with_name(f"{path.stem}.archive{path.suffix or '.db'}"))
+
+
+@compiles(now, "sqlite")
+def _sqlite_now(element, compiler, **kw):
+    # CURRENT_TIMESTAMP у SQLite — с точностью до секунды: "истекает через 0.3 с" сравнивалось бы
+    # с началом текущей секунды. Формат (6 знаков дробной части) совпадает с тем, как SQLAlchemy
+    # пишет datetime, — строки сравниваются корректно
+    return "strftime('%Y-%m-%d %H:%M:%f000', 'now')"
+
+
+def _sqlite_lower(value):
+    # встроенный lower() SQLite понижает только ASCII; ILIKE/suggest должны работать и с кириллицей
+    return value.lower() if isinstance(value, str) else value
+
+
+def create_engine_for(database_url: str) -> AsyncEngine:
+    url = make_url(database_url)
+    if url.get_backend_name() != "sqlite":
+        # future=True в SQLAlchemy 2.x не нужен, но можно оставить — не мешает.
+        return create_async_engine(url, future=True, pool_pre_ping=True)
+
+    if _is_memory_sqlite(url):
+        raise ValueError("in-memory SQLite is not supported; use a file URL, e.g. sqlite+aiosqlite:///./ads.db")
+    engine = create_async_engine(url, future=True)
+    archive = _archive_path(url)
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        dbapi_connection.create_function("lower", 1, _sqlite_lower, deterministic=True)
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys = ON")  # ON DELETE CASCADE/SET NULL
+        cursor.execute("PRAGMA busy_timeout = 5000")
+        cursor.execute("PRAGMA journal_mode = WAL")  # читатели не ждут писателя
+        cursor.execute("PRAGMA synchronous = NORMAL")
+        cursor.execute("ATTACH DATABASE ? AS archive", (archive,))
+        cursor.close()
+
+    return engine
+
+
+async def create_embedded_schema(engine: AsyncEngine | None = None) -> None:
+    # Для SQLite: таблицы, индексы и FTS5 (app/models.py) — create_all, существующее не трогает
+    from app.models import Base
+
+    engine = engine or get_engine()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
 def get_sessionmaker() -> async_sessionmaker[AsyncSession]:
     # Гарантируем, что sessionmaker создаётся вместе с engine
     if _sessionmaker is None:
@@ -44,17 +112,82 @@ def get_sessionmaker() -> async_sessionmaker[AsyncSession]:
     return _sessionmaker
 
 
+class LazySession:
+    """
+    Ленивая обёртка над AsyncSession для FastAPI-зависимости.
+
+    Сама AsyncSession создаётся только при первом обращении к любому её атрибуту
+    (execute/add/commit/...). Запросы, которые не дошли до БД (нет токена,
+    невалидный токен, 4xx до запроса к базе), вообще не трогают пул соединений.
+    """
+
+    def __init__(self, factory: async_sessionmaker[AsyncSession]):
+        self._factory = factory
+        self._session: AsyncSession | None = None
+
+    @property
+    def started(self) -> bool:
+        # True — сессия уже создана (значит запрос реально пошёл в БД)
+        return self._session is not None
+
+    def _get(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._factory()
+        return self._session
+
+    def __getattr__(self, name: str):
+        # Вызывается только для атрибутов, которых нет у самой обёртки,
+        # т.е. для всего API AsyncSession.
+        return getattr(self._get(), name)
+
+    async def aclose(self) -> None:
+        session = self._session
+        if session is None:
+            return
+        try:
+            # rollback нужен только если транзакция реально открыта
+            # (после commit или без запросов — лишний round-trip не делаем)
+            if session.in_transaction():
+                await session.rollback()
+        finally:
+            await session.close()
+            self._session = None
+
+
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
-    # Сессия на каждый запрос (FastAPI dependency)
-    Session = get_sessionmaker()
-    async with Session() as session:
+    # Сессия на каждый запрос (FastAPI dependency).
+    # ВАЖНО: сессия ленивая — соединение из пула берётся только при первом запросе к БД.
+    lazy = LazySession(get_sessionmaker())
+    try:
+        yield lazy  # type: ignore[misc]  # duck-typing: ведёт себя как AsyncSession
+    finally:
+        # Если где-то забыли commit/rollback — откатываем открытую транзакцию,
+        # но только если она действительно была начата.
+        await lazy.aclose()
+
+
+@asynccontextmanager
+async def advisory_lock(name: str, engine: AsyncEngine | None = None) -> AsyncIterator[bool]:
+    """
+    Сессионный pg_try_advisory_lock на время блока: фоновые задачи идут в каждом воркере uvicorn,
+    а проход должен выполнять один. Отдаёт False, если замок держит другой процесс, — проход
+    пропускается, а не ждёт. Соединение в AUTOCOMMIT: замок не держит открытую транзакцию.
+    Не PostgreSQL (встроенный SQLite — один процесс) — всегда True.
+    """
+    engine = engine or get_engine()
+    if engine.dialect.name != "postgresql":
+        yield True
+        return
+
+    key = zlib.crc32(name.encode())  # 32-битный ключ стабилен между процессами, в отличие от hash()
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        acquired = bool(await conn.scalar(select(func.pg_try_advisory_lock(key))))
         try:
-            yield session
+            yield acquired
         finally:
-            # На всякий случай: если где-то забыли commit/rollback,
-            # закрытие сессии не должно оставлять "подвисшие" транзакции.
-            # (async with сам закроет, но rollback делает поведение стабильнее)
-            await session.rollback()
+            if acquired:
+                await conn.scalar(select(func.pg_advisory_unlock(key)))
 
 
 async def close_engine() -> None:
@@ -2,7 +2,7 @@
 
 from __future__ import annotations
 
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Request
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -12,6 +12,10 @@ from app.security import decode_token
 
 bearer_scheme = HTTPBearer(auto_error=False)
 
+# request.state: (токен, пользователь или None), если токен уже проверил ProfilingMiddleware
+# (app/profiling.py) — повторно не декодируем и не ходим в users
+AUTH_STATE = "auth"
+
 
 def _is_admin_like(user) -> bool:
     # root должен иметь права admin, но сам root создаётся только bootstrap-ом через env
@@ -19,6 +23,7 @@ def _is_admin_like(user) -> bool:
 
 
 async def get_current_user_optional(
+    request: Request,
     creds: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
     db: AsyncSession = Depends(get_db),
 ):
@@ -26,6 +31,12 @@ async def get_current_user_optional(
         return None
 
     token = creds.credentials
+    resolved = getattr(request.state, AUTH_STATE, None)
+    if resolved is not None and resolved[0] == token:
+        if resolved[1] is None:
+            raise HTTPException(status_code=401, detail="Invalid or expired token")
+        return resolved[1]
+
     try:
         payload = decode_token(token)
         user_id = int(payload["sub"])
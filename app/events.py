@@ -0,0 +1,305 @@
+# Живая лента объявлений: GET /advertisement/stream (Server-Sent Events).
+#
+# Источник событий — PostgreSQL LISTEN/NOTIFY:
+# - AdvertisementCRUD.create/create_many/patch/delete делают pg_notify в своей транзакции
+# - на каждый воркер ОДНО соединение LISTEN (AdvertisementEventBroker), а не по соединению на клиента
+# - брокер дочитывает изменённые строки пачкой (get_many) и раздаёт событие подписчикам в процессе
+#
+# Встроенный SQLite (app/db.py): NOTIFY нет — CRUD складывает события в session.info,
+# а после COMMIT они идут прямо в брокер этого процесса (других процессов у такой БД и не бывает).
+#
+# Backpressure: у каждого подписчика ограниченная очередь. Если клиент не успевает читать
+# и очередь переполнилась — он получает event: overflow (сигнал перечитать поиск) и отключается,
+# остальные подписчики от него не тормозят.
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Optional
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.crud import ADVERTISEMENT_EVENTS_CHANNEL, LOCAL_EVENTS_KEY, AdvertisementCRUD
+from app.db import get_engine, get_sessionmaker
+from app.schemas import AdvertisementOut
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class AdvertisementFilter:
+    # Те же параметры, что у поиска GET /advertisement (и та же семантика ILIKE '%...%')
+    title: Optional[str] = None
+    description: Optional[str] = None
+    author: Optional[str] = None
+    q: Optional[str] = None
+    price_from: Optional[Decimal] = None
+    price_to: Optional[Decimal] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+
+    def __post_init__(self):
+        # ?created_from=2026-01-01T00:00 без смещения — считаем UTC, как хранится created_at;
+        # иначе сравнение naive с aware падает TypeError на каждом событии
+        for name in ("created_from", "created_to"):
+            value = getattr(self, name)
+            if value is not None and value.tzinfo is None:
+                object.__setattr__(self, name, value.replace(tzinfo=timezone.utc))
+
+    def matches(self, ad) -> bool:
+        def contains(value: str, needle: Optional[str]) -> bool:
+            return not needle or needle.casefold() in value.casefold()
+
+        if not (contains(ad.title, self.title) and contains(ad.description, self.description)):
+            return False
+        if not contains(ad.author, self.author):
+            return False
+        if self.q and not any(contains(v, self.q) for v in (ad.title, ad.description, ad.author)):
+            return False
+        if self.price_from is not None and ad.price < self.price_from:
+            return False
+        if self.price_to is not None and ad.price > self.price_to:
+            return False
+        if self.created_from is not None and ad.created_at < self.created_from:
+            return False
+        if self.created_to is not None and ad.created_at > self.created_to:
+            return False
+        return True
+
+
+class Subscriber:
+    def __init__(self, filters: AdvertisementFilter, queue_size: int):
+        self.filters = filters
+        self.queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = asyncio.Event()
+
+
+class AdvertisementEventBroker:
+    BATCH = 200  # сколько событий дочитываем одним запросом get_many
+    RECONNECT_DELAY = 1.0
+
+    def __init__(self):
+        self._subscribers: set[Subscriber] = set()
+        self._incoming: asyncio.Queue[dict] = asyncio.Queue()
+        self._listener_task: asyncio.Task | None = None
+        self._dispatcher_task: asyncio.Task | None = None
+
+        # метрики (GET /admin/metrics)
+        self.received = 0
+        self.delivered = 0
+        self.dropped_subscribers = 0
+        self.reconnects = 0
+
+    # ---------- подписка ----------
+
+    def subscribe(self, filters: AdvertisementFilter) -> Subscriber:
+        self._ensure_started()
+        sub = Subscriber(filters, get_settings().events_subscriber_queue_size)
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        self._subscribers.discard(sub)
+
+    def _ensure_started(self) -> None:
+        # LISTEN поднимаем лениво — воркеры без подписчиков соединение не держат
+        listen = get_engine().dialect.name == "postgresql"
+        if listen and (self._listener_task is None or self._listener_task.done()):
+            self._listener_task = asyncio.ensure_future(self._listen_forever())
+        if self._dispatcher_task is None or self._dispatcher_task.done():
+            self._dispatcher_task = asyncio.ensure_future(self._dispatch_forever())
+
+    async def close(self) -> None:
+        for task in (self._listener_task, self._dispatcher_task):
+            if task is not None:
+                task.cancel()
+        for task in (self._listener_task, self._dispatcher_task):
+            if task is not None:
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._listener_task = self._dispatcher_task = None
+        self._subscribers.clear()
+
+    # ---------- LISTEN ----------
+
+    def _on_notify(self, conn, pid, channel, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return
+        self.received += 1
+        self._incoming.put_nowait(event)
+
+    def publish_local(self, events: list[dict]) -> None:
+        # события закоммиченной транзакции этого процесса (SQLite, без NOTIFY)
+        if not self._subscribers:
+            return
+        self._ensure_started()
+        for event_ in events:
+            self.received += 1
+            self._incoming.put_nowait(event_)
+
+    async def _listen_forever(self) -> None:
+        # asyncpg напрямую: SQLAlchemy-пулу это соединение отдавать нельзя, оно живёт всё время.
+        # Импорт здесь: на встроенном SQLite слушателя нет и драйвер PostgreSQL не нужен
+        import asyncpg
+
+        dsn = make_url(get_settings().database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+        first = True
+        while True:
+            lost = asyncio.Event()
+            conn = None
+            try:
+                conn = await asyncpg.connect(dsn)
+                conn.add_termination_listener(lambda _conn: lost.set())
+                await conn.add_listener(ADVERTISEMENT_EVENTS_CHANNEL, self._on_notify)
+                if not first:
+                    # пока переподключались, события могли потеряться — клиентам стоит перечитать
+                    self._incoming.put_nowait({"op": "resync"})
+                first = False
+                await lost.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("LISTEN %s failed", ADVERTISEMENT_EVENTS_CHANNEL)
+            finally:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            self.reconnects += 1
+            await asyncio.sleep(self.RECONNECT_DELAY)
+
+    # ---------- fan-out ----------
+
+    async def _dispatch_forever(self) -> None:
+        while True:
+            events = [await self._incoming.get()]
+            while len(events) < self.BATCH and not self._incoming.empty():
+                events.append(self._incoming.get_nowait())
+            try:
+                await self._dispatch(events)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("advertisement events dispatch failed")
+
+    async def _dispatch(self, events: list[dict]) -> None:
+        ids = {e["id"] for e in events if e.get("op") in ("created", "updated")}
+        ads = {}
+        if ids and self._subscribers:
+            async with get_sessionmaker()() as db:
+                ads = {ad.id: ad for ad in await AdvertisementCRUD(db).get_many(sorted(ids))}
+
+        for event in events:
+            op = event.get("op")
+            ad = ads.get(event.get("id"))
+            if op in ("created", "updated") and ad is None:
+                # строку уже удалили (или нет подписчиков) — для клиента это удаление
+                op = "deleted"
+            message = {"op": op}
+            if op in ("created", "updated"):
+                message["advertisement"] = jsonable_encoder(AdvertisementOut.model_validate(ad))
+            elif op == "deleted":
+                message["id"] = event.get("id")
+
+            for sub in list(self._subscribers):
+                # удаления и resync — всем: клиент мог показывать это объявление
+                if ad is not None and op != "deleted":
+                    try:
+                        matched = sub.filters.matches(ad)
+                    except Exception:
+                        # кривой фильтр одного подписчика не должен съедать пачку у остальных
+                        logger.exception("subscriber filter failed: %r", sub.filters)
+                        continue
+                    if not matched:
+                        continue
+                try:
+                    sub.queue.put_nowait(message)
+                    self.delivered += 1
+                except asyncio.QueueFull:
+                    self._subscribers.discard(sub)
+                    sub.overflowed.set()
+                    self.dropped_subscribers += 1
+
+    def stats(self) -> dict:
+        return {
+            "listening": self._listener_task is not None and not self._listener_task.done(),
+            "subscribers": len(self._subscribers),
+            "received": self.received,
+            "delivered": self.delivered,
+            "dropped_subscribers": self.dropped_subscribers,
+            "reconnects": self.reconnects,
+        }
+
+
+_broker: AdvertisementEventBroker | None = None
+
+
+def get_event_broker() -> AdvertisementEventBroker:
+    global _broker
+    if _broker is None:
+        _broker = AdvertisementEventBroker()
+    return _broker
+
+
+async def close_event_broker() -> None:
+    global _broker
+    if _broker is not None:
+        await _broker.close()
+    _broker = None
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_local_events(session: Session) -> None:
+    events = session.info.pop(LOCAL_EVENTS_KEY, None)
+    if events and _broker is not None:
+        _broker.publish_local(events)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_local_events(session: Session) -> None:
+    session.info.pop(LOCAL_EVENTS_KEY, None)
+
+
+def format_sse(message: dict, event_id: int) -> str:
+    return f"id: {event_id}\nevent: {message['op']}\ndata: {json.dumps(message, ensure_ascii=False)}\n\n"
+
+
+async def sse_stream(request, filters: AdvertisementFilter):
+    """Генератор тела StreamingResponse для одного клиента."""
+    broker = get_event_broker()
+    sub = broker.subscribe(filters)
+    heartbeat = get_settings().events_heartbeat_seconds
+    event_id = 0
+    try:
+        yield ": connected\n\n"
+        while True:
+            get_task = asyncio.ensure_future(sub.queue.get())
+            overflow_task = asyncio.ensure_future(sub.overflowed.wait())
+            done, _ = await asyncio.wait({get_task, overflow_task}, timeout=heartbeat, return_when=asyncio.FIRST_COMPLETED)
+            overflow_task.cancel()
+            if get_task in done:
+                event_id += 1
+                yield format_sse(get_task.result(), event_id)
+                continue
+            get_task.cancel()
+
+            if sub.overflowed.is_set():
+                # клиент не успевал читать: просим перечитать поиск и переподключиться
+                yield 'event: overflow\ndata: {"op": "overflow"}\n\n'
+                return
+            if await request.is_disconnected():
+                return
+            yield ": ping\n\n"  # heartbeat: держим соединение через прокси
+    finally:
+        broker.unsubscribe(sub)
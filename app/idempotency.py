@@ -0,0 +1,232 @@
+# Idempotency-Key для POST /advertisement и POST /user.
+#
+# Клиент повторяет запрос с тем же заголовком Idempotency-Key (таймаут, обрыв связи) —
+# получает сохранённый ответ, вставка (и bcrypt для /user) повторно НЕ выполняются.
+# Одновременные дубли ждут первое выполнение и получают его результат.
+#
+# Хранилища (IDEMPOTENCY_BACKEND):
+# - memory — словарь с TTL в процессе (один узел / один воркер)
+# - db     — таблица idempotency_keys (несколько воркеров/узлов)
+#
+# Сохраняются только успешные ответы: если первое выполнение упало (в т.ч. 4xx),
+# ключ освобождается и повтор выполнится заново.
+#
+# db: захват ключа — аренда на IDEMPOTENCY_LEASE_SECONDS (locked_until), отдельно от TTL ответа.
+# Воркер умер после захвата или не смог сохранить ответ — по истечении аренды повтор
+# перехватывает ключ и выполняется, а не получает 409 до конца TTL.
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable
+
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import and_, delete, or_, select, update
+
+from app.config import get_settings
+from app.crud import upsert_insert
+from app.db import get_sessionmaker
+from app.models import IdempotencyKey
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+class IdempotencyConflict(Exception):
+    """Тот же ключ пришёл с другим телом запроса."""
+
+
+class IdempotencyInProgress(Exception):
+    """Первое выполнение ещё не закончилось, а ждать дольше нельзя."""
+
+
+def fingerprint(payload: Any) -> str:
+    # HMAC, а не голый sha256: в теле POST /user есть пароль, его быстрый хэш хранить нельзя
+    raw = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    secret = get_settings().jwt_secret.encode("utf-8")
+    return hmac.new(secret, raw.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+@dataclass
+class _MemoryEntry:
+    fingerprint: str
+    future: asyncio.Future
+    expires_at: float
+
+
+class InMemoryIdempotencyStore:
+    def __init__(self, ttl_seconds: int):
+        self.ttl = ttl_seconds
+        self._entries: dict[str, _MemoryEntry] = {}
+        self._last_purge = time.monotonic()
+
+    def _purge(self, now: float) -> None:
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        for key in [k for k, e in self._entries.items() if e.expires_at <= now and e.future.done()]:
+            del self._entries[key]
+
+    async def run(self, key: str, fp: str, fn: Callable[[], Awaitable[Any]], *, wait_timeout: float) -> tuple[Any, bool]:
+        now = time.monotonic()
+        self._purge(now)
+
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at > now:
+            if entry.fingerprint != fp:
+                raise IdempotencyConflict()
+            if entry.future.done():
+                # упавшие выполнения из словаря удаляются, значит тут всегда результат
+                return entry.future.result(), True
+            try:
+                return await asyncio.wait_for(asyncio.shield(entry.future), wait_timeout), True
+            except asyncio.TimeoutError:
+                raise IdempotencyInProgress()
+
+        fut = asyncio.get_running_loop().create_future()
+        # исключение первого выполнения могут не забрать (нет дублей) — без warning-ов в лог
+        fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._entries[key] = _MemoryEntry(fingerprint=fp, future=fut, expires_at=now + self.ttl)
+        try:
+            body = await fn()
+        except BaseException as e:
+            self._entries.pop(key, None)
+            fut.set_exception(e)
+            raise
+        fut.set_result(body)
+        return body, False
+
+
+class DbIdempotencyStore:
+    POLL_INTERVAL = 0.05
+    PURGE_EVERY = 100  # раз в N захватов ключа чистим просроченные записи
+
+    def __init__(self, ttl_seconds: int, lease_seconds: int = 60):
+        self.ttl = ttl_seconds
+        self.lease = lease_seconds
+        self._claims = 0
+
+    @staticmethod
+    def _stale(now: datetime):
+        # ответ устарел по TTL или захват брошен (аренда истекла, ответа нет)
+        return or_(
+            IdempotencyKey.expires_at <= now,
+            and_(IdempotencyKey.response.is_(None), IdempotencyKey.locked_until <= now),
+        )
+
+    async def _claim(self, key: str, fp: str) -> bool:
+        now = datetime.now(timezone.utc)
+        async with get_sessionmaker()() as db:
+            await db.execute(delete(IdempotencyKey).where(IdempotencyKey.key == key, self._stale(now)))
+            res = await db.execute(
+                upsert_insert(db, IdempotencyKey)
+                .values(
+                    key=key,
+                    fingerprint=fp,
+                    expires_at=now + timedelta(seconds=self.ttl),
+                    locked_until=now + timedelta(seconds=self.lease),
+                )
+                .on_conflict_do_nothing(index_elements=[IdempotencyKey.key])
+                .returning(IdempotencyKey.key)
+            )
+            claimed = res.scalar_one_or_none() is not None
+
+            self._claims += 1
+            if self._claims % self.PURGE_EVERY == 0:
+                await db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= now))
+            await db.commit()
+        return claimed
+
+    async def _finish(self, key: str, body: Any | None) -> None:
+        async with get_sessionmaker()() as db:
+            if body is None:
+                await db.execute(delete(IdempotencyKey).where(IdempotencyKey.key == key))
+            else:
+                await db.execute(
+                    update(IdempotencyKey).where(IdempotencyKey.key == key).values(response=body, locked_until=None)
+                )
+            await db.commit()
+
+    async def _lookup(self, key: str) -> IdempotencyKey | None:
+        async with get_sessionmaker()() as db:
+            res = await db.execute(select(IdempotencyKey).where(IdempotencyKey.key == key))
+            return res.scalar_one_or_none()
+
+    async def run(self, key: str, fp: str, fn: Callable[[], Awaitable[Any]], *, wait_timeout: float) -> tuple[Any, bool]:
+        deadline = time.monotonic() + wait_timeout
+        while True:
+            if await self._claim(key, fp):
+                try:
+                    body = await fn()
+                except BaseException:
+                    await asyncio.shield(self._finish(key, None))
+                    raise
+                await self._finish(key, body)
+                return body, False
+
+            # ключ занят: либо уже есть сохранённый ответ, либо кто-то выполняет прямо сейчас
+            while True:
+                row = await self._lookup(key)
+                if row is None:
+                    break  # первое выполнение упало и освободило ключ — пробуем захватить сами
+                if row.fingerprint != fp:
+                    raise IdempotencyConflict()
+                if row.response is not None:
+                    return row.response, True
+                if row.locked_until is not None and row.locked_until <= datetime.now(timezone.utc):
+                    break  # захвативший воркер пропал — аренда истекла, перехватываем
+                if time.monotonic() >= deadline:
+                    raise IdempotencyInProgress()
+                await asyncio.sleep(self.POLL_INTERVAL)
+
+
+_store: InMemoryIdempotencyStore | DbIdempotencyStore | None = None
+
+
+def get_idempotency_store() -> InMemoryIdempotencyStore | DbIdempotencyStore:
+    global _store
+    if _store is None:
+        settings = get_settings()
+        if settings.idempotency_backend == "db":
+            _store = DbIdempotencyStore(settings.idempotency_ttl_seconds, settings.idempotency_lease_seconds)
+        else:
+            _store = InMemoryIdempotencyStore(settings.idempotency_ttl_seconds)
+    return _store
+
+
+async def run_idempotent(
+    response: Response,
+    *,
+    key: str,
+    scope: str,
+    payload: Any,
+    fn: Callable[[], Awaitable[Any]],
+) -> Any:
+    """
+    Выполняет fn() не более одного раза на (scope, key).
+
+    scope — метод/путь + кто вызывает: один и тот же ключ у разных пользователей не пересекается.
+    fn должна вернуть JSON-совместимое тело ответа (его и сохраняем).
+    """
+    settings = get_settings()
+    try:
+        body, replayed = await get_idempotency_store().run(
+            f"{scope}:{key}",
+            fingerprint(payload),
+            fn,
+            wait_timeout=settings.idempotency_wait_timeout,
+        )
+    except IdempotencyConflict:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request body")
+    except IdempotencyInProgress:
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return body
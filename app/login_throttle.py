@@ -0,0 +1,255 @@
+# Ограничение попыток входа: POST /login отвечает 429 ДО поиска пользователя и bcrypt.
+#
+# - token bucket на имя пользователя (перебор паролей одного аккаунта, в т.ч. с разных IP)
+#   и на IP клиента (credential stuffing: много имён с одного адреса)
+# - экспоненциальная пауза после неудачных попыток для пары (имя, IP): после LOGIN_BACKOFF_AFTER
+#   неудач подряд — BASE, 2*BASE, 4*BASE... секунд, но не больше MAX; успешный вход сбрасывает счётчик.
+#   Пара, а не одно имя: чужие неудачи с другого адреса не блокируют владельцу вход
+#
+# Хранилища (LOGIN_THROTTLE_BACKEND):
+# - memory — словари в процессе (один узел / один воркер); число ключей ограничено LRU
+# - db     — таблица login_throttle (несколько воркеров/узлов): одна атомарная UPSERT на bucket
+
+from __future__ import annotations
+
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy import text
+
+from app.config import get_settings
+from app.db import get_sessionmaker
+
+
+@dataclass(frozen=True)
+class Bucket:
+    capacity: float  # сколько попыток подряд
+    per_second: float  # скорость пополнения
+
+    def full_after(self) -> float:
+        return self.capacity / self.per_second
+
+
+@dataclass(frozen=True)
+class ThrottlePolicy:
+    user: Bucket
+    ip: Bucket
+    backoff_after: int
+    backoff_base: float
+    backoff_max: float
+    backoff_reset: float  # неудачи старше этого забываются
+
+    def backoff(self, failures: int) -> float:
+        if failures < self.backoff_after:
+            return 0.0
+        return min(self.backoff_max, self.backoff_base * 2 ** (failures - self.backoff_after))
+
+    def idle_after(self) -> float:
+        # через сколько секунд простоя запись ничего не ограничивает и её можно удалить
+        return max(self.user.full_after(), self.ip.full_after(), self.backoff_reset, self.backoff_max)
+
+
+def _user_key(username: str) -> str:
+    return f"user:{username.strip().lower()}"
+
+
+def _ip_key(ip: str) -> str:
+    return f"ip:{ip}"
+
+
+def _failure_key(username: str, ip: str) -> str:
+    return f"fail:{username.strip().lower()}|{ip}"
+
+
+class InMemoryLoginThrottle:
+    def __init__(self, policy: ThrottlePolicy, *, max_keys: int):
+        self.policy = policy
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()  # key -> (tokens, monotonic)
+        self._failures: OrderedDict[str, tuple[int, float, float]] = OrderedDict()  # key -> (count, last, locked_until)
+
+        # метрики
+        self.rejected = 0
+
+    def _trim(self, entries: OrderedDict) -> None:
+        # вытеснение bucket = он снова полный: при потоке с миллиона IP проигрываем в строгости,
+        # но не в памяти; bucket по имени пользователя при этом продолжает работать
+        while len(entries) > self.max_keys:
+            entries.popitem(last=False)
+
+    def _take(self, key: str, bucket: Bucket, now: float) -> float:
+        tokens, updated = self._buckets.get(key, (bucket.capacity, now))
+        tokens = min(bucket.capacity, tokens + (now - updated) * bucket.per_second)
+        if tokens >= 1:
+            tokens -= 1
+            retry_after = 0.0
+        else:
+            retry_after = (1 - tokens) / bucket.per_second
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        self._trim(self._buckets)
+        return retry_after
+
+    async def check(self, username: str, ip: str) -> float:
+        """0 — можно проверять пароль, иначе через сколько секунд повторить."""
+        now = time.monotonic()
+        failure = self._failures.get(_failure_key(username, ip))
+        if failure is not None and failure[2] > now:
+            self.rejected += 1
+            return failure[2] - now
+
+        retry_after = max(
+            self._take(_user_key(username), self.policy.user, now),
+            self._take(_ip_key(ip), self.policy.ip, now),
+        )
+        if retry_after:
+            self.rejected += 1
+        return retry_after
+
+    async def failure(self, username: str, ip: str) -> None:
+        now = time.monotonic()
+        key = _failure_key(username, ip)
+        count, last, _ = self._failures.get(key, (0, now, 0.0))
+        count = 1 if now - last > self.policy.backoff_reset else count + 1
+        self._failures[key] = (count, now, now + self.policy.backoff(count))
+        self._failures.move_to_end(key)
+        self._trim(self._failures)
+
+    async def success(self, username: str, ip: str) -> None:
+        self._failures.pop(_failure_key(username, ip), None)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "buckets": len(self._buckets),
+            "failure_keys": len(self._failures),
+            "rejected": self.rejected,
+        }
+
+
+# token bucket одной командой: пополнение по прошедшему времени и списание, только если есть целый токен.
+# Если токена нет, UPDATE не выполняется и RETURNING пуст
+_TAKE_SQL = text(
+    """
+    INSERT INTO login_throttle (key, tokens, updated_at)
+    VALUES (:key, CAST(:capacity AS double precision) - 1, now())
+    ON CONFLICT (key) DO UPDATE
+    SET tokens = LEAST(CAST(:capacity AS double precision),
+                       login_throttle.tokens + EXTRACT(EPOCH FROM now() - login_throttle.updated_at) * CAST(:rate AS double precision)) - 1,
+        updated_at = now()
+    WHERE LEAST(CAST(:capacity AS double precision),
+                login_throttle.tokens + EXTRACT(EPOCH FROM now() - login_throttle.updated_at) * CAST(:rate AS double precision)) >= 1
+    RETURNING tokens
+    """
+)
+
+_LOCKED_SQL = text(
+    "SELECT EXTRACT(EPOCH FROM locked_until - now()) FROM login_throttle WHERE key = :key AND locked_until > now()"
+)
+
+_FAILURE_SQL = text(
+    """
+    INSERT INTO login_throttle (key, failures, updated_at)
+    VALUES (:key, 1, now())
+    ON CONFLICT (key) DO UPDATE
+    SET failures = CASE
+            WHEN login_throttle.updated_at < now() - make_interval(secs => CAST(:reset AS double precision)) THEN 1
+            ELSE login_throttle.failures + 1
+        END,
+        updated_at = now()
+    RETURNING failures
+    """
+)
+
+_LOCK_SQL = text(
+    "UPDATE login_throttle SET locked_until = now() + make_interval(secs => CAST(:delay AS double precision)) WHERE key = :key"
+)
+
+_PURGE_SQL = text(
+    "DELETE FROM login_throttle WHERE updated_at < now() - make_interval(secs => CAST(:idle AS double precision))"
+)
+
+
+class DbLoginThrottle:
+    PURGE_EVERY = 1000  # раз в N проверок удаляем простаивающие записи
+
+    def __init__(self, policy: ThrottlePolicy):
+        self.policy = policy
+        self._checks = 0
+
+        # метрики
+        self.rejected = 0
+
+    async def check(self, username: str, ip: str) -> float:
+        """0 — можно проверять пароль, иначе через сколько секунд повторить."""
+        async with get_sessionmaker()() as db:
+            locked = (await db.execute(_LOCKED_SQL, {"key": _failure_key(username, ip)})).scalar_one_or_none()
+            if locked is not None:
+                self.rejected += 1
+                return float(locked)
+
+            retry_after = 0.0
+            for key, bucket in ((_user_key(username), self.policy.user), (_ip_key(ip), self.policy.ip)):
+                res = await db.execute(_TAKE_SQL, {"key": key, "capacity": bucket.capacity, "rate": bucket.per_second})
+                if res.scalar_one_or_none() is None:
+                    # остаток токенов не читаем отдельным запросом: отвечаем верхней оценкой
+                    retry_after = max(retry_after, 1 / bucket.per_second)
+
+            self._checks += 1
+            if self._checks % self.PURGE_EVERY == 0:
+                await db.execute(_PURGE_SQL, {"idle": self.policy.idle_after()})
+            await db.commit()
+
+        if retry_after:
+            self.rejected += 1
+        return retry_after
+
+    async def failure(self, username: str, ip: str) -> None:
+        key = _failure_key(username, ip)
+        async with get_sessionmaker()() as db:
+            failures = (await db.execute(_FAILURE_SQL, {"key": key, "reset": self.policy.backoff_reset})).scalar_one()
+            delay = self.policy.backoff(failures)
+            if delay:
+                await db.execute(_LOCK_SQL, {"key": key, "delay": delay})
+            await db.commit()
+
+    async def success(self, username: str, ip: str) -> None:
+        async with get_sessionmaker()() as db:
+            await db.execute(text("DELETE FROM login_throttle WHERE key = :key"), {"key": _failure_key(username, ip)})
+            await db.commit()
+
+    def stats(self) -> dict:
+        return {"backend": "db", "rejected": self.rejected}
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+
+_throttle: InMemoryLoginThrottle | DbLoginThrottle | None = None
+
+
+def get_login_throttle() -> InMemoryLoginThrottle | DbLoginThrottle:
+    global _throttle
+    if _throttle is None:
+        settings = get_settings()
+        policy = ThrottlePolicy(
+            user=Bucket(settings.login_user_burst, settings.login_user_per_minute / 60),
+            ip=Bucket(settings.login_ip_burst, settings.login_ip_per_minute / 60),
+            backoff_after=settings.login_backoff_after,
+            backoff_base=settings.login_backoff_base_seconds,
+            backoff_max=settings.login_backoff_max_seconds,
+            backoff_reset=settings.login_backoff_reset_seconds,
+        )
+        if settings.login_throttle_backend == "db":
+            _throttle = DbLoginThrottle(policy)
+        else:
+            _throttle = InMemoryLoginThrottle(policy, max_keys=settings.login_throttle_max_keys)
+    return _throttle
+
+
+def close_login_throttle() -> None:
+    global _throttle
+    _throttle = None
@@ -1,40 +1,120 @@
 from __future__ import annotations
 
-from contextlib import asynccontextmanager
-from datetime import datetime
+import asyncio
+import logging
+from contextlib import asynccontextmanager, suppress
+from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal
-from typing import Optional
+from typing import Literal, Optional
 
-from fastapi import Depends, FastAPI, HTTPException, Query, status  # Добавил для DELETE Response И Response, ДОБАВЛЯЕМ ИПОРТЫ ПО ЗАДАНИЮ status
+from fastapi import Depends, FastAPI, Header, HTTPException, Path, Query, Request, Response, status  # Добавил для DELETE Response И Response, ДОБАВЛЯЕМ ИПОРТЫ ПО ЗАДАНИЮ status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.audit import close_audit_writer, get_audit_writer
+from app.batching import close_ad_write_batcher, get_ad_write_batcher
+from app.compression import CompressionMiddleware
 from app.config import get_settings
-from app.crud import AdvertisementCRUD, UserCRUD  # ДОБАВЛЯЕМ ИПОРТЫ ПО ЗАДАНИЮ
-from app.db import close_engine, get_db
+from app.crud import SEARCH_SORTS, AdvertisementCRUD, AuditLogCRUD, MarketStatsCRUD, SavedSearchCRUD, UserCRUD, search_sort_key, user_sort_key  # ДОБАВЛЯЕМ ИПОРТЫ ПО ЗАДАНИЮ
+from app.db import close_engine, create_embedded_schema, get_db, get_engine, get_sessionmaker
 from app.deps import get_current_user_optional, get_current_user
+from app.events import AdvertisementFilter, close_event_broker, get_event_broker, sse_stream
+from app.idempotency import run_idempotent
+from app.login_throttle import close_login_throttle, get_login_throttle, retry_after_header
+from app.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from app.partitions import partition_maintenance_loop, partition_status
+from app.percolator import close_percolator, get_percolator
+from app.profiling import ProfilingMiddleware, get_profile_store, profiling_toggle
+from app.purge import purge_loop
+from app.rollups import stats_rollup_loop
 from app.schemas import (
+    AdvertisementBatchOut,
+    AdvertisementBatchRequest,
     AdvertisementCreate,
+    AdvertisementDailyStatsOut,
     AdvertisementOut,
     AdvertisementUpdate,
+    AuditLogEntryOut,
     LoginRequest,
+    OwnerReassign,
+    OwnerReassignResult,
+    ProfilingEnable,
+    SavedSearchCreate,
+    SavedSearchOut,
+    SearchInboxItemOut,
     TokenResponse,
+    UserBrief,
     UserCreate,
+    UserGroup,
     UserOut,
     UserUpdate,
 )
-from app.security import create_access_token
+from app.security import create_access_token, get_token_cache
+from app.singleflight import advertisement_gets, advertisement_searches
+from app.suggest import (
+    SUGGEST_LIMIT_MAX,
+    get_suggest_cache,
+    invalidate_titles,
+    suggest_titles,
+    warm_suggest_cache_in_background,
+)
+
 
+logger = logging.getLogger(__name__)
 
 settings = get_settings()
 
 # -------------------- LIFESPAN (startup/shutdown) + BOOTSTRAP ROOT --------------------
 
+async def bootstrap_root() -> None:
+    # get_db — dependency-generator, можно использовать его вручную
+    # ВАЖНО: нельзя делать `async for ... break` без корректного закрытия генератора,
+    # иначе сессия/соединение может остаться “подвешенным” (особенно в тестах с разными event loop).
+    db_gen = get_db()
+    db = await anext(db_gen)
+    try:
+        existing = await UserCRUD(db).get_by_username(settings.bootstrap_root_username)
+        if not existing:
+            # создаём root (самый первый админ)
+            await UserCRUD(db).create(
+                username=settings.bootstrap_root_username,
+                password=settings.bootstrap_root_password,
+                group="root",
+            )
+    finally:
+        await db_gen.aclose()
+
+
+async def bootstrap_root_in_background(*, initial_delay: float = 1.0, max_delay: float = 60.0) -> None:
+    # Реплика начинает отвечать сразу; root появится через запрос к users + bcrypt-хэш (в потоке).
+    # БД ещё недоступна — повторяем с экспоненциальной паузой, пока не получится или не остановят
+    # (раньше такой старт падал и оркестратор перезапускал под). Root одновременно создал
+    # другой воркер — следующая попытка его найдёт
+    delay = initial_delay
+    while True:
+        try:
+            await bootstrap_root()
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("bootstrap root failed, retrying in %.0f s", delay)
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # “первый админ” через env (bootstrap)
     # Root создаётся ТОЛЬКО при старте приложения, и только если заданы env-переменные.
     # Root — отдельная роль (group="root"), обычные админы остаются group="admin".
 
+    # встроенный SQLite (DATABASE_URL=sqlite+aiosqlite://...): схема без Alembic (app/db.py)
+    if get_engine().dialect.name == "sqlite":
+        await create_embedded_schema()
+
+    bootstrap_task = None
     if settings.bootstrap_root_username and settings.bootstrap_root_password:
         # bcrypt ограничение: пароль > 72 bytes нельзя (иначе будет ValueError)
         if len(settings.bootstrap_root_password.encode("utf-8")) > 72:
@@ -42,40 +122,86 @@ async def lifespan(app: FastAPI):
                 "BOOTSTRAP_ROOT_PASSWORD is longer than 72 bytes (bcrypt limit). "
                 "Use a shorter password (<= 72 bytes)."
             )
+        if settings.bootstrap_root_background:
+            bootstrap_task = asyncio.create_task(bootstrap_root_in_background())
+        else:
+            await bootstrap_root()
 
-        # get_db — dependency-generator, можно использовать его вручную
-        # ВАЖНО: нельзя делать `async for ... break` без корректного закрытия генератора,
-        # иначе сессия/соединение может остаться “подвешенным” (особенно в тестах с разными event loop).
-        db_gen = get_db()
-        db = await anext(db_gen)
-        try:
-            existing = await UserCRUD(db).get_by_username(settings.bootstrap_root_username)
-            if not existing:
-                # создаём root (самый первый админ)
-                await UserCRUD(db).create(
-                    username=settings.bootstrap_root_username,
-                    password=settings.bootstrap_root_password,
-                    group="root",
-                )
-        finally:
-            await db_gen.aclose()
+    # партиции advertisements на будущие месяцы — в фоне, старт не задерживаем
+    partitions_task = asyncio.create_task(partition_maintenance_loop())
+
+    # индекс сохранённых поисков: первая загрузка и периодическая перезагрузка — тоже в фоне
+    percolator_task = None
+    if settings.percolator_enabled:
+        percolator_task = asyncio.create_task(get_percolator().refresh_forever())
+
+    # удалённые/истёкшие объявления вычищаются в фоне, не в запросе DELETE
+    purge_task = asyncio.create_task(purge_loop()) if settings.purge_enabled else None
+
+    # сводка статистики цен — инкрементально, по водяному знаку
+    rollup_task = asyncio.create_task(stats_rollup_loop()) if settings.stats_rollup_enabled else None
+
+    # кэш подсказок заголовков — прогрев в фоне
+    suggest_warm_task = asyncio.create_task(warm_suggest_cache_in_background())
+
+    # журнал аудита: обработчики только кладут события в очередь, пишет фоновая задача
+    if settings.audit_enabled:
+        get_audit_writer().start()
 
     # startup done
     yield
 
     # shutdown
+    for task in (bootstrap_task, partitions_task, percolator_task, purge_task, rollup_task, suggest_warm_task):
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    await close_ad_write_batcher()
+    await close_audit_writer()  # дописывает очередь аудита до закрытия engine
+    close_login_throttle()
+    await close_percolator()
+    await close_event_broker()
     await close_engine()
 
 
 app = FastAPI(title=settings.app_name, debug=settings.debug, lifespan=lifespan)
 
+if settings.compression_enabled:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_minimum_size,
+        gzip_level=settings.compression_gzip_level,
+        zstd_level=settings.compression_zstd_level,
+    )
+
+if settings.profiling_enabled:
+    # снаружи сжатия: в профиль попадает и оно
+    app.add_middleware(ProfilingMiddleware)
+
 # -------------------- AUTH --------------------
 
 @app.post("/login", response_model=TokenResponse)
-async def login(payload: LoginRequest, db: AsyncSession = Depends(get_db)):
+async def login(payload: LoginRequest, request: Request, db: AsyncSession = Depends(get_db)):
+    # Лимит попыток проверяем до БД и bcrypt (app/login_throttle.py)
+    throttle = get_login_throttle() if settings.login_throttle_enabled else None
+    client_ip = request.client.host if request.client else "unknown"
+    if throttle is not None:
+        retry_after = await throttle.check(payload.username, client_ip)
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many login attempts",
+                headers={"Retry-After": retry_after_header(retry_after)},
+            )
+
     user = await UserCRUD(db).verify_credentials(payload.username, payload.password)
     if not user:
+        if throttle is not None:
+            await throttle.failure(payload.username, client_ip)
         raise HTTPException(status_code=401, detail="Invalid username or password")
+    if throttle is not None:
+        await throttle.success(payload.username, client_ip)
 
     token = create_access_token(user_id=user.id, username=user.username, group=user.group)
     return TokenResponse(access_token=token)
@@ -83,11 +209,34 @@ async def login(payload: LoginRequest, db: AsyncSession = Depends(get_db)):
 
 # -------------------- USERS --------------------
 
+# Idempotency-Key: повтор POST с тем же ключом отдаёт сохранённый ответ (app/idempotency.py)
+IdempotencyKeyHeader = Header(default=None, alias="Idempotency-Key", min_length=1, max_length=255)
+
+
+def _caller_scope(current_user, request: Request) -> str:
+    # анонимов различаем по адресу клиента: иначе одинаковые ключи разных клиентов
+    # пересекаются (422 или чужой сохранённый ответ)
+    if current_user is not None:
+        return f"user:{current_user.id}"
+    return f"anon:{request.client.host if request.client else 'unknown'}"
+
+
+def _audit(current_user, action: str, entity: str, entity_id: int, changes: dict | None = None) -> None:
+    # без await: событие уходит в очередь app/audit.py, запись — пачкой в фоне
+    if settings.audit_enabled:
+        get_audit_writer().record(
+            action=action, entity=entity, entity_id=entity_id, actor_id=current_user.id, changes=changes
+        )
+
+
 @app.post("/user", response_model=UserOut, status_code=201)
 async def create_user(
     payload: UserCreate,
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_db),
     current_user=Depends(get_current_user_optional),
+    idempotency_key: Optional[str] = IdempotencyKeyHeader,
 ):
     # неавторизованный пользователь НЕ должен создавать admin
     # (и уж точно не должен создавать root)
@@ -104,11 +253,24 @@ async def create_user(
         if current_user.group not in ("admin", "root") and payload.group != "user":
             raise HTTPException(status_code=403, detail="Forbidden")
 
-    exists = await UserCRUD(db).get_by_username(payload.username)
-    if exists:
-        raise HTTPException(status_code=409, detail="Username already exists")
-
-    return await UserCRUD(db).create(username=payload.username, password=payload.password, group=payload.group)
+    async def execute():
+        exists = await UserCRUD(db).get_by_username(payload.username)
+        if exists:
+            raise HTTPException(status_code=409, detail="Username already exists")
+
+        user = await UserCRUD(db).create(username=payload.username, password=payload.password, group=payload.group)
+        return jsonable_encoder(UserOut.model_validate(user))
+
+    if idempotency_key is None:
+        return await execute()
+    # повтор не перезапускает ни INSERT, ни bcrypt
+    return await run_idempotent(
+        response,
+        key=idempotency_key,
+        scope=f"POST /user:{_caller_scope(current_user, request)}",
+        payload=payload,
+        fn=execute,
+    )
 
 
 @app.get("/user/{user_id}", response_model=UserOut)
@@ -119,19 +281,53 @@ async def get_user(user_id: int, db: AsyncSession = Depends(get_db)):
     return user
 
 
-@app.get("/user", response_model=list[UserOut])
+_USER_SORT_KEY_TYPES = {"id": (int,), "username": (str,), "ad_count": (int, int), "-ad_count": (int, int)}
+
+
+@app.get("/user", response_model=list[UserOut] | list[UserBrief])
 async def list_users(
+    response: Response,
     db: AsyncSession = Depends(get_db),
     current_user=Depends(get_current_user),
     limit: int = Query(default=50, ge=1, le=200),
-    offset: int = Query(default=0, ge=0),
+    offset: int = Query(default=0, ge=0, deprecated=True),  # вместо offset — cursor
+    sort: Literal["id", "username", "ad_count", "-ad_count"] = "id",  # -ad_count — самые активные сверху
+    username_prefix: Optional[str] = Query(default=None, min_length=1, max_length=64),
+    group: Optional[UserGroup] = None,
+    view: Literal["full", "compact"] = "full",  # compact — только id, username, group
+    cursor: Optional[str] = None,
 ):
     # require_admin(current_user)
     # root тоже должен иметь права admin
     if current_user.group not in ("admin", "root"):
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    return await UserCRUD(db).list(limit=limit, offset=offset)
+    # Следующая страница — ?cursor=<X-Next-Cursor> с теми же фильтрами и sort (вместо offset)
+    after = None
+    if cursor:
+        if offset:
+            raise HTTPException(status_code=400, detail="cursor and offset cannot be combined")
+        try:
+            cursor_sort, *after = decode_cursor(cursor, (str, *_USER_SORT_KEY_TYPES[sort]))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if cursor_sort != sort:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    items = await UserCRUD(db).list(
+        limit=limit,
+        offset=offset,
+        sort=sort,
+        username_prefix=username_prefix,
+        group=group,
+        after=after,
+        compact=view == "compact",
+    )
+    if len(items) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(sort, *user_sort_key(items[-1], sort))
+    if view == "compact":
+        return [UserBrief.model_validate(row) for row in items]
+    return items
 
 
 @app.patch("/user/{user_id}", response_model=UserOut)
@@ -167,6 +363,8 @@ async def patch_user(
         password=payload.password,
         group=payload.group,
     )
+    if updated is not None:
+        _audit(current_user, "user.patch", "user", user_id, payload.model_dump(mode="json", exclude_none=True))
     return updated
 
 
@@ -187,26 +385,199 @@ async def delete_user(
     if target.group == "root":
         raise HTTPException(status_code=403, detail="Forbidden")
 
+    username = target.username
     ok = await UserCRUD(db).delete(user_id)
     if not ok:
         raise HTTPException(status_code=404, detail="User not found")
+    _audit(current_user, "user.delete", "user", user_id, {"username": username})
+    return None
+
+
+@app.get("/user/{user_id}/advertisement", response_model=list[AdvertisementOut])
+async def list_user_advertisements(
+    user_id: int,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    limit: int = Query(default=50, ge=1, le=200),
+    cursor: Optional[str] = None,
+):
+    # Объявления владельца, новые сверху. Пагинация keyset-курсором:
+    # следующая страница — ?cursor=<значение заголовка X-Next-Cursor>
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor, (datetime, int))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    items = await AdvertisementCRUD(db).list_by_owner(user_id, limit=limit, after=after)
+    if len(items) == limit:
+        last = items[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.created_at, last.id)
+    return items
+
+
+@app.post("/user/{user_id}/advertisement/reassign", response_model=OwnerReassignResult)
+async def reassign_user_advertisements(
+    user_id: int,
+    payload: OwnerReassign,
+    db: AsyncSession = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    # Передать все объявления пользователя другому владельцу — только admin/root
+    if current_user.group not in ("admin", "root"):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    target = await UserCRUD(db).get(payload.to_user_id)
+    if not target:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    reassigned = await AdvertisementCRUD(db).reassign_owner(user_id, payload.to_user_id)
+    _audit(
+        current_user,
+        "advertisement.reassign",
+        "user",
+        user_id,
+        {"to_user_id": payload.to_user_id, "reassigned": reassigned},
+    )
+    return OwnerReassignResult(reassigned=reassigned)
+
+
+# -------------------- SAVED SEARCHES + INBOX --------------------
+
+_SAVED_SEARCH_FILTERS = ("title", "description", "author", "q", "price_from", "price_to", "created_from", "created_to")
+
+
+@app.post("/user/{user_id}/saved-search", response_model=SavedSearchOut, status_code=201)
+async def create_saved_search(
+    user_id: int,
+    payload: SavedSearchCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    # require_self_or_admin(current_user, user_id)
+    if current_user.group not in ("admin", "root") and current_user.id != user_id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    filters = payload.model_dump(include=set(_SAVED_SEARCH_FILTERS))
+    if all(value is None for value in filters.values()):
+        raise HTTPException(status_code=422, detail="At least one filter is required")
+
+    crud = SavedSearchCRUD(db)
+    if await crud.count_for_user(user_id) >= settings.saved_searches_per_user:
+        raise HTTPException(status_code=409, detail="Too many saved searches")
+
+    saved = await crud.create(user_id=user_id, name=payload.name, **filters)
+    if settings.percolator_enabled:
+        get_percolator().add(saved)
+    return saved
+
+
+@app.get("/user/{user_id}/saved-search", response_model=list[SavedSearchOut])
+async def list_saved_searches(
+    user_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    if current_user.group not in ("admin", "root") and current_user.id != user_id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    return await SavedSearchCRUD(db).list_for_user(user_id)
+
+
+@app.delete("/user/{user_id}/saved-search/{search_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_saved_search(
+    user_id: int,
+    search_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    if current_user.group not in ("admin", "root") and current_user.id != user_id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    crud = SavedSearchCRUD(db)
+    saved = await crud.get(search_id)
+    if not saved or saved.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Saved search not found")
+
+    await crud.delete(search_id)
+    if settings.percolator_enabled:
+        get_percolator().remove(search_id)
     return None
 
 
+@app.get("/user/{user_id}/inbox", response_model=list[SearchInboxItemOut])
+async def list_search_inbox(
+    user_id: int,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    current_user=Depends(get_current_user),
+    limit: int = Query(default=50, ge=1, le=200),
+    cursor: Optional[str] = None,
+):
+    # Совпадения сохранённых поисков, новые сверху; пагинация — как у /user/{id}/advertisement
+    if current_user.group not in ("admin", "root") and current_user.id != user_id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    before_id = None
+    if cursor:
+        try:
+            (before_id,) = decode_cursor(cursor, (int,))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    items = await SavedSearchCRUD(db).list_inbox(user_id, limit=limit, before_id=before_id)
+    if len(items) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(items[-1].id)
+    return items
+
+
 # -------------------- ADVERTISEMENTS тут почти ничего не тронуто, дополнено и переделан DELETE --> 204-----
 
 @app.post("/advertisement", response_model=AdvertisementOut, status_code=201)
 async def create_advertisement(
     payload: AdvertisementCreate,
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_db),
     current_user=Depends(get_current_user),  # теперь только авторизованный
+    idempotency_key: Optional[str] = IdempotencyKeyHeader,
 ):
-    return await AdvertisementCRUD(db).create(
+    expires_at = payload.expires_at
+    if expires_at is not None and expires_at <= datetime.now(timezone.utc):
+        raise HTTPException(status_code=422, detail="expires_at must be in the future")
+    if expires_at is None and settings.advertisement_ttl_days:
+        expires_at = datetime.now(timezone.utc) + timedelta(days=settings.advertisement_ttl_days)
+
+    values = dict(
         title=payload.title,
         description=payload.description,
         price=payload.price,
         author=payload.author,
         owner_id=current_user.id,
+        expires_at=expires_at,
+    )
+
+    async def execute():
+        if settings.ads_write_batch_enabled:
+            # group commit: одна транзакция на пачку одновременных созданий
+            ad = await get_ad_write_batcher().submit(**values)
+        else:
+            ad = await AdvertisementCRUD(db).create(**values)
+        out = AdvertisementOut.model_validate(ad)
+        invalidate_titles(out.title)
+        if settings.percolator_enabled:
+            get_percolator().percolate_in_background(out, owner_id=current_user.id)
+        return jsonable_encoder(out)
+
+    if idempotency_key is None:
+        return await execute()
+    return await run_idempotent(
+        response,
+        key=idempotency_key,
+        scope=f"POST /advertisement:{_caller_scope(current_user, request)}",
+        payload=payload,
+        fn=execute,
     )
 
 
@@ -225,6 +596,7 @@ async def patch_advertisement(
     if current_user.group not in ("admin", "root") and current_user.id != ad.owner_id:
         raise HTTPException(status_code=403, detail="Forbidden")
 
+    old_title = ad.title  # UPDATE ... RETURNING обновит и этот же объект в сессии
     updated = await AdvertisementCRUD(db).patch(
         advertisement_id,
         title=payload.title,
@@ -233,6 +605,15 @@ async def patch_advertisement(
         author=payload.author,
     )
     assert updated is not None
+    _audit(
+        current_user,
+        "advertisement.patch",
+        "advertisement",
+        advertisement_id,
+        payload.model_dump(mode="json", exclude_none=True),
+    )
+    if payload.title is not None:
+        invalidate_titles(old_title, updated.title)
     return updated
 
 
@@ -251,22 +632,148 @@ async def delete_advertisement(
     if current_user.group not in ("admin", "root") and current_user.id != ad.owner_id:
         raise HTTPException(status_code=403, detail="Forbidden")
 
+    title = ad.title
     ok = await AdvertisementCRUD(db).delete(advertisement_id)
     if not ok:
         raise HTTPException(status_code=404, detail="Advertisement not found")
+    _audit(current_user, "advertisement.delete", "advertisement", advertisement_id)
+    invalidate_titles(title)
     return None
 
 
+@app.get("/advertisement/stream")
+async def stream_advertisements(
+    request: Request,
+    title: Optional[str] = None,
+    description: Optional[str] = None,
+    author: Optional[str] = None,
+    q: Optional[str] = None,
+    price_from: Optional[Decimal] = Query(default=None, gt=0),
+    price_to: Optional[Decimal] = Query(default=None, gt=0),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+):
+    # SSE: новые/изменённые объявления под фильтр (те же параметры, что у поиска) + все удаления.
+    # Вместо опроса GET /advertisement каждые несколько секунд.
+    filters = AdvertisementFilter(
+        title=title,
+        description=description,
+        author=author,
+        q=q,
+        price_from=price_from,
+        price_to=price_to,
+        created_from=created_from,
+        created_to=created_to,
+    )
+    return StreamingResponse(
+        sse_stream(request, filters),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/advertisement/suggest", response_model=list[str])
+async def suggest_advertisement_titles(
+    db: AsyncSession = Depends(get_db),
+    prefix: str = Query(min_length=1, max_length=100),
+    limit: int = Query(default=10, ge=1, le=SUGGEST_LIMIT_MAX),
+):
+    # Автодополнение заголовков для строки поиска (app/suggest.py): горячие префиксы — из кэша,
+    # остальные — диапазонный скан префиксного индекса, а не ILIKE по всей таблице
+    return await suggest_titles(db, prefix, limit=limit)
+
+
+@app.get("/advertisement/stats", response_model=list[AdvertisementDailyStatsOut])
+async def advertisement_stats(
+    db: AsyncSession = Depends(get_db),
+    author: Optional[str] = Query(default=None, min_length=1, max_length=100),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+):
+    # Статистика цен по дням (UTC) из готовой сводки (app/rollups.py), без агрегации по advertisements.
+    # По умолчанию — последние 30 дней; author не задан — по всем авторам.
+    date_to = date_to or datetime.now(timezone.utc).date()
+    date_from = date_from or date_to - timedelta(days=29)
+    if date_from > date_to:
+        raise HTTPException(status_code=422, detail="date_from must not be after date_to")
+    if (date_to - date_from).days >= 366:
+        raise HTTPException(status_code=422, detail="Date range is limited to 366 days")
+
+    rows = await MarketStatsCRUD(db).list(author=author, day_from=date_from, day_to=date_to)
+    return [
+        AdvertisementDailyStatsOut.model_validate(row).model_copy(update={"author": row.author or None})
+        for row in rows
+    ]
+
+
+async def _batch_get(db: AsyncSession, ids: list[int]) -> AdvertisementBatchOut:
+    ordered = list(dict.fromkeys(ids))  # без повторов, порядок запроса сохраняем
+    found = {ad.id: ad for ad in await AdvertisementCRUD(db).get_many(ordered)}
+    return AdvertisementBatchOut(
+        items=[found[ad_id] for ad_id in ordered if ad_id in found],
+        missing=[ad_id for ad_id in ordered if ad_id not in found],
+    )
+
+
+# ВАЖНО: /advertisement/batch объявлен раньше /advertisement/{advertisement_id},
+# иначе "batch" попадёт в advertisement_id и получим 422. То же для /advertisement/stream выше.
+@app.get("/advertisement/batch", response_model=AdvertisementBatchOut)
+async def batch_get_advertisements(
+    db: AsyncSession = Depends(get_db),
+    ids: list[str] = Query(..., description="?ids=1&ids=2 или ?ids=1,2,3 (до 200 id)"),
+):
+    try:
+        parsed = [int(part) for value in ids for part in value.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids must be integers")
+    if not parsed or len(parsed) > 200:
+        raise HTTPException(status_code=422, detail="ids: from 1 to 200 values (use POST for longer lists)")
+    return await _batch_get(db, parsed)
+
+
+@app.post("/advertisement/batch", response_model=AdvertisementBatchOut)
+async def batch_get_advertisements_post(payload: AdvertisementBatchRequest, db: AsyncSession = Depends(get_db)):
+    # То же самое, но для длинных списков (до 1000 id), которые не влезают в URL
+    return await _batch_get(db, payload.ids)
+
+
+async def _fetch_advertisement(ad_id: int):
+    # Для single-flight: общий запрос живёт в своей сессии,
+    # а не в сессии того запроса, который пришёл первым (он может отвалиться раньше остальных)
+    async with get_sessionmaker()() as db:
+        return await AdvertisementCRUD(db).get(ad_id)
+
+
+async def _fetch_search(filters: dict):
+    async with get_sessionmaker()() as db:
+        return await AdvertisementCRUD(db).search(**filters)
+
+
 @app.get("/advertisement/{advertisement_id}", response_model=AdvertisementOut)
 async def get_advertisement(advertisement_id: int, db: AsyncSession = Depends(get_db)):
-    ad = await AdvertisementCRUD(db).get(advertisement_id)
+    if settings.singleflight_enabled:
+        try:
+            ad = await advertisement_gets.do(
+                advertisement_id,
+                lambda: _fetch_advertisement(advertisement_id),
+                timeout=settings.singleflight_get_timeout,
+            )
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="Database timeout")
+    else:
+        ad = await AdvertisementCRUD(db).get(advertisement_id)
     if ad is None:
         raise HTTPException(status_code=404, detail="Advertisement not found")
     return ad
 
 
+# тип первого значения курсора поиска по колонке сортировки (SEARCH_SORTS)
+_SORT_KEY_TYPES = {"created_at": datetime, "price": Decimal}
+
+
 @app.get("/advertisement", response_model=list[AdvertisementOut])
 async def search_advertisements(
+    response: Response,
     db: AsyncSession = Depends(get_db),
     title: Optional[str] = None,
     description: Optional[str] = None,
@@ -276,10 +783,26 @@ async def search_advertisements(
     price_to: Optional[Decimal] = Query(default=None, gt=0),
     created_from: Optional[datetime] = None,
     created_to: Optional[datetime] = None,
+    sort: Literal["newest", "oldest", "price_asc", "price_desc"] = "newest",
+    cursor: Optional[str] = None,
     limit: int = Query(default=50, ge=1, le=200),
     offset: int = Query(default=0, ge=0),
 ):
-    return await AdvertisementCRUD(db).search(
+    # Следующая страница — ?cursor=<X-Next-Cursor> с теми же фильтрами и sort (вместо offset)
+    after = None
+    if cursor:
+        if offset:
+            raise HTTPException(status_code=400, detail="cursor and offset cannot be combined")
+        column, _ = SEARCH_SORTS[sort]
+        try:
+            cursor_sort, *after = decode_cursor(cursor, (str, _SORT_KEY_TYPES[column], int))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if cursor_sort != sort:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        after = tuple(after)
+
+    filters = dict(
         title=title,
         description=description,
         author=author,
@@ -288,6 +811,142 @@ async def search_advertisements(
         price_to=price_to,
         created_from=created_from,
         created_to=created_to,
+        sort=sort,
+        after=after,
         limit=limit,
         offset=offset,
     )
+    if not settings.singleflight_enabled:
+        items = await AdvertisementCRUD(db).search(**filters)
+    else:
+        # одинаковые популярные поиски (первая страница ленты и т.п.) — один запрос в БД
+        try:
+            items = await advertisement_searches.do(
+                tuple(sorted(filters.items())),
+                lambda: _fetch_search(filters),
+                timeout=settings.singleflight_search_timeout,
+            )
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="Database timeout")
+
+    if len(items) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(sort, *search_sort_key(items[-1], sort))
+    return items
+
+
+# -------------------- ADMIN --------------------
+
+@app.get("/admin/metrics")
+async def admin_metrics(current_user=Depends(get_current_user)):
+    # Внутренние счётчики процесса (воркера) — только admin/root
+    if current_user.group not in ("admin", "root"):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    return {
+        "singleflight": {
+            sf.name: sf.stats() for sf in (advertisement_gets, advertisement_searches)
+        },
+        "write_batcher": get_ad_write_batcher().stats() if settings.ads_write_batch_enabled else None,
+        "events": get_event_broker().stats(),
+        "percolator": get_percolator().stats() if settings.percolator_enabled else None,
+        "suggest_cache": get_suggest_cache().stats(),
+        "audit": get_audit_writer().stats() if settings.audit_enabled else None,
+        "jwt_cache": get_token_cache().stats(),
+        "login_throttle": get_login_throttle().stats() if settings.login_throttle_enabled else None,
+        "partitions": partition_status(),
+    }
+
+
+@app.get("/admin/audit", response_model=list[AuditLogEntryOut])
+async def admin_audit_log(
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    current_user=Depends(get_current_user),
+    entity: Optional[Literal["user", "advertisement"]] = None,
+    entity_id: Optional[int] = None,
+    actor_id: Optional[int] = None,
+    limit: int = Query(default=50, ge=1, le=200),
+    cursor: Optional[str] = None,
+):
+    # Журнал аудита, новые сверху — только admin/root. Записи появляются с задержкой
+    # до AUDIT_FLUSH_INTERVAL_MS (пишутся пачками в фоне).
+    if current_user.group not in ("admin", "root"):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    before_id = None
+    if cursor:
+        try:
+            (before_id,) = decode_cursor(cursor, (int,))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    items = await AuditLogCRUD(db).list(
+        entity=entity, entity_id=entity_id, actor_id=actor_id, limit=limit, before_id=before_id
+    )
+    if len(items) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(items[-1].id)
+    return items
+
+
+_PROFILE_ID = Path(pattern=r"^[0-9a-f]{32}$")
+
+
+@app.get("/admin/profiling")
+async def admin_profiling_state(current_user=Depends(get_current_user)):
+    if current_user.group not in ("admin", "root"):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return profiling_toggle.state()
+
+
+@app.post("/admin/profiling")
+async def admin_profiling_enable(payload: ProfilingEnable, current_user=Depends(get_current_user)):
+    # Профилировать все запросы (или только с path_prefix) в течение seconds — в этом воркере.
+    # Для одного запроса достаточно заголовка X-Profile.
+    if current_user.group not in ("admin", "root"):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    if not settings.profiling_enabled:
+        raise HTTPException(status_code=409, detail="Profiling is disabled")
+    profiling_toggle.enable(
+        seconds=payload.seconds,
+        mode=payload.mode,
+        path_prefix=payload.path_prefix,
+        max_profiles=payload.max_profiles,
+    )
+    return profiling_toggle.state()
+
+
+@app.delete("/admin/profiling", status_code=status.HTTP_204_NO_CONTENT)
+async def admin_profiling_disable(current_user=Depends(get_current_user)):
+    if current_user.group not in ("admin", "root"):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    profiling_toggle.disable()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@app.get("/admin/profiles")
+async def admin_profiles(current_user=Depends(get_current_user)):
+    # Сохранённые профили этого хоста, новые сверху (без SQL и текстовой сводки)
+    if current_user.group not in ("admin", "root"):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return await asyncio.to_thread(get_profile_store().list)
+
+
+@app.get("/admin/profiles/{profile_id}")
+async def admin_profile(profile_id: str = _PROFILE_ID, current_user=Depends(get_current_user)):
+    if current_user.group not in ("admin", "root"):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    meta = await asyncio.to_thread(get_profile_store().get, profile_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return meta
+
+
+@app.get("/admin/profiles/{profile_id}/download")
+async def admin_profile_download(profile_id: str = _PROFILE_ID, current_user=Depends(get_current_user)):
+    # .prof — pstats/snakeviz, .html — отчёт pyinstrument
+    if current_user.group not in ("admin", "root"):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    path = await asyncio.to_thread(get_profile_store().artifact_path, profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=path.name)
@@ -0,0 +1,317 @@
+# Хелперы для "онлайн"-миграций Alembic: меняем схему под нагрузкой, без долгих блокировок.
+#
+# - create_index_concurrently(): CREATE INDEX CONCURRENTLY вне транзакции; на партиционированной
+#   таблице — CREATE INDEX ON ONLY родителя + CONCURRENTLY по каждой партиции + ATTACH PARTITION
+# - add_constraint_not_valid() / validate_constraint(): ограничение без проверки старых строк
+#   (короткая блокировка), проверка — отдельно под SHARE UPDATE EXCLUSIVE
+# - set_not_null(): NOT NULL через CHECK ... NOT VALID -> VALIDATE -> SET NOT NULL (PG12+ без скана)
+# - backfill(): UPDATE пачками по ключу, каждая пачка — своя транзакция, пауза между пачками,
+#   прогресс в лог и контрольная точка в alembic_backfill_progress (перезапуск продолжает с места)
+#
+# Все шаги идемпотентны: упавшую посередине миграцию можно просто запустить ещё раз.
+# Каждый шаг ставит lock_timeout: если таблицу держит длинная транзакция, DDL падает быстро,
+# а не выстраивает за собой очередь из всех запросов к таблице.
+#
+# Пример (alembic/versions/00xx_...py):
+#   from app.migrations import backfill, create_index_concurrently
+#
+#   def upgrade() -> None:
+#       op.add_column("advertisements", sa.Column("views", sa.Integer(), nullable=True))
+#       create_index_concurrently("ix_advertisements_views", "advertisements", ["views"],
+#                                 where="deleted_at IS NULL")
+#       backfill("advertisements", "views = 0", where="views IS NULL", batch_size=5000)
+#
+# Только PostgreSQL и только online-режим (alembic upgrade, не --sql): шаги смотрят в каталог.
+
+from __future__ import annotations
+
+import logging
+import time
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+
+from alembic import op
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCK_TIMEOUT = "5s"
+PROGRESS_TABLE = "alembic_backfill_progress"
+MAX_IDENTIFIER_LENGTH = 63
+
+
+def create_index_sql(
+    name: str,
+    table: str,
+    columns: Sequence[str],
+    *,
+    unique: bool = False,
+    using: str | None = None,
+    where: str | None = None,
+    concurrently: bool = False,
+    only: bool = False,
+) -> str:
+    parts = ["CREATE UNIQUE INDEX" if unique else "CREATE INDEX"]
+    if concurrently:
+        parts.append("CONCURRENTLY")
+    parts.append(f"IF NOT EXISTS {name} ON")
+    if only:
+        parts.append("ONLY")
+    parts.append(table)
+    if using:
+        parts.append(f"USING {using}")
+    parts.append(f"({', '.join(columns)})")
+    if where:
+        parts.append(f"WHERE {where}")
+    return " ".join(parts)
+
+
+def partition_index_name(name: str, table: str, partition: str) -> str:
+    # ix_advertisements_views + advertisements_p202601 -> ix_advertisements_views_p202601
+    name = f"{name}_{partition.removeprefix(f'{table}_')}"
+    if len(name) > MAX_IDENTIFIER_LENGTH:
+        raise ValueError(f"имя индекса партиции длиннее {MAX_IDENTIFIER_LENGTH} символов: {name}")
+    return name
+
+
+def backfill_batch_sql(table: str, set_: str, *, key: str = "id", where: str | None = None, resume: bool = False) -> str:
+    """
+    Одна пачка backfill одним оператором: выбрать следующие batch_size ключей, обновить их
+    и сдвинуть контрольную точку. Обновление и контрольная точка коммитятся вместе,
+    поэтому после падения перезапуск не пропускает и не повторяет пачку.
+    """
+    conditions = [f"{key} > :after"] if resume else []
+    if where:
+        conditions.append(f"({where})")
+    where_sql = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+    return (
+        f"WITH batch AS (SELECT {key} AS batch_key FROM {table} {where_sql}ORDER BY {key} LIMIT :batch_size), "
+        f"updated AS (UPDATE {table} SET {set_} FROM batch WHERE {table}.{key} = batch.batch_key "
+        f"RETURNING {table}.{key} AS batch_key) "
+        f"INSERT INTO {PROGRESS_TABLE} (name, last_key, rows) "
+        f"SELECT :name, max(batch_key), count(*) FROM updated HAVING count(*) > 0 "
+        f"ON CONFLICT (name) DO UPDATE SET last_key = excluded.last_key, "
+        f"rows = {PROGRESS_TABLE}.rows + excluded.rows, updated_at = now() "
+        f"RETURNING last_key, rows"
+    )
+
+
+def list_partitions(conn: Connection, table: str) -> list[str]:
+    # пусто — таблица не партиционирована (или партиций ещё нет)
+    return list(
+        conn.scalars(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = :table AND p.relkind = 'p' "
+                "ORDER BY c.relname"
+            ),
+            {"table": table},
+        )
+    )
+
+
+def index_state(conn: Connection, name: str) -> bool | None:
+    # None — индекса нет; False — INVALID (остаток упавшего CONCURRENTLY) или ещё не все партиции
+    return conn.scalar(
+        text(
+            "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND pg_table_is_visible(c.oid)"
+        ),
+        {"name": name},
+    )
+
+
+def constraint_state(conn: Connection, table: str, name: str) -> bool | None:
+    # None — ограничения нет; False — NOT VALID, ещё не проверено
+    return conn.scalar(
+        text("SELECT convalidated FROM pg_constraint WHERE conrelid = CAST(:table AS regclass) AND conname = :name"),
+        {"table": table, "name": name},
+    )
+
+
+@contextmanager
+def _autocommit(lock_timeout: str) -> Iterator[Connection]:
+    """
+    Вне транзакции миграции: CONCURRENTLY внутри транзакции невозможен, а короткие шаги
+    должны отпускать блокировки сразу. Всё, что миграция сделала до этого, коммитится
+    (env.py запускает каждую миграцию в своей транзакции — transaction_per_migration).
+    """
+    context = op.get_context()
+    if context.as_sql:
+        raise RuntimeError("онлайн-хелперы миграций не работают в offline-режиме (alembic --sql)")
+    with context.autocommit_block():
+        conn = op.get_bind()
+        conn.execute(text(f"SET lock_timeout = '{lock_timeout}'"))
+        try:
+            yield conn
+        finally:
+            conn.execute(text("RESET lock_timeout"))
+
+
+def _build_index(conn: Connection, name: str, sql: str) -> None:
+    state = index_state(conn, name)
+    if state is False:
+        # CONCURRENTLY упал на середине и оставил INVALID-индекс: IF NOT EXISTS его бы не тронул
+        logger.info("индекс %s в состоянии INVALID — пересоздаём", name)
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    elif state is True:
+        return
+    started = time.perf_counter()
+    conn.execute(text(sql))
+    logger.info("индекс %s построен за %.1f с", name, time.perf_counter() - started)
+
+
+def create_index_concurrently(
+    name: str,
+    table: str,
+    columns: Sequence[str],
+    *,
+    unique: bool = False,
+    using: str | None = None,
+    where: str | None = None,
+    lock_timeout: str = DEFAULT_LOCK_TIMEOUT,
+) -> None:
+    """
+    Строит индекс, не блокируя запись в таблицу.
+
+    На партиционированной таблице CREATE INDEX CONCURRENTLY не поддерживается, поэтому:
+    пустой INVALID-индекс на родителе (ON ONLY — мгновенно), индекс CONCURRENTLY на каждой
+    партиции и ATTACH PARTITION; когда подцеплены все партиции, родительский индекс
+    становится VALID сам. Новые партиции (ensure_partitions) получат индекс автоматически.
+    """
+    columns = list(columns)
+    with _autocommit(lock_timeout) as conn:
+        partitions = list_partitions(conn, table)
+        if not partitions:
+            _build_index(
+                conn,
+                name,
+                create_index_sql(name, table, columns, unique=unique, using=using, where=where, concurrently=True),
+            )
+            return
+
+        conn.execute(text(create_index_sql(name, table, columns, unique=unique, using=using, where=where, only=True)))
+        for partition in partitions:
+            child = partition_index_name(name, table, partition)
+            _build_index(
+                conn,
+                child,
+                create_index_sql(child, partition, columns, unique=unique, using=using, where=where, concurrently=True),
+            )
+            # повторный ATTACH уже подцеплённого индекса к тому же родителю — no-op
+            conn.execute(text(f"ALTER INDEX {name} ATTACH PARTITION {child}"))
+
+        if index_state(conn, name) is not True:
+            raise RuntimeError(f"индекс {name} не стал VALID после подключения всех партиций")
+
+
+def drop_index_concurrently(name: str, *, lock_timeout: str = DEFAULT_LOCK_TIMEOUT) -> None:
+    """
+    Для downgrade. Индекс партиционированной таблицы CONCURRENTLY удалить нельзя —
+    обычный DROP INDEX (ACCESS EXCLUSIVE на время удаления файлов, ограничен lock_timeout).
+    """
+    with _autocommit(lock_timeout) as conn:
+        partitioned = conn.scalar(
+            text("SELECT relkind = 'I' FROM pg_class WHERE relname = :name AND pg_table_is_visible(oid)"),
+            {"name": name},
+        )
+        if partitioned is None:
+            return
+        conn.execute(text(f"DROP INDEX {'' if partitioned else 'CONCURRENTLY '}IF EXISTS {name}"))
+
+
+def add_constraint_not_valid(
+    table: str, name: str, definition: str, *, lock_timeout: str = DEFAULT_LOCK_TIMEOUT
+) -> None:
+    """
+    ADD CONSTRAINT ... NOT VALID: новые и изменённые строки проверяются сразу,
+    старые — нет, поэтому ACCESS EXCLUSIVE держится миллисекунды. Дальше — validate_constraint().
+    definition: "CHECK (price >= 0)" или "FOREIGN KEY (owner_id) REFERENCES users (id)".
+    """
+    with _autocommit(lock_timeout) as conn:
+        if constraint_state(conn, table, name) is None:
+            conn.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition} NOT VALID"))
+
+
+def validate_constraint(table: str, name: str, *, lock_timeout: str = DEFAULT_LOCK_TIMEOUT) -> None:
+    # VALIDATE сканирует таблицу под SHARE UPDATE EXCLUSIVE — чтение и запись не блокируются
+    with _autocommit(lock_timeout) as conn:
+        if constraint_state(conn, table, name) is False:
+            started = time.perf_counter()
+            conn.execute(text(f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}"))
+            logger.info("ограничение %s.%s проверено за %.1f с", table, name, time.perf_counter() - started)
+
+
+def set_not_null(table: str, column: str, *, lock_timeout: str = DEFAULT_LOCK_TIMEOUT) -> None:
+    """
+    SET NOT NULL без полного скана под ACCESS EXCLUSIVE: PG12+ пропускает проверку,
+    если есть проверенный CHECK (column IS NOT NULL). Сначала — backfill пустых значений.
+    """
+    check = f"{table}_{column}_not_null"
+    add_constraint_not_valid(table, check, f"CHECK ({column} IS NOT NULL)", lock_timeout=lock_timeout)
+    validate_constraint(table, check, lock_timeout=lock_timeout)
+    with _autocommit(lock_timeout) as conn:
+        conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL"))
+        conn.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {check}"))
+
+
+def backfill(
+    table: str,
+    set_: str,
+    *,
+    where: str | None = None,
+    key: str = "id",
+    batch_size: int = 1000,
+    pause: float = 0.05,
+    name: str | None = None,
+    lock_timeout: str = DEFAULT_LOCK_TIMEOUT,
+) -> int:
+    """
+    UPDATE {table} SET {set_} пачками по возрастанию key (целочисленный, с индексом).
+
+    Каждая пачка — короткая транзакция: блокировки строк не копятся, автовакуум успевает,
+    реплики не отстают. pause — пауза между пачками (дросселирование под нагрузкой).
+    where отбирает ещё не заполненные строки ("views IS NULL") — тогда повторный запуск
+    после завершения почти бесплатен. Контрольная точка (последний ключ) хранится по name
+    до конца прохода: перезапуск после падения продолжает с неё. Возвращает число строк.
+    """
+    name = name or f"{table}: {set_}"
+    with _autocommit(lock_timeout) as conn:
+        conn.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {PROGRESS_TABLE} ("
+                "name text PRIMARY KEY, last_key bigint NOT NULL, rows bigint NOT NULL, "
+                "updated_at timestamptz NOT NULL DEFAULT now())"
+            )
+        )
+        checkpoint = conn.execute(
+            text(f"SELECT last_key, rows FROM {PROGRESS_TABLE} WHERE name = :name"), {"name": name}
+        ).first()
+        after, total = checkpoint if checkpoint else (None, 0)
+        if checkpoint:
+            logger.info("backfill %s: продолжаем после %s=%s (уже %d строк)", name, key, after, total)
+
+        first_sql = text(backfill_batch_sql(table, set_, key=key, where=where, resume=after is not None))
+        next_sql = text(backfill_batch_sql(table, set_, key=key, where=where, resume=True))
+        started = time.perf_counter()
+        done = 0
+        while True:
+            stmt = next_sql if after is not None else first_sql
+            row = conn.execute(stmt, {"name": name, "after": after, "batch_size": batch_size}).first()
+            if row is None:
+                break
+            after, total = row
+            done = total - (checkpoint[1] if checkpoint else 0)
+            elapsed = time.perf_counter() - started
+            logger.info(
+                "backfill %s: %d строк (%s=%s), %.0f строк/с", name, total, key, after, done / elapsed if elapsed else 0
+            )
+            if pause:
+                time.sleep(pause)
+
+        conn.execute(text(f"DELETE FROM {PROGRESS_TABLE} WHERE name = :name"), {"name": name})
+        logger.info("backfill %s: готово, %d строк за %.1f с", name, total, time.perf_counter() - started)
+    return total
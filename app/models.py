@@ -1,9 +1,11 @@
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import date, datetime, timezone
 from decimal import Decimal  # Исправил ошибку с прошлой лабораторной
 
-from sqlalchemy import DateTime, Numeric, String, Text, func, ForeignKey, Integer  # ПО ЗАДАНИЮ. Дополнил импорты
+from sqlalchemy import DDL, JSON, BigInteger, Date, DateTime, Float, Numeric, String, Text, UniqueConstraint, func, ForeignKey, Index, Integer  # ПО ЗАДАНИЮ. Дополнил импорты
+from sqlalchemy import TypeDecorator, event
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship  # ПО ЗАДАНИЮ. Дополнил импорты
 
 
@@ -11,6 +13,30 @@ class Base(DeclarativeBase):
     pass
 
 
+class UtcDateTime(TypeDecorator):
+    """
+    DateTime(timezone=True), который и на встроенном SQLite (app/db.py) отдаёт aware-datetime в UTC.
+    PostgreSQL хранит timestamptz сам; SQLite — строку без зоны: пишем UTC, при чтении дописываем зону.
+    """
+
+    impl = DateTime(timezone=True)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is not None and dialect.name == "sqlite" and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is not None and dialect.name == "sqlite" and value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value
+
+
+# BIGSERIAL в PostgreSQL; в SQLite автоинкремент есть только у INTEGER PRIMARY KEY
+BigIntegerPK = BigInteger().with_variant(Integer, "sqlite")
+
+
 # ПО ЗАДАНИЮ. Модель пользователей и групп для управления правами и разграничениями.
 class User(Base):
     __tablename__ = "users"
@@ -25,7 +51,13 @@ class User(Base):
     # - root: "первый админ" (bootstrap через env), имеет максимальные права
     group: Mapped[str] = mapped_column(String(16), nullable=False, default="user")  # user|admin|root
 
-    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(UtcDateTime, server_default=func.now(), nullable=False)
+
+    # Число неудалённых (deleted_at IS NULL) объявлений пользователя (миграция 0009).
+    # Поддерживается AdvertisementCRUD в той же транзакции, что и изменение объявлений;
+    # расхождения чинит `python -m app.counters reconcile`.
+    # Без индекса — чтобы частые +1/-1 оставались HOT-обновлениями.
+    ad_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
 
     advertisements: Mapped[list["Advertisement"]] = relationship(back_populates="owner")
 
@@ -33,6 +65,9 @@ class User(Base):
 class Advertisement(Base):
     __tablename__ = "advertisements"
 
+    # ВАЖНО: с миграции 0004 таблица партиционирована по created_at (помесячно),
+    # PK в БД — (id, created_at). Для ORM identity оставляем только id:
+    # он по-прежнему уникален (одна sequence на все партиции).
     id: Mapped[int] = mapped_column(primary_key=True)
 
     title: Mapped[str] = mapped_column(String(255), nullable=False, index=True)
@@ -41,9 +76,9 @@ class Advertisement(Base):
     # Исправил ошибку с прошлой лабораторной — Decimal вместо float
     price: Mapped[Decimal] = mapped_column(Numeric(12, 2), nullable=False)
 
-    author: Mapped[str] = mapped_column(String(100), nullable=False)
+    author: Mapped[str] = mapped_column(String(120), nullable=False)
     created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True),
+        UtcDateTime,
         server_default=func.now(),
         nullable=False,
     )
@@ -51,3 +86,226 @@ class Advertisement(Base):
     # По заданию. Теперь владелец объявления тот, кто создал его.
     owner_id: Mapped[int | None] = mapped_column(ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
     owner: Mapped[User | None] = relationship(back_populates="advertisements")
+
+    # Мягкое удаление и срок жизни (миграция 0008): DELETE /advertisement/{id} только ставит deleted_at,
+    # физически строки удаляет (или переносит в archive) фоновый purge (app/purge.py).
+    # Истёкшие (expires_at <= now()) purge сначала помечает удалёнными, до этого их скрывает active_clause().
+    deleted_at: Mapped[datetime | None] = mapped_column(UtcDateTime, nullable=True)
+    expires_at: Mapped[datetime | None] = mapped_column(UtcDateTime, nullable=True)
+
+    # Время последнего изменения строки (миграция 0010): по нему app/rollups.py находит,
+    # какие дни статистики пересчитать. Ставится в каждом UPDATE AdvertisementCRUD.
+    updated_at: Mapped[datetime] = mapped_column(UtcDateTime, server_default=func.now(), nullable=False)
+
+    @classmethod
+    def active_clause(cls):
+        return (cls.deleted_at.is_(None)) & (cls.expires_at.is_(None) | (cls.expires_at > func.now()))
+
+
+# Статистика цен по дням (UTC) и авторам (app/rollups.py, миграция 0010).
+# author == "" — все авторы за день. Строки пересчитываются целиком для изменившихся дней.
+class AdvertisementDailyStats(Base):
+    __tablename__ = "advertisement_stats_daily"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    author: Mapped[str] = mapped_column(String(120), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, nullable=False)
+    price_min: Mapped[Decimal] = mapped_column(Numeric(12, 2), nullable=False)
+    price_max: Mapped[Decimal] = mapped_column(Numeric(12, 2), nullable=False)
+    price_avg: Mapped[Decimal] = mapped_column(Numeric(14, 4), nullable=False)
+    price_p50: Mapped[Decimal] = mapped_column(Numeric(14, 4), nullable=False)
+    price_p90: Mapped[Decimal] = mapped_column(Numeric(14, 4), nullable=False)
+    refreshed_at: Mapped[datetime] = mapped_column(UtcDateTime, server_default=func.now(), nullable=False)
+
+
+# Водяные знаки фоновых пересчётов: до какого updated_at изменения уже учтены
+class RollupWatermark(Base):
+    __tablename__ = "rollup_watermarks"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    value: Mapped[datetime] = mapped_column(UtcDateTime, nullable=False)
+
+
+# Журнал аудита: кто (actor_id) что сделал (action) с какой сущностью и какие поля менял.
+# Пишется пачками фоновым писателем (app/audit.py), не в транзакции запроса. Без FK:
+# записи о пользователе/объявлении должны пережить их удаление.
+class AuditLogEntry(Base):
+    __tablename__ = "audit_log"
+
+    id: Mapped[int] = mapped_column(BigIntegerPK, primary_key=True)
+    occurred_at: Mapped[datetime] = mapped_column(UtcDateTime, nullable=False)
+    actor_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    action: Mapped[str] = mapped_column(String(64), nullable=False)  # "user.patch", "advertisement.delete", ...
+    entity: Mapped[str] = mapped_column(String(32), nullable=False)  # "user" | "advertisement"
+    entity_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    changes: Mapped[dict] = mapped_column(JSON().with_variant(JSONB, "postgresql"), nullable=False)
+
+
+# Удалённые объявления, вычищенные purge при PURGE_ARCHIVE=1 (миграция 0008).
+# Схема archive — та же, куда app/partitions.py переносит отцепленные партиции.
+class PurgedAdvertisement(Base):
+    __tablename__ = "advertisements_purged"
+    __table_args__ = {"schema": "archive"}
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(UtcDateTime, primary_key=True)
+    title: Mapped[str] = mapped_column(String(255), nullable=False)
+    description: Mapped[str] = mapped_column(Text, nullable=False)
+    price: Mapped[Decimal] = mapped_column(Numeric(12, 2), nullable=False)
+    author: Mapped[str] = mapped_column(String(120), nullable=False)
+    owner_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    deleted_at: Mapped[datetime | None] = mapped_column(UtcDateTime, nullable=True)
+    expires_at: Mapped[datetime | None] = mapped_column(UtcDateTime, nullable=True)
+    purged_at: Mapped[datetime] = mapped_column(UtcDateTime, server_default=func.now(), nullable=False)
+
+
+# Idempotency-Key для POST /advertisement и POST /user (app/idempotency.py, IDEMPOTENCY_BACKEND=db).
+# key = "<метод> <путь>:<кто>:<ключ клиента>"; response IS NULL — первое выполнение ещё идёт
+# (или его воркер умер: после locked_until ключ перехватывает повтор).
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    key: Mapped[str] = mapped_column(String(400), primary_key=True)
+    fingerprint: Mapped[str] = mapped_column(String(64), nullable=False)  # HMAC-SHA256 тела запроса
+    response: Mapped[dict | None] = mapped_column(JSON().with_variant(JSONB, "postgresql"), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(UtcDateTime, server_default=func.now(), nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(UtcDateTime, nullable=False, index=True)
+    locked_until: Mapped[datetime | None] = mapped_column(UtcDateTime, nullable=True)
+
+
+# Состояние ограничения попыток входа (LOGIN_THROTTLE_BACKEND=db, app/login_throttle.py):
+# key = user:<имя> | ip:<адрес> — token bucket; fail:<имя>|<адрес> — неудачи подряд и пауза
+class LoginThrottle(Base):
+    __tablename__ = "login_throttle"
+
+    key: Mapped[str] = mapped_column(String(300), primary_key=True)
+    tokens: Mapped[float | None] = mapped_column(Float, nullable=True)
+    failures: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    locked_until: Mapped[datetime | None] = mapped_column(UtcDateTime, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(UtcDateTime, nullable=False, index=True)
+
+
+# Сохранённые поиски пользователя (те же фильтры, что у GET /advertisement) — для оповещений
+# о новых объявлениях. Совпадения ищет перколятор в памяти (app/percolator.py).
+class SavedSearch(Base):
+    __tablename__ = "saved_searches"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    name: Mapped[str] = mapped_column(String(100), nullable=False)
+
+    title: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    description: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    author: Mapped[str | None] = mapped_column(String(120), nullable=True)
+    q: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    price_from: Mapped[Decimal | None] = mapped_column(Numeric(12, 2), nullable=True)
+    price_to: Mapped[Decimal | None] = mapped_column(Numeric(12, 2), nullable=True)
+    created_from: Mapped[datetime | None] = mapped_column(UtcDateTime, nullable=True)
+    created_to: Mapped[datetime | None] = mapped_column(UtcDateTime, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(UtcDateTime, server_default=func.now(), nullable=False)
+
+
+# "Входящие" пользователя: какие новые объявления совпали с его сохранёнными поисками.
+# advertisement_id без FK: PK партиционированной advertisements — (id, created_at).
+class SearchInboxItem(Base):
+    __tablename__ = "search_inbox"
+    __table_args__ = (UniqueConstraint("saved_search_id", "advertisement_id", name="uq_search_inbox_search_ad"),)
+
+    id: Mapped[int] = mapped_column(BigIntegerPK, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    saved_search_id: Mapped[int] = mapped_column(ForeignKey("saved_searches.id", ondelete="CASCADE"), nullable=False)
+    advertisement_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(UtcDateTime, server_default=func.now(), nullable=False)
+
+
+# входящие пользователя, новые сверху (keyset по id)
+Index("ix_search_inbox_user_id", SearchInboxItem.user_id, SearchInboxItem.id.desc())
+
+# Справочник пользователей GET /user (миграция 0015): поиск по началу имени и фильтр по группе
+Index("ix_users_username_c", User.username.collate("C")).ddl_if(dialect="postgresql")
+Index("ix_users_group_id", User.group, User.id)
+
+# Индекс "объявления владельца, новые сверху" (миграция 0003).
+# Покрывает и keyset-пагинацию GET /user/{user_id}/advertisement, и ON DELETE SET NULL —
+# поэтому он, в отличие от индексов поиска, НЕ частичный (SET NULL трогает и удалённые строки).
+Index(
+    "ix_advertisements_owner_created",
+    Advertisement.owner_id,
+    Advertisement.created_at.desc(),
+    Advertisement.id.desc(),
+)
+
+
+# Индексы под формы запросов поиска (миграция 0005); с миграции 0008 — только по живым строкам
+_ACTIVE_ONLY = Advertisement.deleted_at.is_(None)
+Index(
+    "ix_advertisements_created_id",
+    Advertisement.created_at.desc(),
+    Advertisement.id.desc(),
+    postgresql_where=_ACTIVE_ONLY,
+)
+Index(
+    "ix_advertisements_price_created",
+    Advertisement.price,
+    Advertisement.created_at.desc(),
+    postgresql_where=_ACTIVE_ONLY,
+)
+# сортировки price_asc/price_desc поиска с keyset-курсором (миграция 0012)
+Index("ix_advertisements_price_id", Advertisement.price, Advertisement.id, postgresql_where=_ACTIVE_ONLY)
+Index("ix_advertisements_created_brin", Advertisement.created_at, postgresql_using="brin").ddl_if(dialect="postgresql")
+# автодополнение заголовков (миграция 0019)
+Index(
+    "ix_advertisements_title_lower_c",
+    func.lower(Advertisement.title).collate("C"),
+    postgresql_where=_ACTIVE_ONLY,
+).ddl_if(dialect="postgresql")
+for _column in (Advertisement.title, Advertisement.description, Advertisement.author):
+    Index(
+        f"ix_advertisements_{_column.key}_trgm",
+        _column,
+        postgresql_using="gin",
+        postgresql_ops={_column.key: "gin_trgm_ops"},
+    ).ddl_if(dialect="postgresql")
+del _column
+
+# Встроенный SQLite (app/db.py): вместо trigram GIN — FTS5 с trigram-токенизатором для q.
+# External content: текст хранится только в advertisements, индекс ведут триггеры.
+_ADVERTISEMENTS_FTS_DDL = (
+    "CREATE VIRTUAL TABLE advertisements_fts USING fts5("
+    "title, description, author, content='advertisements', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER advertisements_fts_ai AFTER INSERT ON advertisements BEGIN "
+    "INSERT INTO advertisements_fts (rowid, title, description, author) "
+    "VALUES (new.id, new.title, new.description, new.author); END",
+    "CREATE TRIGGER advertisements_fts_ad AFTER DELETE ON advertisements BEGIN "
+    "INSERT INTO advertisements_fts (advertisements_fts, rowid, title, description, author) "
+    "VALUES ('delete', old.id, old.title, old.description, old.author); END",
+    "CREATE TRIGGER advertisements_fts_au AFTER UPDATE OF title, description, author ON advertisements BEGIN "
+    "INSERT INTO advertisements_fts (advertisements_fts, rowid, title, description, author) "
+    "VALUES ('delete', old.id, old.title, old.description, old.author); "
+    "INSERT INTO advertisements_fts (rowid, title, description, author) "
+    "VALUES (new.id, new.title, new.description, new.author); END",
+)
+for _ddl in _ADVERTISEMENTS_FTS_DDL:
+    event.listen(Advertisement.__table__, "after_create", DDL(_ddl).execute_if(dialect="sqlite"))
+del _ddl
+
+# Очереди purge (миграция 0008): маленькие частичные индексы только по "хвостам"
+Index(
+    "ix_advertisements_deleted_at",
+    Advertisement.deleted_at,
+    postgresql_where=Advertisement.deleted_at.is_not(None),
+)
+Index(
+    "ix_advertisements_expires_at",
+    Advertisement.expires_at,
+    postgresql_where=Advertisement.expires_at.is_not(None) & Advertisement.deleted_at.is_(None),
+)
+Index("ix_advertisements_updated_at", Advertisement.updated_at)
+
+# "все авторы за период" и "автор за период"
+Index("ix_advertisement_stats_daily_author_day", AdvertisementDailyStats.author, AdvertisementDailyStats.day)
+
+# история сущности и действия пользователя, новые сверху (keyset по id)
+Index("ix_audit_log_entity", AuditLogEntry.entity, AuditLogEntry.entity_id, AuditLogEntry.id.desc())
+Index("ix_audit_log_actor", AuditLogEntry.actor_id, AuditLogEntry.id.desc())
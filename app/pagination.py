@@ -0,0 +1,54 @@
+# Курсоры для keyset-пагинации (вместо OFFSET).
+# Курсор — непрозрачная для клиента строка (urlsafe base64 от JSON),
+# внутри лежат значения ключа сортировки последней отданной строки.
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _dump(value) -> str | int:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _load(value, type_):
+    if type_ is datetime:
+        return datetime.fromisoformat(value)
+    if type_ is Decimal:
+        return Decimal(value)
+    if type_ is int:
+        if not isinstance(value, int):
+            raise ValueError("Invalid cursor")
+        return value
+    return type_(value)
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps([_dump(v) for v in values], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, types: tuple[type, ...]) -> tuple:
+    # ValueError -> в роуте превращаем в 400
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (binascii.Error, UnicodeError, json.JSONDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError("Invalid cursor")
+    try:
+        return tuple(_load(v, t) for v, t in zip(values, types))
+    except (TypeError, ValueError, InvalidOperation) as e:
+        raise ValueError("Invalid cursor") from e
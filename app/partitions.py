@@ -0,0 +1,241 @@
+# Помесячные партиции таблицы advertisements (PARTITION BY RANGE (created_at)).
+#
+# - ensure_partitions(): создаёт партиции на текущий и N следующих месяцев
+#   (вызывается периодически из lifespan, см. partition_maintenance_loop)
+# - archive_partitions(): отцепляет старые партиции (DETACH ... CONCURRENTLY)
+#   и переносит их в схему archive (или удаляет) — вместо массовых DELETE
+#
+# DEFAULT-партиции нет (см. миграцию 0004): строка за пределами созданных месяцев не вставится.
+# Поэтому партиции создаются с запасом (PARTITIONS_MONTHS_AHEAD), а check_partition_coverage()
+# пишет ERROR, если готовых месяцев впереди меньше PARTITIONS_MIN_MONTHS_AHEAD, — на починку
+# остановившегося обслуживания есть месяцы. Задача идёт в каждом воркере; ensure_partitions
+# выполняет один — взявший advisory lock, остальные пропускают проход.
+#
+# CLI:
+#   python -m app.partitions list
+#   python -m app.partitions ensure [--months-ahead 3]
+#   python -m app.partitions archive --before 2025-01 [--drop]
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.config import get_settings
+from app.db import advisory_lock, close_engine, get_engine
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "advertisements"
+ARCHIVE_SCHEMA = "archive"
+PARTITIONS_LOCK = "partitions"
+
+# последняя проверка запаса в этом процессе — для GET /admin/metrics
+_coverage: dict = {"months_ahead": None, "checked_at": None}
+
+
+def month_start(d: date | datetime) -> date:
+    return date(d.year, d.month, 1)
+
+
+def add_months(d: date, months: int) -> date:
+    total = d.year * 12 + (d.month - 1) + months
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_p{month:%Y%m}"
+
+
+def create_partition_sql(month: date) -> str:
+    # Границы в UTC: [1-е число месяца, 1-е число следующего месяца)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') TO ('{add_months(month, 1):%Y-%m-%d} 00:00:00+00')"
+    )
+
+
+def months_covered(existing: set[str] | list[str], current: date) -> int:
+    """Сколько месяцев после current подряд уже имеют партицию; -1 — нет даже партиции current."""
+    months = -1
+    while partition_name(add_months(current, months + 1)) in existing:
+        months += 1
+    return months
+
+
+async def is_partitioned(conn: AsyncConnection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    res = await conn.execute(
+        text(
+            "SELECT 1 FROM pg_partitioned_table pt "
+            "JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = :name AND c.relnamespace = 'public'::regnamespace"
+        ),
+        {"name": PARENT_TABLE},
+    )
+    return res.first() is not None
+
+
+async def list_partitions(conn: AsyncConnection) -> list[str]:
+    res = await conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:parent AS regclass) ORDER BY c.relname"
+        ),
+        {"parent": PARENT_TABLE},
+    )
+    return [row[0] for row in res]
+
+
+async def ensure_partitions(engine: AsyncEngine | None = None, *, months_ahead: int | None = None) -> list[str]:
+    """Создаёт недостающие партиции: текущий месяц + months_ahead вперёд. Возвращает созданные."""
+    engine = engine or get_engine()
+    if months_ahead is None:
+        months_ahead = get_settings().partitions_months_ahead
+
+    current = month_start(datetime.now(timezone.utc))
+    wanted = [add_months(current, i) for i in range(months_ahead + 1)]
+
+    async with advisory_lock(PARTITIONS_LOCK, engine) as acquired:
+        if not acquired:
+            return []  # проход сейчас выполняет другой воркер
+        async with engine.begin() as conn:
+            if not await is_partitioned(conn):
+                return []
+            existing = set(await list_partitions(conn))
+            created = []
+            for month in wanted:
+                if partition_name(month) in existing:
+                    continue
+                await conn.execute(text(create_partition_sql(month)))
+                created.append(partition_name(month))
+    return created
+
+
+async def check_partition_coverage(engine: AsyncEngine | None = None) -> int | None:
+    """
+    Сколько месяцев вперёд уже есть партиции (см. months_covered); None — таблица не партиционирована.
+    Меньше PARTITIONS_MIN_MONTHS_AHEAD — ERROR в лог: скоро вставки начнут падать.
+    """
+    engine = engine or get_engine()
+    async with engine.connect() as conn:
+        if not await is_partitioned(conn):
+            return None
+        existing = await list_partitions(conn)
+
+    months = months_covered(existing, month_start(datetime.now(timezone.utc)))
+    _coverage.update(months_ahead=months, checked_at=datetime.now(timezone.utc).isoformat())
+    minimum = get_settings().partitions_min_months_ahead
+    if months < minimum:
+        logger.error(
+            "%s has partitions for only %d months ahead (minimum %d): inserts fail once they run out",
+            PARENT_TABLE,
+            months,
+            minimum,
+        )
+    return months
+
+
+def partition_status() -> dict:
+    return {**_coverage, "min_months_ahead": get_settings().partitions_min_months_ahead}
+
+
+async def archive_partitions(before: date, *, drop: bool = False, engine: AsyncEngine | None = None) -> list[str]:
+    """
+    Отцепляет все партиции с данными старше месяца `before`.
+
+    DETACH PARTITION ... CONCURRENTLY не блокирует чтение/запись родительской таблицы,
+    но не может выполняться внутри транзакции — поэтому AUTOCOMMIT.
+    Отцепленная партиция переносится в схему archive (или удаляется при drop=True) —
+    это O(1) по сравнению с DELETE миллионов строк и последующим VACUUM.
+    """
+    engine = engine or get_engine()
+    before = month_start(before)
+    archived = []
+
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        if not await is_partitioned(conn):
+            return []
+        if not drop:
+            await conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+
+        for name in await list_partitions(conn):
+            try:
+                month = datetime.strptime(name.removeprefix(f"{PARENT_TABLE}_p"), "%Y%m").date()
+            except ValueError:
+                continue  # не наша партиция (создана вручную) — не трогаем
+            if month >= before:
+                continue
+
+            await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name} CONCURRENTLY"))
+            if drop:
+                await conn.execute(text(f"DROP TABLE {name}"))
+            else:
+                await conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}"))
+            archived.append(name)
+
+    return archived
+
+
+async def partition_maintenance_loop() -> None:
+    # Фоновая задача из lifespan: держим партиции на months_ahead месяцев вперёд
+    settings = get_settings()
+    while True:
+        try:
+            created = await ensure_partitions()
+            if created:
+                logger.info("created partitions: %s", ", ".join(created))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("partition maintenance failed")
+        # отдельно от ensure: запас проверяется и когда создание партиций падает
+        try:
+            await check_partition_coverage()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("partition coverage check failed")
+        await asyncio.sleep(settings.partitions_maintenance_interval)
+
+
+async def _cli(args: argparse.Namespace) -> None:
+    try:
+        if args.command == "list":
+            async with get_engine().connect() as conn:
+                for name in await list_partitions(conn):
+                    print(name)
+        elif args.command == "ensure":
+            created = await ensure_partitions(months_ahead=args.months_ahead)
+            print("created:", ", ".join(created) or "-")
+            print("months ahead:", await check_partition_coverage())
+        elif args.command == "archive":
+            before = datetime.strptime(args.before, "%Y-%m").date()
+            archived = await archive_partitions(before, drop=args.drop)
+            print("dropped:" if args.drop else "archived:", ", ".join(archived) or "-")
+    finally:
+        await close_engine()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="advertisements partitions maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    p_ensure = sub.add_parser("ensure")
+    p_ensure.add_argument("--months-ahead", type=int, default=None)
+    p_archive = sub.add_parser("archive")
+    p_archive.add_argument("--before", required=True, help="YYYY-MM: отцепить партиции старше этого месяца")
+    p_archive.add_argument("--drop", action="store_true", help="удалить вместо переноса в схему archive")
+    asyncio.run(_cli(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
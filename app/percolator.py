@@ -0,0 +1,278 @@
+# Перколятор сохранённых поисков: "какие сохранённые поиски совпали с новым объявлением?"
+#
+# Наивно — прогнать каждый сохранённый поиск по каждому новому объявлению (O(число поисков)).
+# Здесь наоборот: сохранённые поиски проиндексированы в памяти, и объявление проверяется
+# только против небольшого подмножества кандидатов:
+# - текстовые поиски (title/description/author/q — подстрока, как ILIKE '%...%') индексируются
+#   по ОДНОЙ триграмме своей самой длинной подстроки (выбираем самую редкую в индексе).
+#   Если подстрока входит в объявление, то и любая её триграмма входит в триграммы объявления,
+#   поэтому кандидаты = поиски, чья триграмма есть среди триграмм объявления.
+# - подстроки короче 3 символов проверяются всегда (их мало)
+# - поиски без текста — только по цене/дате: отсортированы по price_from, bisect отсекает
+#   те, у кого нижняя граница выше цены объявления
+# Кандидаты потом проверяются точно (AdvertisementFilter.matches).
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import logging
+from dataclasses import dataclass
+from decimal import Decimal
+
+from sqlalchemy.exc import IntegrityError
+
+from app.config import get_settings
+from app.crud import SavedSearchCRUD
+from app.db import get_sessionmaker
+from app.events import AdvertisementFilter
+
+logger = logging.getLogger(__name__)
+
+_NO_LOWER_BOUND = Decimal("-Infinity")
+
+
+def trigrams(value: str) -> set[str]:
+    value = value.casefold()
+    return {value[i : i + 3] for i in range(len(value) - 2)}
+
+
+@dataclass(frozen=True)
+class SavedQuery:
+    id: int
+    user_id: int
+    filters: AdvertisementFilter
+
+    @property
+    def needle(self) -> str | None:
+        # самая длинная подстрока — самая избирательная
+        needles = [n for n in (self.filters.title, self.filters.description, self.filters.author, self.filters.q) if n]
+        return max(needles, key=len).casefold() if needles else None
+
+
+class Percolator:
+    def __init__(self):
+        self._queries: dict[int, SavedQuery] = {}
+        self._key_of: dict[int, str | None] = {}  # id -> триграмма, по которой проиндексирован
+        self._by_trigram: dict[str, set[int]] = {}
+        self._short: set[int] = set()
+
+        # поиски без текста: отсортированный список (price_from, id)
+        self._by_price_from: list[tuple[Decimal, int]] = []
+
+        # изменения после begin_reload(): снимок из БД их может не содержать, replace_all применит их поверх
+        self._journal: list[tuple[str, SavedQuery | int]] | None = None
+
+        # метрики
+        self.percolated = 0
+        self.candidates_checked = 0
+        self.matched = 0
+
+    def __len__(self) -> int:
+        return len(self._queries)
+
+    def add(self, query: SavedQuery) -> None:
+        if self._journal is not None:
+            self._journal.append(("add", query))
+        if query.id in self._queries:
+            self.remove(query.id)
+        self._queries[query.id] = query
+
+        needle = query.needle
+        if needle is None:
+            lower = query.filters.price_from if query.filters.price_from is not None else _NO_LOWER_BOUND
+            bisect.insort(self._by_price_from, (lower, query.id))
+            self._key_of[query.id] = None
+        elif len(needle) < 3:
+            self._short.add(query.id)
+            self._key_of[query.id] = ""
+        else:
+            key = min(trigrams(needle), key=lambda t: len(self._by_trigram.get(t, ())))
+            self._by_trigram.setdefault(key, set()).add(query.id)
+            self._key_of[query.id] = key
+
+    def remove(self, query_id: int) -> None:
+        if self._journal is not None:
+            self._journal.append(("remove", query_id))
+        query = self._queries.pop(query_id, None)
+        if query is None:
+            return
+        key = self._key_of.pop(query_id)
+        if key is None:
+            lower = query.filters.price_from if query.filters.price_from is not None else _NO_LOWER_BOUND
+            idx = bisect.bisect_left(self._by_price_from, (lower, query_id))
+            if idx < len(self._by_price_from) and self._by_price_from[idx] == (lower, query_id):
+                del self._by_price_from[idx]
+        elif key == "":
+            self._short.discard(query_id)
+        else:
+            bucket = self._by_trigram.get(key)
+            if bucket is not None:
+                bucket.discard(query_id)
+                if not bucket:
+                    del self._by_trigram[key]
+
+    def begin_reload(self) -> None:
+        # вызывается ДО чтения снимка из БД: add/remove с этого момента запоминаются
+        self._journal = []
+
+    def abort_reload(self) -> None:
+        self._journal = None
+
+    def replace_all(self, queries) -> None:
+        fresh = Percolator()
+        for query in queries:
+            fresh.add(query)
+        # поиск, созданный (или удалённый) этим воркером, пока читался снимок, не теряется до следующей перезагрузки
+        for op, item in self._journal or ():
+            if op == "add":
+                fresh.add(item)
+            else:
+                fresh.remove(item)
+        self._journal = None
+        self._queries, self._key_of = fresh._queries, fresh._key_of
+        self._by_trigram, self._short, self._by_price_from = fresh._by_trigram, fresh._short, fresh._by_price_from
+
+    def candidates(self, ad) -> set[int]:
+        result = set(self._short)
+
+        ad_trigrams = trigrams(f"{ad.title}\n{ad.description}\n{ad.author}")
+        # обходим меньшее из двух множеств
+        if len(ad_trigrams) <= len(self._by_trigram):
+            for t in ad_trigrams:
+                bucket = self._by_trigram.get(t)
+                if bucket:
+                    result |= bucket
+        else:
+            for t, bucket in self._by_trigram.items():
+                if t in ad_trigrams:
+                    result |= bucket
+
+        upper = bisect.bisect_right(self._by_price_from, (ad.price, float("inf")))
+        result.update(query_id for _, query_id in self._by_price_from[:upper])
+        return result
+
+    def match(self, ad) -> list[SavedQuery]:
+        candidates = self.candidates(ad)
+        self.percolated += 1
+        self.candidates_checked += len(candidates)
+        found = [self._queries[i] for i in candidates if self._queries[i].filters.matches(ad)]
+        self.matched += len(found)
+        return found
+
+    def stats(self) -> dict:
+        return {
+            "saved_searches": len(self._queries),
+            "trigram_keys": len(self._by_trigram),
+            "short_needles": len(self._short),
+            "price_only": len(self._by_price_from),
+            "percolated": self.percolated,
+            "avg_candidates": round(self.candidates_checked / self.percolated, 2) if self.percolated else 0,
+            "matched": self.matched,
+        }
+
+
+# -------------------- процесс: загрузка индекса и запись совпадений во "входящие" --------------------
+
+FILTER_FIELDS = ("title", "description", "author", "q", "price_from", "price_to", "created_from", "created_to")
+
+
+def saved_query_from_row(row) -> SavedQuery:
+    return SavedQuery(
+        id=row.id,
+        user_id=row.user_id,
+        filters=AdvertisementFilter(**{name: getattr(row, name) for name in FILTER_FIELDS}),
+    )
+
+
+class PercolatorService:
+    """
+    Индекс живёт в памяти воркера. Свои изменения (создание/удаление поиска) применяются сразу,
+    изменения с других воркеров подтягиваются полной перезагрузкой раз в PERCOLATOR_REFRESH_SECONDS.
+    """
+
+    def __init__(self):
+        self.index = Percolator()
+        self._pending: set[asyncio.Task] = set()
+        self.inbox_failures = 0
+
+    async def reload(self) -> None:
+        self.index.begin_reload()
+        try:
+            async with get_sessionmaker()() as db:
+                rows = await SavedSearchCRUD(db).list_all()
+        except BaseException:
+            self.index.abort_reload()
+            raise
+        self.index.replace_all(saved_query_from_row(row) for row in rows)
+
+    async def refresh_forever(self) -> None:
+        interval = get_settings().percolator_refresh_seconds
+        while True:
+            try:
+                await self.reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("percolator reload failed")
+            await asyncio.sleep(interval)
+
+    def add(self, row) -> None:
+        self.index.add(saved_query_from_row(row))
+
+    def remove(self, search_id: int) -> None:
+        self.index.remove(search_id)
+
+    def percolate_in_background(self, ad, *, owner_id: int) -> None:
+        # не задерживаем ответ на POST /advertisement: матчинг и запись — отдельной задачей
+        task = asyncio.ensure_future(self._percolate(ad, owner_id))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _percolate(self, ad, owner_id: int) -> None:
+        rows: list[dict] = []
+        try:
+            rows = [
+                {"user_id": query.user_id, "saved_search_id": query.id, "advertisement_id": ad.id}
+                for query in self.index.match(ad)
+                if query.user_id != owner_id  # о своих объявлениях не оповещаем
+            ]
+            if not rows:
+                return
+            # add_inbox_items пропускает уже удалённые поиски; FK всё же может упасть, если поиск
+            # удалили между SELECT и INSERT, — тогда один повтор (удалённый уже не попадёт в SELECT)
+            for attempt in (1, 2):
+                try:
+                    async with get_sessionmaker()() as db:
+                        await SavedSearchCRUD(db).add_inbox_items(rows)
+                    return
+                except IntegrityError:
+                    if attempt == 2:
+                        raise
+        except Exception:
+            self.inbox_failures += 1
+            logger.exception("failed to store %d saved search matches for advertisement %s", len(rows), ad.id)
+
+    async def close(self) -> None:
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {**self.index.stats(), "pending": len(self._pending), "inbox_failures": self.inbox_failures}
+
+
+_service: PercolatorService | None = None
+
+
+def get_percolator() -> PercolatorService:
+    global _service
+    if _service is None:
+        _service = PercolatorService()
+    return _service
+
+
+async def close_percolator() -> None:
+    global _service
+    if _service is not None:
+        await _service.close()
+    _service = None
@@ -0,0 +1,353 @@
+# Профилирование отдельных запросов по требованию admin/root.
+#
+# Включается двумя способами:
+# - заголовком `X-Profile: cprofile|sampling` у одного запроса (только с токеном admin/root,
+#   иначе заголовок молча игнорируется);
+# - глобально на ограниченное время: POST /admin/profiling {"seconds": 60, "path_prefix": "/advertisement"}
+#   (в пределах этого воркера, не больше max_profiles запросов).
+#
+# Для профилируемого запроса сохраняются дерево вызовов и все выполненные SQL (с длительностью):
+# - cprofile — детерминированный cProfile (.prof, открывается pstats/snakeviz). Ловит ВСЕ вызовы потока,
+#   в том числе чужих корутин, выполнявшихся одновременно; одновременно идёт только один такой профиль.
+# - sampling — pyinstrument (опциональная зависимость) в async-режиме: время по await-цепочке
+#   именно этого запроса (.html). Без pyinstrument — откат на cprofile.
+# Файлы лежат в PROFILING_DIR (хранятся последние PROFILING_MAX_FILES), список и скачивание —
+# GET /admin/profiles. Ответ профилированного запроса несёт заголовок X-Profile-Id.
+#
+# Когда профилирование выключено, middleware — одна проверка флага и заголовка; SQL-слушатель
+# SQLAlchemy подключается только на время профилирования.
+
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import io
+import json
+import logging
+import marshal
+import os
+import pstats
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import get_settings
+from app.crud import UserCRUD
+from app.db import get_sessionmaker
+from app.deps import AUTH_STATE
+from app.security import decode_token
+
+try:  # опциональная зависимость: без неё sampling откатывается на cProfile
+    import pyinstrument
+except ImportError:  # pragma: no cover
+    pyinstrument = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+PROFILE_MODES = ("cprofile", "sampling")
+
+
+# -------------------- SQL запроса --------------------
+
+# список SQL текущего профилируемого запроса; None — запрос не профилируется
+_current_sql: ContextVar[list[dict] | None] = ContextVar("profiling_sql", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_sql.get() is not None:
+        conn.info.setdefault("profiling_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    queries = _current_sql.get()
+    started = conn.info.get("profiling_started")
+    if queries is None or not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    if len(queries) < get_settings().profiling_max_sql:
+        queries.append(
+            {
+                "statement": statement,
+                "parameters": repr(parameters)[:500],
+                "executemany": executemany,
+                "duration_ms": round(elapsed * 1000, 3),
+            }
+        )
+
+
+class _SqlCapture:
+    # слушатели на классе Engine (переживают пересоздание engine), подключены только пока
+    # идёт хотя бы один профиль
+    def __init__(self):
+        self._users = 0
+
+    def acquire(self) -> None:
+        if self._users == 0:
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        self._users += 1
+
+    def release(self) -> None:
+        self._users -= 1
+        if self._users == 0:
+            event.remove(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.remove(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+sql_capture = _SqlCapture()
+
+
+# -------------------- хранилище профилей на диске --------------------
+
+class ProfileStore:
+    def __init__(self, directory: str | Path, *, max_files: int):
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    def _meta_path(self, profile_id: str) -> Path:
+        return self.directory / f"{profile_id}.json"
+
+    def save(self, meta: dict, artifact: bytes) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / meta["artifact"]).write_bytes(artifact)
+        tmp = self._meta_path(meta["id"]).with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self._meta_path(meta["id"]))  # метаданные появляются последними и целиком
+        self._trim()
+
+    def _trim(self) -> None:
+        metas = sorted(self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        for path in metas[: max(len(metas) - self.max_files, 0)]:
+            meta = self._read(path)
+            path.unlink(missing_ok=True)
+            if meta is not None:
+                (self.directory / meta["artifact"]).unlink(missing_ok=True)
+
+    @staticmethod
+    def _read(path: Path) -> dict | None:
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def list(self) -> list[dict]:
+        if not self.directory.exists():
+            return []
+        metas = (self._read(p) for p in self.directory.glob("*.json"))
+        summaries = [
+            {key: meta[key] for key in meta if key not in ("sql", "summary")} | {"sql_count": len(meta["sql"])}
+            for meta in metas
+            if meta is not None
+        ]
+        return sorted(summaries, key=lambda m: m["started_at"], reverse=True)
+
+    def get(self, profile_id: str) -> dict | None:
+        return self._read(self._meta_path(profile_id))
+
+    def artifact_path(self, profile_id: str) -> Path | None:
+        meta = self.get(profile_id)
+        if meta is None:
+            return None
+        path = self.directory / meta["artifact"]
+        return path if path.exists() else None
+
+
+_store: ProfileStore | None = None
+
+
+def get_profile_store() -> ProfileStore:
+    global _store
+    if _store is None:
+        settings = get_settings()
+        _store = ProfileStore(settings.profiling_dir, max_files=settings.profiling_max_files)
+    return _store
+
+
+# -------------------- глобальный переключатель на время --------------------
+
+class ProfilingToggle:
+    def __init__(self):
+        self.until = 0.0  # time.monotonic()
+        self.mode = "cprofile"
+        self.path_prefix: str | None = None
+        self.remaining = 0
+
+    @property
+    def active(self) -> bool:
+        return self.remaining > 0 and time.monotonic() < self.until
+
+    def enable(self, *, seconds: float, mode: str, path_prefix: str | None, max_profiles: int) -> None:
+        self.until = time.monotonic() + seconds
+        self.mode = mode
+        self.path_prefix = path_prefix
+        self.remaining = max_profiles
+
+    def disable(self) -> None:
+        self.until = 0.0
+        self.remaining = 0
+
+    def match(self, path: str) -> str | None:
+        # режим, если этот запрос надо профилировать по глобальному переключателю (лимит не тратит)
+        if not self.active or (self.path_prefix and not path.startswith(self.path_prefix)):
+            return None
+        return self.mode
+
+    def consume(self) -> None:
+        # профиль действительно снят — минус один из max_profiles
+        self.remaining -= 1
+
+    def take(self, path: str) -> str | None:
+        mode = self.match(path)
+        if mode is not None:
+            self.consume()
+        return mode
+
+    def state(self) -> dict:
+        active = self.active
+        return {
+            "active": active,
+            "mode": self.mode,
+            "path_prefix": self.path_prefix,
+            "remaining_profiles": self.remaining if active else 0,
+            "remaining_seconds": round(max(self.until - time.monotonic(), 0), 1) if active else 0,
+        }
+
+
+profiling_toggle = ProfilingToggle()
+
+
+# -------------------- middleware --------------------
+
+async def _is_admin_token(scope: Scope) -> bool:
+    # только когда пришёл X-Profile: токен + актуальная группа из БД (токен мог пережить понижение прав).
+    # Без bearer-токена или с невалидным токеном — отказ без БД. Декодирование — через кэш
+    # decode_token, найденный пользователь кладётся в request.state (app/deps.AUTH_STATE):
+    # зависимость get_current_user его переиспользует, лишнего запроса к users нет
+    token = None
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                return False
+            break
+    if not token:
+        return False
+    try:
+        user_id = int(decode_token(token)["sub"])
+    except Exception:
+        return False
+    async with get_sessionmaker()() as db:
+        user = await UserCRUD(db).get(user_id)
+    scope.setdefault("state", {})[AUTH_STATE] = (token, user)
+    return user is not None and user.group in ("admin", "root")
+
+
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._cprofile_busy = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        mode = None
+        from_toggle = False
+        requested = next((value for name, value in scope["headers"] if name == PROFILE_HEADER), None)
+        if requested is not None:
+            requested = requested.decode("latin-1").strip().lower()
+            if requested in ("1", "true"):
+                requested = "cprofile"
+            if requested in PROFILE_MODES and await _is_admin_token(scope):
+                mode = requested
+        if mode is None:
+            mode = profiling_toggle.match(scope["path"])
+            from_toggle = True
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        if mode == "sampling" and pyinstrument is None:
+            mode = "cprofile"
+        if mode == "cprofile" and self._cprofile_busy:
+            # cProfile — один на поток: второй одновременный запрос идёт без профиля (лимит не тратит)
+            await self.app(scope, receive, send)
+            return
+        if from_toggle:
+            profiling_toggle.consume()
+        await self._profiled(scope, receive, send, mode)
+
+    async def _profiled(self, scope: Scope, receive: Receive, send: Send, mode: str) -> None:
+        profile_id = uuid.uuid4().hex
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message).append(PROFILE_ID_HEADER, profile_id)
+            await send(message)
+
+        queries: list[dict] = []
+        sql_token = _current_sql.set(queries)
+        sql_capture.acquire()
+        started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+
+        if mode == "sampling":
+            profiler = pyinstrument.Profiler(async_mode="enabled")
+            profiler.start()
+        else:
+            self._cprofile_busy = True
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if mode == "sampling":
+                profiler.stop()
+            else:
+                profiler.disable()
+                self._cprofile_busy = False
+            duration = time.perf_counter() - started
+            sql_capture.release()
+            _current_sql.reset(sql_token)
+
+            if mode == "sampling":
+                artifact, extension, summary = profiler.output_html().encode("utf-8"), "html", profiler.output_text()
+            else:
+                profiler.create_stats()
+                artifact, extension = marshal.dumps(profiler.stats), "prof"
+                out = io.StringIO()
+                pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(40)
+                summary = out.getvalue()
+
+            meta = {
+                "id": profile_id,
+                "mode": mode,
+                "method": scope["method"],
+                "path": scope["path"],
+                "query_string": scope.get("query_string", b"").decode("latin-1"),
+                "status_code": status_code,
+                "started_at": started_at.isoformat(),
+                "duration_ms": round(duration * 1000, 3),
+                "sql_total_ms": round(sum(q["duration_ms"] for q in queries), 3),
+                "sql": queries,
+                "summary": summary,
+                "artifact": f"{profile_id}.{extension}",
+            }
+            try:
+                # запись на диск — вне цикла событий
+                await asyncio.to_thread(get_profile_store().save, meta, artifact)
+            except OSError:
+                logger.exception("failed to store profile %s", profile_id)
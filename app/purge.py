@@ -0,0 +1,94 @@
+# Фоновая очистка удалённых и истёкших объявлений (мягкое удаление — миграция 0008).
+#
+# Запрос DELETE /advertisement/{id} только ставит deleted_at. Здесь, вне пути запроса:
+# 1) истёкшие (expires_at <= now()) помечаются удалёнными — подписчики живой ленты получают "deleted"
+# 2) удалённые дольше PURGE_RETENTION_SECONDS физически удаляются (или переносятся
+#    в archive.advertisements_purged при PURGE_ARCHIVE=1)
+# Обе фазы — пачками по PURGE_BATCH_SIZE, каждая пачка в своей короткой транзакции
+# с FOR UPDATE SKIP LOCKED: блокировки держатся недолго, несколько воркеров не мешают друг другу.
+#
+# CLI (один проход, например из cron при PURGE_ENABLED=0):
+#   python -m app.purge [--batch-size 500] [--archive]
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+from datetime import timedelta
+
+from app.config import get_settings
+from app.crud import AdvertisementCRUD
+from app.db import close_engine, get_sessionmaker
+
+logger = logging.getLogger(__name__)
+
+
+async def purge_once(
+    *,
+    batch_size: int | None = None,
+    retention: timedelta | None = None,
+    archive: bool | None = None,
+    max_batches: int = 100,
+) -> dict:
+    """Один проход обеих фаз. max_batches ограничивает работу за проход (остальное — в следующий)."""
+    settings = get_settings()
+    batch_size = batch_size or settings.purge_batch_size
+    retention = retention if retention is not None else timedelta(seconds=settings.purge_retention_seconds)
+    archive = settings.purge_archive if archive is None else archive
+
+    expired = purged = 0
+    session_factory = get_sessionmaker()
+
+    for _ in range(max_batches):
+        async with session_factory() as db:
+            ids = await AdvertisementCRUD(db).expire_due(limit=batch_size)
+        expired += len(ids)
+        if len(ids) < batch_size:
+            break
+        await asyncio.sleep(0)  # между пачками отдаём цикл событий запросам
+
+    for _ in range(max_batches):
+        async with session_factory() as db:
+            count = await AdvertisementCRUD(db).purge_deleted(older_than=retention, limit=batch_size, archive=archive)
+        purged += count
+        if count < batch_size:
+            break
+        await asyncio.sleep(0)
+
+    return {"expired": expired, "purged": purged}
+
+
+async def purge_loop() -> None:
+    # Фоновая задача из lifespan
+    settings = get_settings()
+    while True:
+        try:
+            result = await purge_once()
+            if result["expired"] or result["purged"]:
+                logger.info("purge: expired %(expired)d, purged %(purged)d advertisements", result)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("advertisement purge failed")
+        await asyncio.sleep(settings.purge_interval_seconds)
+
+
+async def _cli(args: argparse.Namespace) -> None:
+    try:
+        result = await purge_once(batch_size=args.batch_size, archive=args.archive or None, max_batches=args.max_batches)
+        print(f"expired: {result['expired']}, purged: {result['purged']}")
+    finally:
+        await close_engine()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="purge deleted/expired advertisements")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--archive", action="store_true", help="переносить в archive.advertisements_purged")
+    parser.add_argument("--max-batches", type=int, default=10_000)
+    asyncio.run(_cli(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# Инкрементальный пересчёт статистики цен по дням и авторам (advertisement_stats_daily, миграция 0010).
+#
+# Живой COUNT/percentile по advertisements на каждый запрос слишком дорог, поэтому
+# GET /advertisement/stats читает готовую сводку, а фоновая задача из lifespan раз в
+# STATS_ROLLUP_INTERVAL_SECONDS пересчитывает только дни, где строки менялись после водяного знака:
+#   1) засекаем now() и находим дни с updated_at > водяной знак (индекс ix_advertisements_updated_at)
+#   2) пересчитываем эти дни целиком (пачками по ROLLUP_DAYS_PER_BATCH)
+#   3) новый водяной знак = засечка - STATS_ROLLUP_OVERLAP_SECONDS
+# updated_at — время НАЧАЛА транзакции, поэтому перекрытие: транзакция, начатая до засечки
+# и закоммиченная после, попадёт в следующий проход. Повторный пересчёт дня безвреден.
+# Задача идёт в каждом воркере uvicorn; проход выполняет тот, кто взял advisory lock,
+# остальные его пропускают — иначе два DELETE + INSERT одного дня упирались в PK (day, author).
+#
+# CLI:
+#   python -m app.rollups refresh [--full]
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+from datetime import timedelta
+
+from sqlalchemy import func, select
+
+from app.config import get_settings
+from app.crud import MarketStatsCRUD
+from app.db import advisory_lock, close_engine, get_sessionmaker
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_DAYS_PER_BATCH = 31
+ROLLUP_LOCK = "stats_rollup"
+
+
+async def refresh_stats_once(*, full: bool = False) -> int:
+    """
+    Пересчитывает изменившиеся дни (full=True — все). Возвращает число пересчитанных дней;
+    0 — и когда проход сейчас выполняет другой воркер.
+    """
+    async with advisory_lock(ROLLUP_LOCK) as acquired:
+        if not acquired:
+            return 0
+        return await _refresh(full=full)
+
+
+async def _refresh(*, full: bool) -> int:
+    settings = get_settings()
+    session_factory = get_sessionmaker()
+
+    async with session_factory() as db:
+        if db.bind.dialect.name != "postgresql":
+            return 0
+        started = await db.scalar(select(func.clock_timestamp()))
+        crud = MarketStatsCRUD(db)
+        since = None if full else await crud.get_watermark()
+        days = await crud.changed_days(since)
+
+    for i in range(0, len(days), ROLLUP_DAYS_PER_BATCH):
+        async with session_factory() as db:
+            await MarketStatsCRUD(db).recompute_days(days[i : i + ROLLUP_DAYS_PER_BATCH])
+
+    # водяной знак двигаем только после успешного пересчёта всех дней
+    async with session_factory() as db:
+        await MarketStatsCRUD(db).set_watermark(started - timedelta(seconds=settings.stats_rollup_overlap_seconds))
+    return len(days)
+
+
+async def stats_rollup_loop() -> None:
+    # Фоновая задача из lifespan
+    settings = get_settings()
+    while True:
+        try:
+            days = await refresh_stats_once()
+            if days:
+                logger.debug("stats rollup: recomputed %d days", days)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("stats rollup failed")
+        await asyncio.sleep(settings.stats_rollup_interval_seconds)
+
+
+async def _cli(args: argparse.Namespace) -> None:
+    try:
+        if args.command == "refresh":
+            days = await refresh_stats_once(full=args.full)
+            print(f"recomputed days: {days}")
+    finally:
+        await close_engine()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="market statistics rollups")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_refresh = sub.add_parser("refresh")
+    p_refresh.add_argument("--full", action="store_true", help="пересчитать все дни, игнорируя водяной знак")
+    asyncio.run(_cli(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
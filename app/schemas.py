@@ -1,10 +1,10 @@
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal  # Исправил ошибку с прошлой лабораторной
 from typing import Optional, Literal  # ПО ЗАДАНИЮ. Дополнил импорты
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import AwareDatetime, BaseModel, ConfigDict, Field
 
 # ====================ДОБАВЛЯЕМ СХЕМЫ ПОЛЬЗОВАТЕЛЕЙ И ЛОГИН==================
 
@@ -47,6 +47,16 @@ class UserOut(BaseModel):
     username: str
     group: UserGroup
     created_at: datetime
+    ad_count: Optional[int] = None  # неудалённые объявления пользователя
+
+
+class UserBrief(BaseModel):
+    # компактная строка справочника: GET /user?view=compact
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    username: str
+    group: UserGroup
 
 
 # -------------------- ADVERTISEMENT --------------------
@@ -55,6 +65,8 @@ class AdvertisementCreate(BaseModel):
     description: str = Field(min_length=1)
     price: Decimal = Field(gt=0)  # Тут Decimal, так что всё ок)
     author: str = Field(min_length=1, max_length=120)
+    # когда объявление снимется само; не задано — now() + ADVERTISEMENT_TTL_DAYS (или бессрочно)
+    expires_at: Optional[AwareDatetime] = None
 
 
 class AdvertisementUpdate(BaseModel):
@@ -74,3 +86,92 @@ class AdvertisementOut(BaseModel):
     price: Decimal # Тут Decimal, так что всё ок)
     author: str
     created_at: datetime
+    expires_at: Optional[datetime] = None
+
+
+# Статистика цен за день (GET /advertisement/stats); author=None — все авторы
+class AdvertisementDailyStatsOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    day: date
+    author: Optional[str] = None
+    count: int
+    price_min: Decimal
+    price_max: Decimal
+    price_avg: Decimal
+    price_p50: Decimal
+    price_p90: Decimal
+
+
+# Пакетное получение объявлений (GET/POST /advertisement/batch)
+class AdvertisementBatchRequest(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=1000)
+
+
+class AdvertisementBatchOut(BaseModel):
+    items: list[AdvertisementOut]  # в порядке запрошенных id (повторы схлопываются)
+    missing: list[int]  # id, которых нет
+
+
+class OwnerReassign(BaseModel):
+    # POST /user/{user_id}/advertisement/reassign — кому передать объявления
+    to_user_id: int = Field(gt=0)
+
+
+class OwnerReassignResult(BaseModel):
+    reassigned: int
+
+
+# -------------------- SAVED SEARCHES --------------------
+
+class SavedSearchCreate(BaseModel):
+    # фильтры — как у GET /advertisement; хотя бы один обязателен (проверим в роуте)
+    name: str = Field(min_length=1, max_length=100)
+    title: Optional[str] = Field(default=None, min_length=1, max_length=255)
+    description: Optional[str] = Field(default=None, min_length=1, max_length=255)
+    author: Optional[str] = Field(default=None, min_length=1, max_length=120)
+    q: Optional[str] = Field(default=None, min_length=1, max_length=255)
+    price_from: Optional[Decimal] = Field(default=None, gt=0)
+    price_to: Optional[Decimal] = Field(default=None, gt=0)
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+
+
+class SavedSearchOut(SavedSearchCreate):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    user_id: int
+    created_at: datetime
+
+
+class SearchInboxItemOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    saved_search_id: int
+    advertisement_id: int
+    created_at: datetime
+
+
+# -------------------- AUDIT --------------------
+
+class AuditLogEntryOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    occurred_at: datetime
+    actor_id: Optional[int]
+    action: str
+    entity: str
+    entity_id: int
+    changes: dict
+
+
+# -------------------- PROFILING --------------------
+
+class ProfilingEnable(BaseModel):
+    seconds: int = Field(ge=1, le=600)
+    path_prefix: Optional[str] = None
+    max_profiles: int = Field(default=50, ge=1, le=1000)
+    mode: Literal["cprofile", "sampling"] = "cprofile"
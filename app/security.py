@@ -2,24 +2,74 @@
 
 from __future__ import annotations
 
+import argparse
+import hashlib
+import statistics
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from jose import jwt, JWTError
-from passlib.context import CryptContext
+from typing import TYPE_CHECKING
 
 from app.config import get_settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+# python-jose (тянет cryptography) и passlib импортируются при первом использовании, а не при
+# импорте app.main: это ~80 мс холодного старта каждой реплики (bench/bench_cold_start.py).
+# Повторный import внутри функции — поиск в sys.modules, на горячем пути незаметен.
+
+
+def _make_pwd_context(rounds: int) -> CryptContext:
+    from passlib.context import CryptContext
+
+    # min = max = rounds: хэш с любой другой стоимостью (и дешевле, и дороже) needs_update —
+    # при следующем успешном входе он пересчитывается (UserCRUD.verify_credentials)
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+
+_pwd_context: CryptContext | None = None
+
+
+def get_pwd_context() -> CryptContext:
+    global _pwd_context
+    if _pwd_context is None:
+        _pwd_context = _make_pwd_context(get_settings().bcrypt_rounds)
+    return _pwd_context
+
+
+def __getattr__(name: str):
+    # ленивые атрибуты модуля: security.jwt и security.pwd_context доступны как раньше
+    if name == "jwt":
+        from jose import jwt
+
+        return jwt
+    if name == "pwd_context":
+        return get_pwd_context()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 
 def verify_password(password: str, password_hash: str) -> bool:
-    return pwd_context.verify(password, password_hash)
+    return get_pwd_context().verify(password, password_hash)
+
+
+def password_needs_rehash(password_hash: str) -> bool:
+    return get_pwd_context().needs_update(password_hash)
 
 
 def create_access_token(*, user_id: int, username: str, group: str) -> str:
+    from jose import jwt
+
     settings = get_settings()
     now = datetime.now(timezone.utc)
     exp = now + timedelta(hours=settings.jwt_exp_hours)
@@ -34,9 +84,143 @@ def create_access_token(*, user_id: int, username: str, group: str) -> str:
     return jwt.encode(payload, settings.jwt_secret, algorithm=settings.jwt_algorithm)
 
 
-def decode_token(token: str) -> dict:
+class TokenCache:
+    # Уже проверенные токены: sha256(токен) -> claims. Один и тот же токен приходит тысячи раз,
+    # а jwt.decode каждый раз заново разбирает его и проверяет подпись.
+    # - запись живёт не дольше exp токена (просроченный токен снова идёт в jwt.decode и отвергается)
+    # - токены без exp и невалидные токены не кэшируются (мусором нельзя вытеснить рабочие записи)
+    # - LRU на JWT_CACHE_SIZE записей; 0 — кэш выключен
+    def __init__(self, *, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[bytes, tuple[float, dict]] = OrderedDict()
+
+        # метрики
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, key: bytes) -> dict | None:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(entry[1])  # копия: вызывающий не испортит закэшированные claims
+
+    def put(self, key: bytes, claims: dict) -> None:
+        exp = claims.get("exp")
+        if self.max_entries <= 0 or not isinstance(exp, (int, float)):
+            return
+        self._entries[key] = (float(exp), dict(claims))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0,
+            "evictions": self.evictions,
+        }
+
+
+_token_cache: TokenCache | None = None
+
+
+def get_token_cache() -> TokenCache:
+    global _token_cache
+    if _token_cache is None:
+        _token_cache = TokenCache(max_entries=get_settings().jwt_cache_size)
+    return _token_cache
+
+
+def _decode_token_uncached(token: str) -> dict:
+    from jose import JWTError, jwt
+
     settings = get_settings()
     try:
         return jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
     except JWTError as e:
         raise ValueError("Invalid token") from e
+
+
+def decode_token(token: str) -> dict:
+    cache = get_token_cache()
+    if cache.max_entries <= 0:
+        return _decode_token_uncached(token)
+
+    key = cache.key(token)
+    claims = cache.get(key)
+    if claims is None:
+        claims = _decode_token_uncached(token)
+        cache.put(key, claims)
+    return claims
+
+
+# -------------------- калибровка стоимости bcrypt --------------------
+
+def measure_bcrypt(rounds: int, *, samples: int = 3) -> float:
+    """Медианное время (секунды) одного хэша bcrypt с данной стоимостью на этой машине."""
+    context = _make_pwd_context(rounds)
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.hash("calibration-password")
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def recommend_bcrypt_rounds(target_ms: float, *, samples: int = 3, max_rounds: int = 16) -> tuple[int, list[tuple[int, float]]]:
+    """
+    Самая дорогая стоимость, у которой хэш укладывается в target_ms (не меньше 4).
+    Каждый +1 к rounds удваивает время, поэтому мерим по возрастанию и останавливаемся на первом превышении.
+    """
+    _make_pwd_context(4).hash("warm-up")  # первый хэш загружает backend passlib — не считаем его
+    measured: list[tuple[int, float]] = []
+    best = 4
+    for rounds in range(4, max_rounds + 1):
+        ms = measure_bcrypt(rounds, samples=samples) * 1000
+        measured.append((rounds, ms))
+        if ms > target_ms:
+            break
+        best = rounds
+    return best, measured
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="password hashing maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_calibrate = sub.add_parser("calibrate", help="measure bcrypt cost on this machine")
+    p_calibrate.add_argument("--target-ms", type=float, default=250.0)
+    p_calibrate.add_argument("--samples", type=int, default=3)
+    args = parser.parse_args()
+
+    best, measured = recommend_bcrypt_rounds(args.target_ms, samples=args.samples)
+    current = get_settings().bcrypt_rounds
+    print(f"{'rounds':>6} {'ms/hash':>9} {'logins/s/core':>14}")
+    for rounds, ms in measured:
+        mark = " <- current" if rounds == current else ""
+        print(f"{rounds:>6} {ms:>9.1f} {1000 / ms:>14.1f}{mark}")
+    print(f"recommended for <= {args.target_ms:g} ms: BCRYPT_ROUNDS={best}")
+
+
+if __name__ == "__main__":
+    main()
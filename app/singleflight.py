@@ -0,0 +1,76 @@
+# Single-flight: одновременные одинаковые чтения ждут ОДИН запрос в БД и делят его результат.
+#
+# Если объявление "завирусилось", сотни одновременных GET /advertisement/{id}
+# превращаются в один SELECT; остальные просто ждут его результат.
+# Это НЕ кэш: как только запрос завершился, ключ забывается и следующий вызов идёт в БД.
+
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[Hashable, asyncio.Task] = {}
+
+        # метрики (отдаются в GET /admin/metrics)
+        self.requests = 0  # всего вызовов do()
+        self.executed = 0  # реально выполнено запросов в БД
+        self.collapsed = 0  # вызовов, которые присоединились к уже идущему запросу
+        self.timeouts = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]], *, timeout: float | None = None) -> T:
+        """
+        Выполняет fn() один раз на ключ среди одновременных вызовов.
+
+        fn запускается отдельной задачей: отмена одного из ожидающих (клиент отвалился)
+        не отменяет общий запрос для остальных.
+        timeout — сколько этот вызов готов ждать; по таймауту ключ забывается,
+        чтобы следующие вызовы не присоединялись к "зависшему" запросу.
+        """
+        self.requests += 1
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t, key=key: self._forget(key, t))
+            self.executed += 1
+        else:
+            self.collapsed += 1
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self._forget(key, task)
+            raise
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if task.done() and not task.cancelled():
+            # помечаем исключение как "прочитанное": его уже получили ожидающие
+            # (или не получит никто — после таймаута), warning в лог не нужен
+            task.exception()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "executed": self.executed,
+            "collapsed": self.collapsed,
+            "timeouts": self.timeouts,
+            "in_flight": self.in_flight,
+        }
+
+
+# По экземпляру на тип чтения: метрики видны раздельно
+advertisement_gets = SingleFlight("advertisement_get")
+advertisement_searches = SingleFlight("advertisement_search")
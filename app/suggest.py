@@ -0,0 +1,150 @@
+# Автодополнение заголовков: GET /advertisement/suggest?prefix=
+#
+# - в БД — префиксный поиск по индексу (lower(title) COLLATE "C") WHERE deleted_at IS NULL
+#   (миграция 0019): диапазон и порядок по индексу, а не ILIKE-скан с сортировкой
+# - горячие короткие префиксы ("a", "ip", "iph"...) — в LRU-кэше процесса:
+#   не больше SUGGEST_CACHE_SIZE префиксов по SUGGEST_LIMIT_MAX заголовков (память ограничена),
+#   запись живёт SUGGEST_CACHE_TTL секунд
+# - при старте кэш прогревается самыми частыми префиксами недавних объявлений
+# - создание/изменение/удаление объявления в этом воркере сразу сбрасывает префиксы его заголовка;
+#   изменения с других воркеров видны не позже чем через TTL
+
+from __future__ import annotations
+
+import logging
+import time
+from collections import Counter, OrderedDict
+
+from app.config import get_settings
+from app.crud import AdvertisementCRUD
+from app.db import get_sessionmaker
+
+logger = logging.getLogger(__name__)
+
+SUGGEST_LIMIT_MAX = 20
+
+
+def normalize_prefix(prefix: str) -> str:
+    # lower(), а не casefold(): должно совпадать с lower(title) в PostgreSQL
+    return " ".join(prefix.split()).lower()
+
+
+class SuggestCache:
+    def __init__(self, *, max_entries: int, ttl: float, max_prefix_len: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_prefix_len = max_prefix_len
+        self._entries: OrderedDict[str, tuple[float, list[str]]] = OrderedDict()
+
+        # метрики
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def cacheable(self, prefix: str) -> bool:
+        # длинные префиксы и так дёшевы (узкий диапазон индекса) — кэшируем только короткие
+        return len(prefix) <= self.max_prefix_len
+
+    def get(self, prefix: str) -> list[str] | None:
+        entry = self._entries.get(prefix)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[prefix]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(prefix)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, prefix: str, titles: list[str]) -> None:
+        if not self.cacheable(prefix):
+            return
+        self._entries[prefix] = (time.monotonic() + self.ttl, titles)
+        self._entries.move_to_end(prefix)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate_title(self, title: str) -> None:
+        # заголовок мог попасть только в выдачу своих же префиксов
+        normalized = normalize_prefix(title)
+        for length in range(1, min(len(normalized), self.max_prefix_len) + 1):
+            if self._entries.pop(normalized[:length], None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0,
+            "invalidations": self.invalidations,
+        }
+
+
+_cache: SuggestCache | None = None
+
+
+def get_suggest_cache() -> SuggestCache:
+    global _cache
+    if _cache is None:
+        settings = get_settings()
+        _cache = SuggestCache(
+            max_entries=settings.suggest_cache_size,
+            ttl=settings.suggest_cache_ttl,
+            max_prefix_len=settings.suggest_cache_prefix_len,
+        )
+    return _cache
+
+
+async def suggest_titles(db, prefix: str, *, limit: int = 10) -> list[str]:
+    prefix = normalize_prefix(prefix)
+    if not prefix:
+        return []
+    cache = get_suggest_cache()
+    titles = cache.get(prefix)
+    if titles is None:
+        # из БД берём сразу максимум: один и тот же префикс с разными limit — одна запись кэша
+        titles = await AdvertisementCRUD(db).suggest_titles(prefix, limit=SUGGEST_LIMIT_MAX)
+        cache.put(prefix, titles)
+    return titles[:limit]
+
+
+def invalidate_titles(*titles: str | None) -> None:
+    cache = get_suggest_cache()
+    for title in titles:
+        if title:
+            cache.invalidate_title(title)
+
+
+async def warm_suggest_cache(*, sample: int = 5000, prefixes: int | None = None) -> int:
+    """Прогрев: самые частые префиксы (1..3 символа) среди `sample` последних объявлений."""
+    if prefixes is None:
+        prefixes = get_settings().suggest_warm_prefixes
+    async with get_sessionmaker()() as db:
+        titles = await AdvertisementCRUD(db).recent_titles(limit=sample)
+        counts = Counter()
+        for title in titles:
+            normalized = normalize_prefix(title)
+            for length in range(1, min(len(normalized), 3) + 1):
+                counts[normalized[:length]] += 1
+        hot = [prefix for prefix, _ in counts.most_common(prefixes)]
+        for prefix in hot:
+            await suggest_titles(db, prefix)
+    return len(hot)
+
+
+async def warm_suggest_cache_in_background() -> None:
+    # задача из lifespan: ошибка прогрева не должна мешать старту
+    try:
+        warmed = await warm_suggest_cache()
+        logger.debug("suggest cache warmed with %d prefixes", warmed)
+    except Exception:
+        logger.exception("suggest cache warm-up failed")
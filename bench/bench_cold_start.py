@@ -0,0 +1,117 @@
+"""
+Холодный старт реплики: время `import app.main` и время от запуска uvicorn до первого ответа.
+
+Каждый замер — новый процесс python (как у новой реплики при автоскейлинге), берётся медиана.
+Без DATABASE_URL используется встроенный SQLite во временном каталоге:
+
+    python -m bench.bench_cold_start [--runs 5] [--max-import-ms 1500] [--max-first-response-ms 3000]
+
+С порогами выходит с кодом 1 при регрессии (для CI). Заодно печатает, какие тяжёлые модули
+оказались загружены при импорте — они должны грузиться лениво, при первом использовании.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+# не должны загружаться при импорте app.main (см. app/security.py, app/events.py)
+LAZY_MODULES = ("jose", "passlib", "cryptography", "bcrypt", "asyncpg", "pyinstrument")
+
+IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+
+def measure_import(env: dict[str, str]) -> tuple[float, list[str]]:
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE], env=env, check=True, capture_output=True, text=True
+    ).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    return result["seconds"], result["loaded"]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_first_response(env: dict[str, str], *, path: str = "/docs", timeout: float = 30.0) -> float:
+    # от запуска процесса до первого 200: импорт + lifespan + обработка запроса
+    port = _free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {proc.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.005)
+        raise TimeoutError(f"no response from uvicorn in {timeout:g}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/docs")
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--max-first-response-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    tmp = tempfile.TemporaryDirectory()
+    env.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(tmp.name, 'cold.db')}")
+
+    measure_import(env)  # первый запуск компилирует .pyc — его не считаем
+    imports, loaded = [], set()
+    for _ in range(args.runs):
+        seconds, modules = measure_import(env)
+        imports.append(seconds)
+        loaded.update(modules)
+    first = [measure_first_response(env, path=args.path) for _ in range(args.runs)]
+    tmp.cleanup()
+
+    import_ms = statistics.median(imports) * 1000
+    first_ms = statistics.median(first) * 1000
+    print(f"backend {env['DATABASE_URL'].split(':', 1)[0]}, {args.runs} runs, median")
+    print(f"{'import app.main':<22} {import_ms:>8.0f} ms   (min {min(imports) * 1000:.0f})")
+    print(f"{'first response ' + args.path:<22} {first_ms:>8.0f} ms   (min {min(first) * 1000:.0f})")
+    print(f"eagerly loaded: {', '.join(sorted(loaded)) or 'none of ' + ', '.join(LAZY_MODULES)}")
+
+    failed = []
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        failed.append(f"import {import_ms:.0f} ms > {args.max_import_ms:g} ms")
+    if args.max_first_response_ms is not None and first_ms > args.max_first_response_ms:
+        failed.append(f"first response {first_ms:.0f} ms > {args.max_first_response_ms:g} ms")
+    if failed:
+        print("REGRESSION: " + "; ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
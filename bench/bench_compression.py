@@ -0,0 +1,90 @@
+"""
+CPU против сэкономленных байт для сжатия страниц поиска.
+
+Страницы строятся детерминированно (seed) в форме ответа GET /advertisement
+(200 объявлений с полными description), БД не нужна:
+
+    python -m bench.bench_compression [--items 200] [--pages 20]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+
+from app.schemas import AdvertisementOut
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+WORDS = (
+    "продам куплю новый б/у состояние отличное торг возможен самовывоз доставка гарантия "
+    "комплект коробка документы срочно недорого велосипед ноутбук телефон видеокарта диван "
+    "шкаф квартира аренда район метро рядом парковка ремонт техника зарядка чехол"
+).split()
+
+
+def build_page(rng: random.Random, items: int) -> bytes:
+    now = datetime(2026, 2, 2, tzinfo=timezone.utc)
+    page = [
+        AdvertisementOut(
+            id=rng.randint(1, 10_000_000),
+            title=" ".join(rng.choices(WORDS, k=rng.randint(3, 8))).capitalize(),
+            description=" ".join(rng.choices(WORDS, k=rng.randint(30, 300))),
+            price=Decimal(rng.randint(100, 1_000_000)) / 100,
+            author=f"seller_{rng.randint(1, 5000)}",
+            created_at=now - timedelta(seconds=rng.randint(0, 30 * 86400)),
+        )
+        for _ in range(items)
+    ]
+    return json.dumps(jsonable_encoder(page), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def gzip_compress(level: int):
+    def compress(body: bytes) -> bytes:
+        c = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return c.compress(body) + c.flush()
+
+    return compress
+
+
+def zstd_compress(level: int):
+    compressor = zstandard.ZstdCompressor(level=level)
+    return compressor.compress
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--pages", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    pages = [build_page(rng, args.items) for _ in range(args.pages)]
+    raw_total = sum(len(p) for p in pages)
+
+    codecs = [(f"gzip-{lvl}", gzip_compress(lvl)) for lvl in (1, 4, 6, 9)]
+    if zstandard is not None:
+        codecs += [(f"zstd-{lvl}", zstd_compress(lvl)) for lvl in (1, 3, 6, 12, 19)]
+
+    print(f"{args.pages} pages x {args.items} items, avg raw page {raw_total / len(pages) / 1024:.1f} KiB")
+    print(f"{'codec':<10} {'ratio':>7} {'saved KiB/page':>15} {'CPU ms/page':>12} {'KiB saved / CPU ms':>19}")
+    for name, compress in codecs:
+        started = time.process_time()
+        out_total = sum(len(compress(p)) for p in pages)
+        cpu_ms = (time.process_time() - started) * 1000 / len(pages)
+        saved_kib = (raw_total - out_total) / len(pages) / 1024
+        print(f"{name:<10} {raw_total / out_total:>7.2f} {saved_kib:>15.1f} {cpu_ms:>12.2f} {saved_kib / max(cpu_ms, 1e-6):>19.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Замер round-trip'ов к БД на разные типы запросов: "жадная" сессия (как было раньше)
+против ленивой (`app.db.get_db`).
+
+Запуск (нужна поднятая БД и применённые миграции):
+
+    DATABASE_URL=postgresql+asyncpg://... python -m bench.bench_db_roundtrips
+
+Считаем события движка SQLAlchemy:
+- checkout  — взятие соединения из пула (+1 round-trip на pre-ping)
+- begin     — BEGIN
+- execute   — запросы
+- commit / rollback
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from typing import AsyncGenerator
+from uuid import uuid4
+
+import httpx
+from asgi_lifespan import LifespanManager
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import get_db, get_engine, get_sessionmaker
+from app.main import app
+
+N = 20
+
+
+async def eager_get_db() -> AsyncGenerator[AsyncSession, None]:
+    # Старое поведение: сессия + соединение на каждый запрос, rollback всегда
+    Session = get_sessionmaker()
+    async with Session() as session:
+        await session.connection()
+        try:
+            yield session
+        finally:
+            await session.rollback()
+
+
+def _attach(counter: Counter) -> None:
+    engine = get_engine().sync_engine
+    event.listen(engine.pool, "checkout", lambda *a: counter.update(["checkout"]))
+    event.listen(engine, "begin", lambda *a: counter.update(["begin"]))
+    event.listen(engine, "before_cursor_execute", lambda *a: counter.update(["execute"]))
+    event.listen(engine, "commit", lambda *a: counter.update(["commit"]))
+    event.listen(engine, "rollback", lambda *a: counter.update(["rollback"]))
+
+
+async def _measure(client: httpx.AsyncClient, counter: Counter, name: str, call) -> dict:
+    counter.clear()
+    for _ in range(N):
+        await call(client)
+    per_request = {k: v / N for k, v in counter.items()}
+    # pre-ping при checkout — тоже отдельный round-trip
+    per_request["round_trips"] = (
+        per_request.get("checkout", 0) * 2
+        + per_request.get("begin", 0)
+        + per_request.get("execute", 0)
+        + per_request.get("commit", 0)
+        + per_request.get("rollback", 0)
+    )
+    return {"request": name, **per_request}
+
+
+async def main() -> None:
+    counter: Counter = Counter()
+
+    async def no_token_create(c):
+        await c.post("/advertisement", json={"title": "t", "description": "d", "price": "1", "author": "a"})
+
+    async def bad_token_create(c):
+        await c.post(
+            "/advertisement",
+            json={"title": "t", "description": "d", "price": "1", "author": "a"},
+            headers={"Authorization": "Bearer not-a-jwt"},
+        )
+
+    async def get_missing_ad(c):
+        await c.get("/advertisement/0")
+
+    async def search(c):
+        await c.get("/advertisement", params={"limit": 10})
+
+    async def create_user(c):
+        await c.post("/user", json={"username": f"bench_{uuid4().hex[:10]}", "password": "bench_pass"})
+
+    scenarios = [
+        ("POST /advertisement (no token)", no_token_create),
+        ("POST /advertisement (bad token)", bad_token_create),
+        ("GET /advertisement/{id} (404)", get_missing_ad),
+        ("GET /advertisement (search)", search),
+        ("POST /user", create_user),
+    ]
+
+    async with LifespanManager(app):
+        _attach(counter)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            results = {}
+            for mode in ("eager", "lazy"):
+                if mode == "eager":
+                    app.dependency_overrides[get_db] = eager_get_db
+                else:
+                    app.dependency_overrides.pop(get_db, None)
+                for name, call in scenarios:
+                    results[(mode, name)] = await _measure(client, counter, name, call)
+
+    print(f"{'request':<36} {'eager':>8} {'lazy':>8} {'saved':>8}   (round-trips / request)")
+    for name, _ in scenarios:
+        eager = results[("eager", name)]["round_trips"]
+        lazy = results[("lazy", name)]["round_trips"]
+        print(f"{name:<36} {eager:>8.2f} {lazy:>8.2f} {eager - lazy:>8.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,59 @@
+"""
+Стоимость decode_token: полная проверка python-jose против LRU проверенных токенов.
+
+Набор токенов (как от N активных пользователей) предъявляется по кругу, БД не нужна:
+
+    python -m bench.bench_jwt [--tokens 1000] [--requests 200000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+from app.security import TokenCache, _decode_token_uncached, create_access_token, decode_token, get_token_cache
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=200_000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    tokens = [
+        create_access_token(user_id=i, username=f"user_{i}", group="user") for i in range(1, args.tokens + 1)
+    ]
+    stream = [rng.choice(tokens) for _ in range(args.requests)]
+
+    started = time.perf_counter()
+    for token in stream:
+        _decode_token_uncached(token)
+    uncached = (time.perf_counter() - started) / len(stream)
+
+    cache = get_token_cache()
+    cache.clear()
+    started = time.perf_counter()
+    for token in stream:
+        decode_token(token)
+    cached = (time.perf_counter() - started) / len(stream)
+
+    print(f"{args.tokens} distinct tokens, {args.requests} decodes, cache size {cache.max_entries}")
+    print(f"{'variant':<10} {'us/decode':>10}")
+    print(f"{'jose':<10} {uncached * 1e6:>10.2f}")
+    print(f"{'cached':<10} {cached * 1e6:>10.2f}   x{uncached / cached:.1f}, {cache.stats()}")
+
+    # хвост: токенов больше, чем помещается в кэш, — промахи не должны стоить больше, чем без кэша
+    small = TokenCache(max_entries=max(args.tokens // 10, 1))
+    started = time.perf_counter()
+    for token in stream[: args.requests // 10]:
+        key = small.key(token)
+        if small.get(key) is None:
+            small.put(key, _decode_token_uncached(token))
+    thrash = (time.perf_counter() - started) / (args.requests // 10)
+    print(f"{'thrashing':<10} {thrash * 1e6:>10.2f}   cache = 10% of tokens, {small.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Перколятор сохранённых поисков против наивного перебора (каждый поиск по каждому объявлению).
+
+Поиски и объявления генерируются детерминированно (seed), БД не нужна:
+
+    python -m bench.bench_percolator [--searches 100000] [--ads 2000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+
+from app.events import AdvertisementFilter
+from app.percolator import Percolator, SavedQuery
+
+ALPHABET = "абвгдежзиклмнопрстуфхцчшэюяabcdefghiklmnoprstxz0123456789"
+
+
+def build_vocabulary(rng: random.Random, size: int) -> list[str]:
+    # словарь "моделей/названий": тысячи слов, объявление содержит лишь малую их часть
+    return sorted({"".join(rng.choices(ALPHABET, k=rng.randint(4, 9))) for _ in range(size)})
+
+
+def build_queries(rng: random.Random, words: list[str], count: int) -> list[SavedQuery]:
+    queries = []
+    for i in range(count):
+        filters = {}
+        roll = rng.random()
+        if roll < 0.98:  # поиск только по цене — редкость
+            field = rng.choice(["title", "title", "q", "description", "author"])
+            filters[field] = rng.choice(words) if field != "author" else f"seller_{rng.randint(1, 5000)}"
+        if rng.random() < 0.5:
+            low = rng.randint(0, 50_000)
+            filters["price_from"] = Decimal(low)
+            if rng.random() < 0.5:
+                filters["price_to"] = Decimal(low + rng.randint(100, 50_000))
+        queries.append(SavedQuery(id=i, user_id=rng.randint(1, count // 2 or 1), filters=AdvertisementFilter(**filters)))
+    return queries
+
+
+def build_ads(rng: random.Random, words: list[str], count: int) -> list[SimpleNamespace]:
+    now = datetime(2026, 2, 2, tzinfo=timezone.utc)
+    return [
+        SimpleNamespace(
+            id=i,
+            title=" ".join(rng.choices(words, k=rng.randint(3, 8))).capitalize(),
+            description=" ".join(rng.choices(words, k=rng.randint(10, 60))),
+            price=Decimal(rng.randint(100, 100_000)),
+            author=f"seller_{rng.randint(1, 5000)}",
+            created_at=now,
+        )
+        for i in range(count)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--searches", type=int, default=100_000)
+    parser.add_argument("--ads", type=int, default=2000)
+    parser.add_argument("--naive-ads", type=int, default=100, help="наивный перебор медленный — меряем на меньшей выборке")
+    parser.add_argument("--vocabulary", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    words = build_vocabulary(rng, args.vocabulary)
+    queries = build_queries(rng, words, args.searches)
+    ads = build_ads(rng, words, args.ads)
+
+    started = time.perf_counter()
+    percolator = Percolator()
+    percolator.replace_all(queries)
+    build_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    matched = sum(len(percolator.match(ad)) for ad in ads)
+    indexed_s = time.perf_counter() - started
+
+    naive_ads = ads[: args.naive_ads]
+    started = time.perf_counter()
+    naive_matched = sum(1 for ad in naive_ads for q in queries if q.filters.matches(ad))
+    naive_s = time.perf_counter() - started
+
+    # сверка: на той же выборке результат совпадает
+    check = sum(len(percolator.match(ad)) for ad in naive_ads)
+    assert check == naive_matched, (check, naive_matched)
+
+    stats = percolator.stats()
+    print(f"saved searches:   {args.searches}  (index build {build_s * 1000:.0f} ms)")
+    print(f"index:            {stats['trigram_keys']} trigram keys, {stats['short_needles']} short, {stats['price_only']} price-only")
+    print(f"percolator:       {len(ads) / indexed_s:,.0f} ads/s, avg candidates {stats['avg_candidates']}, matches {matched}")
+    print(f"naive scan:       {len(naive_ads) / naive_s:,.0f} ads/s")
+    print(f"speedup:          x{(len(ads) / indexed_s) / (len(naive_ads) / naive_s):.1f}")
+
+
+if __name__ == "__main__":
+    main()
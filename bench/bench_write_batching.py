@@ -0,0 +1,90 @@
+"""
+Пропускная способность и задержка создания объявлений: по одному INSERT+COMMIT на объявление
+против group commit (app/batching.py) при разной конкурентности.
+
+Нужна БД с применёнными миграциями:
+
+    DATABASE_URL=postgresql+asyncpg://... python -m bench.bench_write_batching [--total 2000]
+
+Созданные строки помечаются author=<маркер> и удаляются в конце.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+from decimal import Decimal
+from uuid import uuid4
+
+from sqlalchemy import delete
+
+from app.batching import AdvertisementWriteBatcher
+from app.crud import AdvertisementCRUD
+from app.db import close_engine, get_sessionmaker
+from app.models import Advertisement
+
+
+async def _single(values: dict):
+    async with get_sessionmaker()() as db:
+        return await AdvertisementCRUD(db).create(**values)
+
+
+async def _run(label: str, create, total: int, concurrency: int) -> None:
+    latencies: list[float] = []
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    async def worker():
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            await create(i)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(
+        f"{label:<22} c={concurrency:<4} {total / elapsed:>9.0f} rows/s"
+        f"   p50 {statistics.median(latencies) * 1000:>7.2f} ms   p99 {p99 * 1000:>7.2f} ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--total", type=int, default=2000)
+    parser.add_argument("--window-ms", type=float, default=5.0)
+    parser.add_argument("--max-batch", type=int, default=100)
+    args = parser.parse_args()
+
+    marker = f"bench_{uuid4().hex[:8]}"
+
+    def values(i: int) -> dict:
+        return dict(title=f"Bench ad {i}", description="group commit bench", price=Decimal("1.00"), author=marker)
+
+    try:
+        for concurrency in (1, 10, 50, 200):
+            await _run("one INSERT+COMMIT", lambda i: _single(values(i)), args.total, concurrency)
+
+            batcher = AdvertisementWriteBatcher(window_ms=args.window_ms, max_batch=args.max_batch)
+            await _run("group commit", lambda i: batcher.submit(**values(i)), args.total, concurrency)
+            await batcher.close()
+            print(f"{'':<22} batches={batcher.batches} avg_batch={batcher.stats()['avg_batch']}")
+    finally:
+        async with get_sessionmaker()() as db:
+            await db.execute(delete(Advertisement).where(Advertisement.author == marker))
+            await db.commit()
+        await close_engine()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
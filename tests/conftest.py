@@ -90,6 +90,12 @@ async def _create_user_and_token(
     )
 
 
+@pytest.fixture
+def anyio_backend():
+    # Приложение целиком на asyncio (asyncpg, asyncio-задачи) — trio не гоняем
+    return "asyncio"
+
+
 @pytest.fixture
 async def client():
     # httpx>=0.24: app передаём через ASGITransport (параметра app= больше нет)
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.audit import AuditWriter, redact
+
+
+class RecordingWriter(AuditWriter):
+    # вместо БД — запоминаем пачки
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.seen_batches: list[list[dict]] = []
+
+    async def _write(self, batch):
+        await asyncio.sleep(0.01)
+        self.seen_batches.append(batch)
+        self.written += len(batch)
+        self.batches += 1
+
+
+def _record(writer: AuditWriter, entity_id: int) -> bool:
+    return writer.record(action="advertisement.patch", entity="advertisement", entity_id=entity_id, actor_id=1)
+
+
+def test_redact_hides_passwords():
+    assert redact({"username": "bob", "password": "secret"}) == {"username": "bob", "password": "***"}
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(("overflow", "kept"), [("drop_newest", [0, 1]), ("drop_oldest", [2, 3])])
+async def test_overflow_policy(overflow, kept):
+    writer = RecordingWriter(queue_size=2, batch_size=10, flush_interval_ms=10, overflow=overflow)
+    results = [_record(writer, i) for i in range(4)]
+    assert results == ([True, True, False, False] if overflow == "drop_newest" else [True] * 4)
+    assert writer.stats()["dropped"] == 2
+
+    await writer.close()  # не запущен — close просто дописывает очередь
+    assert [e["entity_id"] for batch in writer.seen_batches for e in batch] == kept
+
+
+@pytest.mark.anyio
+async def test_batches_by_size_and_time_and_drains_on_close():
+    writer = RecordingWriter(queue_size=100, batch_size=3, flush_interval_ms=50)
+    writer.start()
+    for i in range(7):
+        _record(writer, i)
+    await asyncio.sleep(0.2)
+    # 3 + 3 по размеру, последняя одиночная — по времени
+    assert [len(b) for b in writer.seen_batches] == [3, 3, 1]
+
+    for i in range(7, 9):
+        _record(writer, i)
+    await writer.close()
+    assert [e["entity_id"] for batch in writer.seen_batches for e in batch] == list(range(9))
+    assert not _record(writer, 99)  # после close события не принимаются
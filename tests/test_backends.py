@@ -0,0 +1,112 @@
+# Паритет хранилищ: один и тот же сценарий через AdvertisementCRUD/UserCRUD на встроенном SQLite
+# (всегда, файл во временном каталоге) и на PostgreSQL из DATABASE_URL (если настроен он).
+
+from __future__ import annotations
+
+import asyncio
+from datetime import timedelta
+from decimal import Decimal
+from uuid import uuid4
+
+import pytest
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import Settings
+from app.crud import AdvertisementCRUD, UserCRUD, search_sort_key
+from app.db import create_embedded_schema, create_engine_for, get_engine
+from app.models import PurgedAdvertisement
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+async def session(request, tmp_path):
+    if request.param == "sqlite":
+        engine = create_engine_for(f"sqlite+aiosqlite:///{tmp_path / 'parity.db'}")
+        await create_embedded_schema(engine)
+    else:
+        engine = get_engine()
+        if engine.dialect.name != "postgresql":
+            pytest.skip("DATABASE_URL указывает не на PostgreSQL")
+
+    async with async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)() as session:
+        yield session
+    if request.param == "sqlite":
+        await engine.dispose()
+
+
+async def _seed(session) -> tuple[str, list]:
+    tag = uuid4().hex[:8]
+    owner = await UserCRUD(session).create(username=f"parity_{tag}", password="parity_pass")
+    rows = [
+        ("Горный ВЕЛОСИПЕД", "почти новый", "300.00"),
+        ("Велосипед детский", "шлем в подарок", "100.00"),
+        ("Диван угловой", "велюр", "200.00"),
+        ("Ноутбук", "без царапин", "100.00"),
+    ]
+    crud = AdvertisementCRUD(session)
+    ads = [
+        await crud.create(title=f"{tag} {title}", description=description, price=Decimal(price), author=f"seller {tag}", owner_id=owner.id)
+        for title, description, price in rows
+    ]
+    return tag, ads
+
+
+@pytest.mark.anyio
+async def test_search_parity(session):
+    tag, ads = await _seed(session)
+    crud = AdvertisementCRUD(session)
+
+    async def titles(**filters) -> list[str]:
+        found = await crud.search(author=tag, **filters)
+        return [ad.title.removeprefix(f"{tag} ") for ad in found]
+
+    # подстрока без учёта регистра (в т.ч. кириллица): на SQLite — FTS5 trigram, короткое — LIKE
+    assert await titles(q="велосипед", sort="oldest") == ["Горный ВЕЛОСИПЕД", "Велосипед детский"]
+    assert await titles(q="ВЕЛЮР") == ["Диван угловой"]
+    assert await titles(q="ДИ") == ["Диван угловой"]
+    assert await titles(title="ноут") == ["Ноутбук"]
+    assert await titles(price_from=Decimal("150"), sort="price_asc") == ["Диван угловой", "Горный ВЕЛОСИПЕД"]
+
+    # keyset-курсор: одинаковые цены разводит id
+    page = await crud.search(author=tag, sort="price_asc", limit=2)
+    rest = await crud.search(author=tag, sort="price_asc", after=search_sort_key(page[-1], "price_asc"))
+    assert [ad.id for ad in page + rest] == [ads[1].id, ads[3].id, ads[2].id, ads[0].id]
+
+    assert await crud.suggest_titles(f"{tag} в".lower()) == [f"{tag} Велосипед детский"]
+    assert {ad.id for ad in await crud.get_many([ads[0].id, ads[2].id])} == {ads[0].id, ads[2].id}
+    assert all(ad.created_at.tzinfo is not None for ad in ads)
+
+
+@pytest.mark.anyio
+async def test_soft_delete_and_purge_parity(session):
+    tag, ads = await _seed(session)
+    crud = AdvertisementCRUD(session)
+    owner = await UserCRUD(session).get(ads[0].owner_id)
+    assert owner.ad_count == 4
+
+    assert await crud.delete(ads[0].id) is True
+    assert await crud.delete(ads[0].id) is False
+    assert await crud.get(ads[0].id) is None
+    assert ads[0].id not in {ad.id for ad in await crud.search(author=tag)}
+    await session.refresh(owner)
+    assert owner.ad_count == 3
+
+    await asyncio.sleep(0.01)
+    assert await crud.purge_deleted(older_than=timedelta(0), limit=100, archive=True) >= 1
+    archived = await session.scalar(select(PurgedAdvertisement).where(PurgedAdvertisement.id == ads[0].id))
+    assert archived is not None and archived.title == f"{tag} Горный ВЕЛОСИПЕД"
+
+
+@pytest.mark.parametrize("backend", ["LOGIN_THROTTLE_BACKEND", "IDEMPOTENCY_BACKEND"])
+def test_sqlite_rejects_db_backed_shared_stores(backend):
+    with pytest.raises(ValidationError, match=f"{backend}=db requires PostgreSQL"):
+        Settings(DATABASE_URL="sqlite+aiosqlite:///ads.db", **{backend: "db"})
+    assert Settings(DATABASE_URL="postgresql+asyncpg://u:p@db/ads", **{backend: "db"})
+
+
+def test_sqlite_in_memory_is_rejected():
+    # одно соединение на все сессии — транзакции параллельных запросов перемешивались бы
+    for url in ("sqlite+aiosqlite://", "sqlite+aiosqlite:///:memory:"):
+        with pytest.raises(ValueError, match="in-memory SQLite is not supported"):
+            create_engine_for(url)
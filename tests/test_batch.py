@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import pytest
+
+
+@pytest.mark.anyio
+async def test_batch_get_preserves_order_and_reports_missing(auth_client_a):
+    created_ids: list[int] = []
+    for i in range(3):
+        payload = {"title": f"Пакет {i}", "description": "batch", "price": "1.00", "author": "Alice"}
+        r = await auth_client_a.post("/advertisement", json=payload)
+        assert r.status_code == 201, r.text
+        created_ids.append(r.json()["id"])
+
+    missing_id = 2_000_000_000
+    requested = [created_ids[2], missing_id, created_ids[0], created_ids[1], created_ids[0]]
+
+    # GET: повторяющиеся параметры и список через запятую
+    r = await auth_client_a.get(
+        "/advertisement/batch",
+        params={"ids": [f"{requested[0]},{requested[1]}", *map(str, requested[2:])]},
+    )
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert [it["id"] for it in body["items"]] == [created_ids[2], created_ids[0], created_ids[1]]
+    assert body["missing"] == [missing_id]
+
+    # POST — для длинных списков, ответ тот же
+    r = await auth_client_a.post("/advertisement/batch", json={"ids": requested})
+    assert r.status_code == 200, r.text
+    assert r.json() == body
+
+    r = await auth_client_a.get("/advertisement/batch", params={"ids": "1,abc"})
+    assert r.status_code == 422, r.text
+
+    for ad_id in created_ids:
+        r = await auth_client_a.delete(f"/advertisement/{ad_id}")
+        assert r.status_code == 204, r.text
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.batching import AdvertisementWriteBatcher
+
+
+class RecordingBatcher(AdvertisementWriteBatcher):
+    # вместо БД — запоминаем пачки и "возвращаем строки" с id
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.seen_batches: list[list[dict]] = []
+
+    async def _flush(self, batch):
+        self.seen_batches.append([values for values, _ in batch])
+        for i, (values, fut) in enumerate(batch):
+            fut.set_result({"id": len(self.seen_batches) * 1000 + i, **values})
+
+
+@pytest.mark.anyio
+async def test_concurrent_submits_coalesce_within_window():
+    batcher = RecordingBatcher(window_ms=20, max_batch=100)
+    results = await asyncio.gather(*(batcher.submit(title=f"ad {i}") for i in range(10)))
+
+    assert len(batcher.seen_batches) == 1
+    # каждый вызывающий получил именно свою строку
+    assert [r["title"] for r in results] == [f"ad {i}" for i in range(10)]
+
+
+@pytest.mark.anyio
+async def test_max_batch_splits_and_flushes_immediately():
+    batcher = RecordingBatcher(window_ms=10_000, max_batch=4)
+    results = await asyncio.wait_for(
+        asyncio.gather(*(batcher.submit(title=f"ad {i}") for i in range(8))),
+        timeout=1,  # окно 10 секунд: дождались бы только при сбросе по max_batch
+    )
+    assert [len(b) for b in batcher.seen_batches] == [4, 4]
+    assert len(results) == 8
+
+
+@pytest.mark.anyio
+async def test_close_flushes_pending():
+    batcher = RecordingBatcher(window_ms=10_000, max_batch=100)
+    pending = asyncio.ensure_future(batcher.submit(title="last"))
+    await asyncio.sleep(0)
+    await batcher.close()
+    assert (await pending)["title"] == "last"
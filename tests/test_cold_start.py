@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+
+import pytest
+
+import app.main
+from bench.bench_cold_start import IMPORT_PROBE, LAZY_MODULES
+
+
+def test_import_app_main_keeps_crypto_lazy():
+    # новый процесс: в этом уже всё загружено другими тестами
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE], env=dict(os.environ), check=True, capture_output=True, text=True
+    ).stdout
+    loaded = json.loads(out.strip().splitlines()[-1])["loaded"]
+    assert loaded == [], f"импорт app.main загрузил {loaded}; они должны грузиться при первом использовании ({LAZY_MODULES})"
+
+
+@pytest.mark.anyio
+async def test_background_bootstrap_retries_until_database_is_up(monkeypatch, caplog):
+    attempts = 0
+
+    async def flaky() -> None:
+        nonlocal attempts
+        attempts += 1
+        if attempts < 3:
+            raise ConnectionRefusedError("database is not up yet")
+
+    monkeypatch.setattr(app.main, "bootstrap_root", flaky)
+    with caplog.at_level(logging.ERROR, logger="app.main"):
+        await asyncio.wait_for(app.main.bootstrap_root_in_background(initial_delay=0.01, max_delay=0.02), 5)
+    assert attempts == 3
+    assert caplog.text.count("bootstrap root failed") == 2
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import gzip
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+
+from app.compression import CompressionMiddleware, parse_accept_encoding
+
+BIG = "объявление " * 500
+
+
+def _make_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+    @app.get("/big")
+    async def big():
+        return PlainTextResponse(BIG)
+
+    @app.get("/small")
+    async def small():
+        return PlainTextResponse("ok")
+
+    @app.get("/stream")
+    async def stream():
+        async def gen():
+            for i in range(10):
+                yield f"chunk-{i};" * 50
+
+        return StreamingResponse(gen(), media_type="text/plain")
+
+    @app.get("/sse")
+    async def sse():
+        async def gen():
+            yield "data: hello\n\n" * 200
+
+        return StreamingResponse(gen(), media_type="text/event-stream")
+
+    return app
+
+
+@pytest.fixture
+async def raw_client():
+    transport = httpx.ASGITransport(app=_make_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding("gzip;q=0.5, zstd, *;q=0") == {"gzip": 0.5, "zstd": 1.0, "*": 0.0}
+
+
+@pytest.mark.anyio
+async def test_gzip_negotiated_for_large_body(raw_client):
+    r = await raw_client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in r.headers["vary"]
+    assert int(r.headers["content-length"]) < len(BIG.encode())
+    assert r.text == BIG  # httpx сам распаковывает
+
+
+@pytest.mark.anyio
+async def test_small_body_and_identity_not_compressed(raw_client):
+    r = await raw_client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in r.headers
+
+    r = await raw_client.get("/big", headers={"Accept-Encoding": "gzip;q=0, identity"})
+    assert "content-encoding" not in r.headers
+    assert r.text == BIG
+
+
+@pytest.mark.anyio
+async def test_streaming_response_compressed(raw_client):
+    async with raw_client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as r:
+        assert r.headers["content-encoding"] == "gzip"
+        assert "content-length" not in r.headers
+        raw = b"".join([chunk async for chunk in r.aiter_raw()])
+    expected = "".join(f"chunk-{i};" * 50 for i in range(10))
+    assert gzip.decompress(raw).decode() == expected
+
+
+@pytest.mark.anyio
+async def test_event_stream_is_not_compressed(raw_client):
+    r = await raw_client.get("/sse", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in r.headers
+
+
+@pytest.mark.anyio
+async def test_zstd_preferred_when_available(raw_client):
+    pytest.importorskip("zstandard")
+    r = await raw_client.get("/big", headers={"Accept-Encoding": "gzip, zstd"})
+    assert r.headers["content-encoding"] == "zstd"
+    assert r.text == BIG  # httpx распаковывает zstd, если установлен zstandard
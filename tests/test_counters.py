@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import update
+
+from app.counters import reconcile_ad_counts
+from app.db import get_sessionmaker
+from app.models import User
+
+
+async def _ad_count(client, user_id: int) -> int:
+    r = await client.get(f"/user/{user_id}")
+    assert r.status_code == 200, r.text
+    return r.json()["ad_count"]
+
+
+@pytest.mark.anyio
+async def test_ad_count_follows_create_and_delete(auth_client_a, user_a):
+    assert await _ad_count(auth_client_a, user_a.id) == 0
+
+    ids = []
+    for i in range(3):
+        payload = {"title": f"Счётчик {i}", "description": "ad_count", "price": "10.00", "author": "Alice"}
+        r = await auth_client_a.post("/advertisement", json=payload)
+        assert r.status_code == 201, r.text
+        ids.append(r.json()["id"])
+    assert await _ad_count(auth_client_a, user_a.id) == 3
+
+    r = await auth_client_a.delete(f"/advertisement/{ids[0]}")
+    assert r.status_code == 204, r.text
+    # повторное удаление не уводит счётчик в минус
+    r = await auth_client_a.delete(f"/advertisement/{ids[0]}")
+    assert r.status_code == 404, r.text
+    assert await _ad_count(auth_client_a, user_a.id) == 2
+
+
+@pytest.mark.anyio
+async def test_reconcile_fixes_drift(auth_client_a, user_a):
+    payload = {"title": "Дрейф", "description": "ad_count", "price": "10.00", "author": "Alice"}
+    r = await auth_client_a.post("/advertisement", json=payload)
+    assert r.status_code == 201, r.text
+
+    async with get_sessionmaker()() as db:
+        await db.execute(update(User).where(User.id == user_a.id).values(ad_count=42))
+        await db.commit()
+    assert await _ad_count(auth_client_a, user_a.id) == 42
+
+    result = await reconcile_ad_counts(batch_size=50)
+    assert result["fixed"] >= 1
+    assert await _ad_count(auth_client_a, user_a.id) == 1
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import pytest
+
+from app.db import LazySession, get_db, get_sessionmaker
+
+
+@pytest.mark.anyio
+async def test_get_db_does_not_open_session_until_used():
+    db_gen = get_db()
+    db = await anext(db_gen)
+    assert isinstance(db, LazySession)
+    assert not db.started
+
+    # закрытие неиспользованной сессии не должно ничего делать (и ходить в БД)
+    await db_gen.aclose()
+    assert not db.started
+
+
+@pytest.mark.anyio
+async def test_lazy_session_created_on_first_access():
+    db = LazySession(get_sessionmaker())
+    assert not db.started
+
+    # любое обращение к API сессии создаёт её, но соединение ещё не берётся
+    assert not db.in_transaction()
+    assert db.started
+
+    await db.aclose()
+    assert not db.started
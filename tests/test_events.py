@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from app.events import AdvertisementEventBroker, AdvertisementFilter, Subscriber, format_sse
+
+AD = SimpleNamespace(
+    id=1,
+    title="Продам RTX 4090",
+    description="Новая, в коробке",
+    author="Alice",
+    price=Decimal("2500.00"),
+    created_at=datetime(2026, 2, 2, tzinfo=timezone.utc),
+)
+
+
+def test_filter_matches_like_search():
+    assert AdvertisementFilter().matches(AD)
+    assert AdvertisementFilter(q="rtx").matches(AD)
+    assert AdvertisementFilter(title="rtx", author="ALICE").matches(AD)
+    assert not AdvertisementFilter(title="велосипед").matches(AD)
+    assert AdvertisementFilter(price_from=Decimal("1000"), price_to=Decimal("2600")).matches(AD)
+    assert not AdvertisementFilter(price_to=Decimal("1000")).matches(AD)
+    assert not AdvertisementFilter(created_from=datetime(2026, 3, 1, tzinfo=timezone.utc)).matches(AD)
+
+
+def test_format_sse():
+    assert format_sse({"op": "deleted", "id": 7}, 3) == 'id: 3\nevent: deleted\ndata: {"op": "deleted", "id": 7}\n\n'
+
+
+@pytest.mark.anyio
+async def test_slow_subscriber_is_dropped_on_overflow():
+    broker = AdvertisementEventBroker()
+    fast = Subscriber(AdvertisementFilter(), queue_size=10)
+    slow = Subscriber(AdvertisementFilter(), queue_size=1)
+    broker._subscribers.update({fast, slow})
+
+    # удаления не требуют дочитывания строк из БД
+    await broker._dispatch([{"op": "deleted", "id": 1}, {"op": "deleted", "id": 2}])
+
+    assert fast.queue.qsize() == 2
+    assert slow.overflowed.is_set()
+    assert slow not in broker._subscribers
+    assert broker.stats()["dropped_subscribers"] == 1
+
+
+def test_naive_created_bounds_are_utc():
+    # ?created_from=2026-02-01T00:00 без смещения не должен ронять сравнение с aware created_at
+    assert AdvertisementFilter(created_from=datetime(2026, 2, 1)).matches(AD)
+    assert not AdvertisementFilter(created_from=datetime(2026, 3, 1)).matches(AD)
+    assert AdvertisementFilter(created_to=datetime(2026, 2, 2)).created_to.tzinfo is timezone.utc
+
+
+@pytest.mark.anyio
+async def test_broken_filter_does_not_drop_events_for_others(auth_client_a):
+    payload = {"title": "Лента", "description": "sse", "price": "10.00", "author": "stream"}
+    r = await auth_client_a.post("/advertisement", json=payload)
+    assert r.status_code == 201, r.text
+
+    class BrokenFilter:
+        def matches(self, ad):
+            raise TypeError("boom")
+
+    broker = AdvertisementEventBroker()
+    broken = Subscriber(BrokenFilter(), queue_size=10)
+    healthy = Subscriber(AdvertisementFilter(author="stream"), queue_size=10)
+    broker._subscribers.update({broken, healthy})
+
+    await broker._dispatch([{"op": "created", "id": r.json()["id"]}])
+
+    assert healthy.queue.get_nowait()["advertisement"]["id"] == r.json()["id"]
+    assert broken.queue.empty()
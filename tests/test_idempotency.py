@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import httpx
+import pytest
+
+from app.db import get_engine, get_sessionmaker
+from app.idempotency import (
+    DbIdempotencyStore,
+    IdempotencyConflict,
+    IdempotencyInProgress,
+    InMemoryIdempotencyStore,
+    fingerprint,
+)
+from app.main import app
+from app.models import IdempotencyKey
+
+
+@pytest.mark.anyio
+async def test_memory_store_replays_and_waits_for_first_execution():
+    store = InMemoryIdempotencyStore(ttl_seconds=60)
+    calls = 0
+    release = asyncio.Event()
+
+    async def create():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return {"id": 1}
+
+    fp = fingerprint({"title": "a"})
+    first = asyncio.ensure_future(store.run("k", fp, create, wait_timeout=1))
+    duplicate = asyncio.ensure_future(store.run("k", fp, create, wait_timeout=1))
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await first == ({"id": 1}, False)
+    assert await duplicate == ({"id": 1}, True)
+    # повтор после завершения — из сохранённого ответа
+    assert await store.run("k", fp, create, wait_timeout=1) == ({"id": 1}, True)
+    assert calls == 1
+
+    with pytest.raises(IdempotencyConflict):
+        await store.run("k", fingerprint({"title": "b"}), create, wait_timeout=1)
+
+
+@pytest.mark.anyio
+async def test_memory_store_failed_execution_releases_key():
+    store = InMemoryIdempotencyStore(ttl_seconds=60)
+
+    async def boom():
+        raise RuntimeError("db down")
+
+    async def ok():
+        return {"id": 2}
+
+    with pytest.raises(RuntimeError):
+        await store.run("k", "fp", boom, wait_timeout=1)
+    assert await store.run("k", "fp", ok, wait_timeout=1) == ({"id": 2}, False)
+
+
+@pytest.mark.anyio
+async def test_post_advertisement_with_idempotency_key(auth_client_a):
+    key = uuid4().hex
+    payload = {"title": "Идемпотентно", "description": "retry", "price": "5.00", "author": "Alice"}
+
+    r1 = await auth_client_a.post("/advertisement", json=payload, headers={"Idempotency-Key": key})
+    assert r1.status_code == 201, r1.text
+    r2 = await auth_client_a.post("/advertisement", json=payload, headers={"Idempotency-Key": key})
+    assert r2.status_code == 201, r2.text
+    assert r2.headers.get("Idempotent-Replayed") == "true"
+    assert r2.json() == r1.json()
+
+    r3 = await auth_client_a.post(
+        "/advertisement", json={**payload, "price": "6.00"}, headers={"Idempotency-Key": key}
+    )
+    assert r3.status_code == 422, r3.text
+
+    r = await auth_client_a.delete(f"/advertisement/{r1.json()['id']}")
+    assert r.status_code == 204, r.text
+
+
+@pytest.mark.anyio
+async def test_db_store_takes_over_abandoned_claim(client):
+    if get_engine().dialect.name != "postgresql":
+        pytest.skip("IDEMPOTENCY_BACKEND=db — только PostgreSQL")
+    # захват от умершего воркера: ответа нет, аренда истекла, а TTL ещё сутки
+    now = datetime.now(timezone.utc)
+    fp = fingerprint({"title": "lease"})
+    abandoned, live = f"abandoned:{uuid4().hex}", f"live:{uuid4().hex}"
+    async with get_sessionmaker()() as db:
+        for key, locked_until in ((abandoned, now - timedelta(seconds=1)), (live, now + timedelta(minutes=1))):
+            db.add(IdempotencyKey(key=key, fingerprint=fp, expires_at=now + timedelta(days=1), locked_until=locked_until))
+        await db.commit()
+
+    async def create():
+        return {"id": 3}
+
+    store = DbIdempotencyStore(ttl_seconds=3600, lease_seconds=60)
+    assert await store.run(abandoned, fp, create, wait_timeout=1) == ({"id": 3}, False)
+    assert await store.run(abandoned, fp, create, wait_timeout=1) == ({"id": 3}, True)
+
+    # аренда ещё действует — выполнение идёт, дубль ждёт и получает 409
+    with pytest.raises(IdempotencyInProgress):
+        await store.run(live, fp, create, wait_timeout=0.1)
+
+
+@pytest.mark.anyio
+async def test_anonymous_keys_are_scoped_by_client(client):
+    key = uuid4().hex
+    created = []
+    for ip in ("10.0.0.1", "10.0.0.2"):
+        transport = httpx.ASGITransport(app=app, client=(ip, 40000))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as anon:
+            payload = {"username": f"anon_{uuid4().hex[:8]}", "password": "pass_123"}
+            r = await anon.post("/user", json=payload, headers={"Idempotency-Key": key})
+            assert r.status_code == 201, r.text
+            assert "Idempotent-Replayed" not in r.headers
+            created.append(r.json()["username"])
+    assert created[0] != created[1]
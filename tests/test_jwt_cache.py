@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import time
+
+import pytest
+from jose import jwt
+
+import app.security as security
+from app.config import get_settings
+from app.security import TokenCache, create_access_token, decode_token
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = TokenCache(max_entries=2)
+    monkeypatch.setattr(security, "_token_cache", cache)
+    return cache
+
+
+def _token(exp: float) -> str:
+    settings = get_settings()
+    return jwt.encode({"sub": "1", "exp": int(exp)}, settings.jwt_secret, algorithm=settings.jwt_algorithm)
+
+
+def test_repeated_token_is_served_from_cache(cache, monkeypatch):
+    token = create_access_token(user_id=7, username="bob", group="user")
+    assert decode_token(token)["sub"] == "7"
+
+    monkeypatch.setattr(security.jwt, "decode", lambda *a, **kw: pytest.fail("jwt.decode called on cache hit"))
+    claims = decode_token(token)
+    claims["group"] = "root"  # вызывающий не может испортить закэшированное
+    assert decode_token(token)["group"] == "user"
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+
+
+def test_entry_does_not_outlive_exp(cache, monkeypatch):
+    token = _token(time.time() + 60)
+    decode_token(token)
+
+    monkeypatch.setattr(security.time, "time", lambda: time.monotonic() + 1e10)  # exp прошёл
+    assert cache.get(cache.key(token)) is None
+    assert len(cache) == 0
+
+
+def test_invalid_tokens_are_not_cached(cache):
+    for token in ("garbage", _token(time.time() - 10)):
+        with pytest.raises(ValueError):
+            decode_token(token)
+    assert len(cache) == 0
+
+
+def test_lru_eviction(cache):
+    tokens = [create_access_token(user_id=i, username=f"u{i}", group="user") for i in range(3)]
+    decode_token(tokens[0])
+    decode_token(tokens[1])
+    decode_token(tokens[0])  # 0 свежее 1
+    decode_token(tokens[2])
+
+    assert cache.get(cache.key(tokens[1])) is None
+    assert cache.get(cache.key(tokens[0])) is not None
+    assert cache.stats()["evictions"] == 1
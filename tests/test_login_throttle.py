@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+from uuid import uuid4
+
+import pytest
+
+import app.login_throttle as login_throttle
+from app.login_throttle import Bucket, InMemoryLoginThrottle, ThrottlePolicy
+
+
+def _throttle(**overrides) -> InMemoryLoginThrottle:
+    policy = dict(
+        user=Bucket(3, 1.0),
+        ip=Bucket(5, 1.0),
+        backoff_after=2,
+        backoff_base=10.0,
+        backoff_max=60.0,
+        backoff_reset=900.0,
+    )
+    policy.update(overrides)
+    return InMemoryLoginThrottle(ThrottlePolicy(**policy), max_keys=100)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(login_throttle.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_backoff_grows_exponentially_and_is_capped():
+    policy = _throttle().policy
+    assert [policy.backoff(n) for n in range(1, 7)] == [0, 10, 20, 40, 60, 60]
+
+
+@pytest.mark.anyio
+async def test_user_bucket_limits_any_ip(clock):
+    throttle = _throttle()
+    assert [await throttle.check("Bob", f"10.0.0.{i}") for i in range(3)] == [0, 0, 0]
+    assert await throttle.check("bob", "10.0.0.9") == pytest.approx(1.0)  # регистр имени не помогает
+
+    clock[0] += 1
+    assert await throttle.check("bob", "10.0.0.9") == 0
+    assert throttle.stats()["rejected"] == 1
+
+
+@pytest.mark.anyio
+async def test_ip_bucket_limits_many_usernames(clock):
+    throttle = _throttle()
+    assert all([await throttle.check(f"user{i}", "10.0.0.1") == 0 for i in range(5)])
+    assert await throttle.check("user99", "10.0.0.1") > 0
+    assert await throttle.check("user99", "10.0.0.2") == 0
+
+
+@pytest.mark.anyio
+async def test_failures_lock_the_pair_until_success(clock):
+    throttle = _throttle(user=Bucket(100, 1.0), ip=Bucket(100, 1.0))
+    for _ in range(2):
+        assert await throttle.check("bob", "10.0.0.1") == 0
+        await throttle.failure("bob", "10.0.0.1")
+
+    assert await throttle.check("bob", "10.0.0.1") == pytest.approx(10.0)
+    assert await throttle.check("bob", "10.0.0.2") == 0  # владелец с другого адреса не заблокирован
+
+    clock[0] += 10
+    assert await throttle.check("bob", "10.0.0.1") == 0
+    await throttle.failure("bob", "10.0.0.1")
+    assert await throttle.check("bob", "10.0.0.1") == pytest.approx(20.0)
+
+    clock[0] += 20
+    await throttle.success("bob", "10.0.0.1")
+    await throttle.failure("bob", "10.0.0.1")
+    assert await throttle.check("bob", "10.0.0.1") == 0
+
+
+@pytest.mark.anyio
+async def test_login_returns_429_with_retry_after(client):
+    username = f"nobody_{uuid4().hex[:8]}"
+    statuses = []
+    for _ in range(12):
+        r = await client.post("/login", json={"username": username, "password": "wrong"})
+        statuses.append(r.status_code)
+    assert statuses[:3] == [401, 401, 401]
+    assert 429 in statuses
+    assert int(r.headers["Retry-After"]) >= 1
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from uuid import uuid4
+
+import pytest
+from alembic.operations import Operations
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import text
+
+from app.db import get_engine
+from app.migrations import (
+    PROGRESS_TABLE,
+    backfill,
+    backfill_batch_sql,
+    create_index_concurrently,
+    create_index_sql,
+    index_state,
+    partition_index_name,
+    set_not_null,
+)
+
+
+def test_create_index_sql():
+    assert create_index_sql(
+        "ix_ads_views", "advertisements", ["views", "id"], where="deleted_at IS NULL", concurrently=True
+    ) == "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ads_views ON advertisements (views, id) WHERE deleted_at IS NULL"
+    assert create_index_sql("ix_ads_t", "advertisements", ["title gin_trgm_ops"], using="gin", only=True) == (
+        "CREATE INDEX IF NOT EXISTS ix_ads_t ON ONLY advertisements USING gin (title gin_trgm_ops)"
+    )
+
+
+def test_partition_index_name():
+    assert partition_index_name("ix_advertisements_views", "advertisements", "advertisements_p202601") == (
+        "ix_advertisements_views_p202601"
+    )
+    with pytest.raises(ValueError):
+        partition_index_name("ix_" + "x" * 60, "advertisements", "advertisements_p202601")
+
+
+def test_backfill_batch_sql_resumes_after_checkpoint():
+    first = backfill_batch_sql("users", "ad_count = 0", where="ad_count IS NULL")
+    assert "WHERE (ad_count IS NULL) ORDER BY id LIMIT :batch_size" in first
+    assert ":after" not in first
+
+    resumed = backfill_batch_sql("users", "ad_count = 0", where="ad_count IS NULL", resume=True)
+    assert "WHERE id > :after AND (ad_count IS NULL) ORDER BY id" in resumed
+    # обновление и контрольная точка — один оператор, одна транзакция
+    assert f"INSERT INTO {PROGRESS_TABLE}" in resumed and "RETURNING last_key, rows" in resumed
+
+
+def _migrate(sync_conn, steps) -> None:
+    with Operations.context(MigrationContext.configure(sync_conn)):
+        steps(sync_conn)
+
+
+@pytest.mark.anyio
+async def test_online_helpers_on_partitioned_table():
+    engine = get_engine()
+    if engine.dialect.name != "postgresql":
+        pytest.skip("онлайн-миграции — только PostgreSQL")
+    table = f"online_{uuid4().hex[:8]}"
+
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(
+            text(f"CREATE TABLE {table} (id int NOT NULL, part int NOT NULL, v int) PARTITION BY LIST (part)")
+        )
+        for part in (1, 2):
+            await conn.execute(text(f"CREATE TABLE {table}_p{part} PARTITION OF {table} FOR VALUES IN ({part})"))
+        await conn.execute(text(f"INSERT INTO {table} SELECT g, 1 + g % 2, NULL FROM generate_series(1, 250) g"))
+
+        def steps(sync_conn):
+            create_index_concurrently(f"ix_{table}_v", table, ["v"], where="v IS NOT NULL")
+            # повторный запуск (перезапуск упавшей миграции) — без ошибок
+            create_index_concurrently(f"ix_{table}_v", table, ["v"], where="v IS NOT NULL")
+            assert backfill(table, "v = id * 2", where="v IS NULL", batch_size=100, pause=0) == 250
+            set_not_null(table, "v")
+            assert index_state(sync_conn, f"ix_{table}_v") is True
+
+        try:
+            await conn.run_sync(_migrate, steps)
+            assert await conn.scalar(text(f"SELECT count(*) FROM {table} WHERE v = id * 2")) == 250
+            assert await conn.scalar(text(f"SELECT count(*) FROM {PROGRESS_TABLE} WHERE name LIKE '{table}%'")) == 0
+            assert await conn.scalar(
+                text(f"SELECT attnotnull FROM pg_attribute WHERE attrelid = '{table}'::regclass AND attname = 'v'")
+            )
+        finally:
+            await conn.execute(text(f"DROP TABLE {table}"))
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+import pytest
+
+from app.pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_roundtrip():
+    created = datetime(2026, 2, 2, 12, 30, tzinfo=timezone.utc)
+    cursor = encode_cursor(created, 42)
+    assert decode_cursor(cursor, (datetime, int)) == (created, 42)
+
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor", (datetime, int))
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor(created), (datetime, int))
+
+
+@pytest.mark.anyio
+async def test_owner_listing_keyset_paging(auth_client_a, user_a):
+    created_ids: list[int] = []
+    for i in range(5):
+        payload = {"title": f"Моё объявление {i}", "description": "Для пагинации", "price": "10.00", "author": "Alice"}
+        r = await auth_client_a.post("/advertisement", json=payload)
+        assert r.status_code == 201, r.text
+        created_ids.append(r.json()["id"])
+
+    seen: list[int] = []
+    params: dict = {"limit": 2}
+    while True:
+        r = await auth_client_a.get(f"/user/{user_a.id}/advertisement", params=params)
+        assert r.status_code == 200, r.text
+        seen.extend(it["id"] for it in r.json())
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        params = {"limit": 2, "cursor": cursor}
+
+    # новые сверху, без дублей и пропусков
+    assert seen == sorted(created_ids, reverse=True)
+
+    r = await auth_client_a.get(f"/user/{user_a.id}/advertisement", params={"cursor": "garbage"})
+    assert r.status_code == 400, r.text
+
+    for ad_id in created_ids:
+        r = await auth_client_a.delete(f"/advertisement/{ad_id}")
+        assert r.status_code == 204, r.text
+
+
+@pytest.mark.anyio
+async def test_reassign_requires_admin(auth_client_a, user_a, user_b):
+    r = await auth_client_a.post(f"/user/{user_a.id}/advertisement/reassign", json={"to_user_id": user_b.id})
+    assert r.status_code == 403, r.text
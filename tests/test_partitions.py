@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from datetime import date, datetime, timezone
+
+import pytest
+
+from app.db import advisory_lock, get_engine
+from app.partitions import (
+    PARTITIONS_LOCK,
+    add_months,
+    check_partition_coverage,
+    create_partition_sql,
+    ensure_partitions,
+    month_start,
+    months_covered,
+    partition_name,
+)
+
+
+def test_month_arithmetic():
+    assert month_start(datetime(2026, 2, 17, 23, 59, tzinfo=timezone.utc)) == date(2026, 2, 1)
+    assert add_months(date(2026, 11, 1), 1) == date(2026, 12, 1)
+    assert add_months(date(2026, 12, 1), 1) == date(2027, 1, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+
+
+def test_partition_sql_bounds():
+    month = date(2026, 12, 1)
+    assert partition_name(month) == "advertisements_p202612"
+    sql = create_partition_sql(month)
+    assert "PARTITION OF advertisements" in sql
+    assert "FROM ('2026-12-01 00:00:00+00') TO ('2027-01-01 00:00:00+00')" in sql
+
+
+def test_months_covered_counts_consecutive_months():
+    current = date(2026, 11, 1)
+    names = {partition_name(add_months(current, i)) for i in (0, 1, 2, 4)}
+    assert months_covered(names, current) == 2  # дыра в 2027-02 — дальше не считаем
+    assert months_covered(names - {partition_name(current)}, current) == -1
+    assert months_covered(set(), current) == -1
+
+
+@pytest.mark.anyio
+async def test_ensure_partitions_runs_in_one_worker_at_a_time():
+    engine = get_engine()
+    if engine.dialect.name != "postgresql":
+        pytest.skip("партиции — только PostgreSQL")
+
+    # замок держит "другой воркер" (другое соединение) — проход пропускается
+    async with advisory_lock(PARTITIONS_LOCK) as acquired:
+        assert acquired
+        assert await ensure_partitions(months_ahead=24) == []
+
+    await ensure_partitions(months_ahead=6)
+    assert await check_partition_coverage() >= 6
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import threading
+
+import pytest
+from sqlalchemy import select, update
+
+import app.crud
+from app.config import get_settings
+from app.crud import UserCRUD
+from app.db import get_sessionmaker
+from app.models import User
+from app.security import _make_pwd_context, hash_password, password_needs_rehash, recommend_bcrypt_rounds
+
+
+def _rounds(password_hash: str) -> int:
+    return int(password_hash.split("$")[2])
+
+
+def test_hash_uses_configured_rounds_and_flags_others():
+    rounds = get_settings().bcrypt_rounds
+    current = hash_password("secret")
+    assert _rounds(current) == rounds
+    assert not password_needs_rehash(current)
+
+    other = rounds - 1 if rounds > 4 else rounds + 1
+    assert password_needs_rehash(_make_pwd_context(other).hash("secret"))
+
+
+def test_calibration_stops_at_first_round_over_target():
+    best, measured = recommend_bcrypt_rounds(0.0, samples=1)
+    assert best == 4
+    assert [rounds for rounds, _ in measured] == [4]
+
+
+@pytest.mark.anyio
+async def test_login_rehashes_password_with_old_cost(client, user_a):
+    rounds = get_settings().bcrypt_rounds
+    old_hash = _make_pwd_context(rounds - 1 if rounds > 4 else rounds + 1).hash(user_a.password)
+    async with get_sessionmaker()() as db:
+        await db.execute(update(User).where(User.id == user_a.id).values(password_hash=old_hash))
+        await db.commit()
+
+    r = await client.post("/login", json={"username": user_a.username, "password": user_a.password})
+    assert r.status_code == 200, r.text
+
+    async with get_sessionmaker()() as db:
+        new_hash = (await db.execute(select(User.password_hash).where(User.id == user_a.id))).scalar_one()
+    assert new_hash != old_hash and _rounds(new_hash) == rounds
+
+    # тот же пароль подходит и к новому хэшу
+    r = await client.post("/login", json={"username": user_a.username, "password": user_a.password})
+    assert r.status_code == 200, r.text
+
+
+@pytest.mark.anyio
+async def test_login_bcrypt_runs_off_the_event_loop(client, user_a, monkeypatch):
+    # проверка и перехэширование на цикле событий остановили бы все запросы воркера
+    loop_thread = threading.get_ident()
+    threads = []
+
+    def spy(fn):
+        def wrapper(*args):
+            threads.append(threading.get_ident())
+            return fn(*args)
+
+        return wrapper
+
+    monkeypatch.setattr(app.crud, "verify_password", spy(app.crud.verify_password))
+    monkeypatch.setattr(app.crud, "hash_password", spy(app.crud.hash_password))
+    monkeypatch.setattr(app.crud, "password_needs_rehash", lambda password_hash: True)
+
+    async with get_sessionmaker()() as db:
+        assert await UserCRUD(db).verify_credentials(user_a.username, user_a.password) is not None
+    assert len(threads) == 2 and loop_thread not in threads
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import random
+from datetime import datetime, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import select
+
+from app.crud import SavedSearchCRUD
+from app.db import get_sessionmaker
+from app.events import AdvertisementFilter
+from app.models import SearchInboxItem
+from app.percolator import Percolator, SavedQuery, trigrams
+
+AD = SimpleNamespace(
+    id=1,
+    title="Продам RTX 4090",
+    description="Новая, в коробке",
+    author="Alice",
+    price=Decimal("2500.00"),
+    created_at=datetime(2026, 2, 2, tzinfo=timezone.utc),
+)
+
+
+def query(query_id: int, **filters) -> SavedQuery:
+    return SavedQuery(id=query_id, user_id=100 + query_id, filters=AdvertisementFilter(**filters))
+
+
+def matched_ids(percolator: Percolator, ad) -> set[int]:
+    return {q.id for q in percolator.match(ad)}
+
+
+def test_trigrams_are_case_insensitive():
+    assert trigrams("RTX") == {"rtx"}
+    assert trigrams("ab") == set()
+
+
+def test_match_by_text_short_needle_and_price():
+    p = Percolator()
+    p.add(query(1, title="rtx"))
+    p.add(query(2, q="КОРОБК"))
+    p.add(query(3, title="велосипед"))
+    p.add(query(4, author="al"))  # короче триграммы
+    p.add(query(5, price_from=Decimal("3000")))
+    p.add(query(6, price_to=Decimal("3000")))
+    p.add(query(7, title="rtx", price_to=Decimal("1000")))
+
+    assert matched_ids(p, AD) == {1, 2, 4, 6}
+    # велосипед и дорогие price-only даже не попадают в кандидаты
+    assert not {3, 5} & p.candidates(AD)
+
+
+def test_remove_and_readd():
+    p = Percolator()
+    p.add(query(1, title="rtx"))
+    p.add(query(2, price_to=Decimal("3000")))
+    p.remove(1)
+    p.remove(2)
+    p.remove(42)  # неизвестный id — не ошибка
+    assert matched_ids(p, AD) == set()
+    assert p.stats()["saved_searches"] == 0
+
+    p.add(query(1, title="4090"))
+    p.add(query(1, title="велосипед"))  # повторный add заменяет поиск
+    assert matched_ids(p, AD) == set()
+    assert len(p) == 1
+
+
+def test_replace_all():
+    p = Percolator()
+    p.add(query(1, title="велосипед"))
+    p.replace_all([query(2, title="rtx")])
+    assert matched_ids(p, AD) == {2}
+
+
+def test_replace_all_keeps_changes_made_during_reload():
+    p = Percolator()
+    p.add(query(1, title="rtx"))
+    p.add(query(2, title="4090"))
+    p.begin_reload()
+    # пока читается снимок, этот воркер создал поиск 3 и удалил поиск 2 — в снимке их ещё нет/ещё есть
+    p.add(query(3, q="коробке"))
+    p.remove(2)
+    p.replace_all([query(1, title="rtx"), query(2, title="4090")])
+    assert matched_ids(p, AD) == {1, 3}
+
+    # без begin_reload — обычная полная замена
+    p.add(query(4, author="alice"))
+    p.replace_all([query(1, title="rtx")])
+    assert matched_ids(p, AD) == {1}
+
+
+def test_same_result_as_naive_scan():
+    rng = random.Random(7)
+    words = ["rtx", "4090", "коробке", "alice", "диван", "ноутбук", "ok", "x"]
+    queries = []
+    for i in range(500):
+        filters = {}
+        if rng.random() < 0.8:
+            filters[rng.choice(["title", "description", "author", "q"])] = rng.choice(words)
+        if rng.random() < 0.4:
+            filters["price_from"] = Decimal(rng.randint(0, 5000))
+        if rng.random() < 0.4:
+            filters["price_to"] = Decimal(rng.randint(0, 5000))
+        queries.append(query(i, **filters))
+
+    p = Percolator()
+    p.replace_all(queries)
+    for price in ("10", "2500.00", "4999"):
+        ad = SimpleNamespace(**{**vars(AD), "price": Decimal(price)})
+        assert matched_ids(p, ad) == {q.id for q in queries if q.filters.matches(ad)}
+
+
+@pytest.mark.anyio
+async def test_inbox_skips_saved_search_deleted_elsewhere(client, user_a, user_b):
+    # индекс этого воркера ещё знает удалённый поиск — остальные совпадения всё равно доходят
+    async with get_sessionmaker()() as db:
+        crud = SavedSearchCRUD(db)
+        live = await crud.create(user_id=user_a.id, name="live", title="rtx")
+        stale = await crud.create(user_id=user_b.id, name="stale", title="rtx")
+        await db.delete(stale)
+        await db.commit()
+
+        ad_id = 10**9 + random.randrange(10**6)
+        await crud.add_inbox_items(
+            [
+                {"user_id": user_a.id, "saved_search_id": live.id, "advertisement_id": ad_id},
+                {"user_id": user_b.id, "saved_search_id": stale.id, "advertisement_id": ad_id},
+            ]
+        )
+        items = (await db.execute(select(SearchInboxItem).where(SearchInboxItem.advertisement_id == ad_id))).scalars()
+        assert [(item.user_id, item.saved_search_id) for item in items] == [(user_a.id, live.id)]
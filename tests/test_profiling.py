@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import httpx
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+import app.profiling as profiling
+from app.crud import UserCRUD
+from app.profiling import PROFILE_ID_HEADER, ProfileStore, ProfilingMiddleware, ProfilingToggle
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = ProfileStore(tmp_path, max_files=2)
+    monkeypatch.setattr(profiling, "_store", store)
+    return store
+
+
+@pytest.fixture
+def toggle(monkeypatch):
+    toggle = ProfilingToggle()
+    monkeypatch.setattr(profiling, "profiling_toggle", toggle)
+    return toggle
+
+
+def _meta(profile_id: str, started_at: str) -> dict:
+    return {"id": profile_id, "started_at": started_at, "sql": [], "summary": "", "artifact": f"{profile_id}.prof"}
+
+
+def test_store_keeps_newest_files(store):
+    for i in range(3):
+        store.save(_meta(f"{i:032x}", f"2026-01-0{i + 1}T00:00:00+00:00"), b"x")
+
+    assert [m["id"] for m in store.list()] == [f"{2:032x}", f"{1:032x}"]
+    assert store.get(f"{0:032x}") is None
+    assert store.artifact_path(f"{0:032x}") is None  # удалён вместе с метаданными
+    assert store.artifact_path(f"{2:032x}").read_bytes() == b"x"
+
+
+def test_toggle_limits_path_and_count(toggle):
+    assert toggle.take("/advertisement") is None
+
+    toggle.enable(seconds=60, mode="cprofile", path_prefix="/advertisement", max_profiles=1)
+    assert toggle.take("/user/1") is None
+    assert toggle.take("/advertisement/5") == "cprofile"
+    assert toggle.take("/advertisement/6") is None  # лимит исчерпан
+    assert toggle.state()["active"] is False
+
+
+@pytest.mark.anyio
+async def test_middleware_records_call_tree_and_sql(store, toggle):
+    engine = create_async_engine("sqlite+aiosqlite://")
+
+    async def endpoint(request):
+        async with engine.connect() as conn:
+            value = (await conn.execute(text("SELECT 42"))).scalar_one()
+        return JSONResponse({"value": value})
+
+    asgi = ProfilingMiddleware(Starlette(routes=[Route("/answer", endpoint)]))
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi), base_url="http://test") as client:
+            plain = await client.get("/answer")
+            assert PROFILE_ID_HEADER not in plain.headers
+
+            toggle.enable(seconds=60, mode="cprofile", path_prefix=None, max_profiles=1)
+            profiled = await client.get("/answer")
+    finally:
+        await engine.dispose()
+
+    assert profiled.json() == {"value": 42}
+    meta = store.get(profiled.headers[PROFILE_ID_HEADER])
+    assert meta["status_code"] == 200 and meta["path"] == "/answer"
+    assert [q["statement"] for q in meta["sql"]] == ["SELECT 42"]
+    assert "endpoint" in meta["summary"]
+    assert store.artifact_path(meta["id"]).suffix == ".prof"
+    assert profiling.sql_capture._users == 0  # слушатели SQLAlchemy сняты
+
+
+@pytest.mark.anyio
+async def test_header_without_admin_token_is_ignored(store, toggle):
+    async def endpoint(request):
+        return JSONResponse({})
+
+    asgi = ProfilingMiddleware(Starlette(routes=[Route("/ping", endpoint)]))
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi), base_url="http://test") as client:
+        response = await client.get("/ping", headers={"X-Profile": "1"})
+
+    assert PROFILE_ID_HEADER not in response.headers
+    assert store.list() == []
+
+
+@pytest.mark.anyio
+async def test_header_with_forged_token_does_not_touch_db(store, toggle, monkeypatch):
+    def no_db():
+        raise AssertionError("profiling check must not open a DB session for an unauthenticated request")
+
+    monkeypatch.setattr(profiling, "get_sessionmaker", no_db)
+
+    async def endpoint(request):
+        return JSONResponse({})
+
+    asgi = ProfilingMiddleware(Starlette(routes=[Route("/ping", endpoint)]))
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi), base_url="http://test") as client:
+        for authorization in ("Bearer not-a-jwt", "Basic YTpi", "Bearer "):
+            response = await client.get("/ping", headers={"X-Profile": "1", "Authorization": authorization})
+            assert response.status_code == 200
+            assert PROFILE_ID_HEADER not in response.headers
+    assert store.list() == []
+
+
+@pytest.mark.anyio
+async def test_header_check_user_is_reused_by_request(client, user_a, store, toggle, monkeypatch):
+    # пользователь, найденный middleware, переиспользует get_current_user: один запрос к users, а не два
+    calls = []
+    original = UserCRUD.get
+
+    async def counting_get(self, user_id):
+        calls.append(user_id)
+        return await original(self, user_id)
+
+    monkeypatch.setattr(UserCRUD, "get", counting_get)
+    headers = {"Authorization": f"Bearer {user_a.token}", "X-Profile": "1"}
+    r = await client.get("/admin/metrics", headers=headers)
+    assert r.status_code == 403, r.text  # не admin: профиль не снимается
+    assert PROFILE_ID_HEADER not in r.headers
+    assert calls == [user_a.id]
+
+
+@pytest.mark.anyio
+async def test_busy_cprofile_does_not_spend_toggle_budget(store, toggle):
+    async def endpoint(request):
+        return JSONResponse({})
+
+    asgi = ProfilingMiddleware(Starlette(routes=[Route("/ping", endpoint)]))
+    toggle.enable(seconds=60, mode="cprofile", path_prefix=None, max_profiles=1)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi), base_url="http://test") as client:
+        asgi._cprofile_busy = True  # идёт другой cProfile-профиль
+        assert PROFILE_ID_HEADER not in (await client.get("/ping")).headers
+        assert toggle.state()["remaining_profiles"] == 1
+
+        asgi._cprofile_busy = False
+        assert PROFILE_ID_HEADER in (await client.get("/ping")).headers
+        assert toggle.state()["remaining_profiles"] == 0
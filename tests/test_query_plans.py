@@ -0,0 +1,138 @@
+# Регрессии планов поиска: для каждой формы запроса AdvertisementCRUD.search
+# на засеянных данных смотрим EXPLAIN и падаем, если планировщик ушёл в Seq Scan
+# по непустой партиции advertisements. Данные засеваются в транзакции и откатываются.
+# Автодополнение (suggest_stmt) дополнительно не должно сортировать совпадения.
+
+from __future__ import annotations
+
+import json
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from app.crud import AdvertisementCRUD
+from app.db import get_engine, get_sessionmaker
+
+SEED_ROWS = 50_000
+
+_now = datetime.now(timezone.utc)
+
+SEARCH_SHAPES: dict[str, dict] = {
+    "newest": {},
+    "price_range": {"price_from": Decimal("100"), "price_to": Decimal("120")},
+    "price_from": {"price_from": Decimal("9900")},
+    "created_range": {"created_from": _now - timedelta(hours=1), "created_to": _now},
+    "price_and_created": {
+        "price_from": Decimal("100"),
+        "price_to": Decimal("200"),
+        "created_from": _now - timedelta(hours=6),
+    },
+    "title": {"title": "rtx 4090"},
+    "description": {"description": "коробке"},
+    "author": {"author": "seller_00042"},
+    "q": {"q": "велосипед"},
+    "q_and_price": {"q": "велосипед", "price_to": Decimal("500")},
+    "deep_page": {"offset": 2000, "limit": 50},
+    "oldest": {"sort": "oldest"},
+    "price_asc": {"sort": "price_asc"},
+    "price_desc": {"sort": "price_desc"},
+    "price_asc_cursor": {"sort": "price_asc", "after": (Decimal("5000"), 25_000)},
+    "newest_cursor": {"after": (_now - timedelta(days=3), 25_000)},
+    "price_desc_cursor_and_q": {"sort": "price_desc", "after": (Decimal("5000"), 25_000), "q": "велосипед"},
+}
+
+
+SEED_SQL = f"""
+INSERT INTO advertisements (title, description, price, author, created_at)
+SELECT
+    CASE WHEN g % 500 = 0 THEN 'Продам RTX 4090 #' || g
+         WHEN g % 700 = 0 THEN 'Горный велосипед #' || g
+         ELSE 'Объявление #' || g END,
+    CASE WHEN g % 900 = 0 THEN 'Новая, в коробке' ELSE 'Описание товара номер ' || g END,
+    (g % 10000) + 0.99,
+    'seller_' || lpad((g % 5000)::text, 5, '0'),
+    -- всё в текущем месяце: партиции прошлых месяцев могут не существовать
+    greatest(date_trunc('month', now()), now() - (g || ' seconds')::interval)
+FROM generate_series(1, {SEED_ROWS}) AS g
+"""
+
+
+def _walk(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _walk(child)
+
+
+def _compile(stmt) -> str:
+    return str(stmt.compile(dialect=postgresql.asyncpg.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+async def _explain(session, stmt) -> dict:
+    res = await session.execute(text("EXPLAIN (FORMAT JSON) " + _compile(stmt)))
+    raw = res.scalar_one()
+    return (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+
+
+async def _populated_partitions(session) -> set[str]:
+    # после ANALYZE пустые (будущие) партиции честно дешевле читать Seq Scan-ом — их не считаем
+    res = await session.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'advertisements'::regclass AND c.reltuples > 0"
+        )
+    )
+    return {row[0] for row in res} | {"advertisements"}
+
+
+@pytest.fixture
+async def seeded_session():
+    if get_engine().dialect.name != "postgresql":
+        pytest.skip("EXPLAIN-регрессии имеют смысл только для PostgreSQL")
+
+    Session = get_sessionmaker()
+    async with Session() as session:
+        await session.execute(text(SEED_SQL))
+        await session.execute(text("ANALYZE advertisements"))
+        try:
+            yield session
+        finally:
+            await session.rollback()
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("shape", sorted(SEARCH_SHAPES))
+async def test_search_plan_avoids_seq_scan(seeded_session, shape):
+    stmt = AdvertisementCRUD(seeded_session).search_stmt(**SEARCH_SHAPES[shape])
+    plan = await _explain(seeded_session, stmt)
+    populated = await _populated_partitions(seeded_session)
+
+    seq_scans = [
+        node["Relation Name"]
+        for node in _walk(plan)
+        if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in populated
+    ]
+    assert not seq_scans, f"{shape}: plan regressed to Seq Scan on {seq_scans}\n{json.dumps(plan, indent=2)}"
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("prefix", ["о", "объявление #1", "продам rtx"])
+async def test_suggest_plan_reads_index_in_order(seeded_session, prefix):
+    # "о" совпадает почти со всеми строками: без порядка из индекса это Sort всех совпадений ради limit
+    stmt = AdvertisementCRUD(seeded_session).suggest_stmt(prefix, limit=10)
+    plan = await _explain(seeded_session, stmt)
+    populated = await _populated_partitions(seeded_session)
+
+    nodes = list(_walk(plan))
+    sorts = [node["Node Type"] for node in nodes if node["Node Type"] in ("Sort", "Incremental Sort")]
+    seq_scans = [
+        node["Relation Name"]
+        for node in nodes
+        if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in populated
+    ]
+    indexes = {node.get("Index Name", "") for node in nodes}
+    assert not sorts, f"{prefix!r}: suggest plan sorts matches\n{json.dumps(plan, indent=2)}"
+    assert not seq_scans, f"{prefix!r}: suggest plan regressed to Seq Scan on {seq_scans}"
+    assert any(name.startswith("ix_advertisements_title_lower_c") for name in indexes), indexes
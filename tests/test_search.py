@@ -1,9 +1,14 @@
 from __future__ import annotations
 
+from datetime import datetime
 from decimal import Decimal
+from types import SimpleNamespace
+from uuid import uuid4
 
 import pytest
 
+from app.events import AdvertisementFilter
+
 
 @pytest.mark.anyio
 async def test_search_filters(auth_client_a):
@@ -47,3 +52,81 @@ async def test_search_filters(auth_client_a):
     for ad_id in created_ids:
         r = await auth_client_a.delete(f"/advertisement/{ad_id}")
         assert r.status_code == 204, r.text
+
+
+@pytest.mark.anyio
+async def test_search_sort_and_cursor(auth_client_a):
+    author = f"sorter_{uuid4().hex[:8]}"
+    prices = ["30.00", "10.00", "20.00", "10.00", "40.00"]
+    created_ids: list[int] = []
+    for price in prices:
+        r = await auth_client_a.post(
+            "/advertisement", json={"title": "Сортировка", "description": "sort", "price": price, "author": author}
+        )
+        assert r.status_code == 201, r.text
+        created_ids.append(r.json()["id"])
+
+    async def walk(sort: str) -> list[dict]:
+        seen: list[dict] = []
+        params = {"author": author, "sort": sort, "limit": 2}
+        while True:
+            r = await auth_client_a.get("/advertisement", params=params)
+            assert r.status_code == 200, r.text
+            seen.extend(r.json())
+            cursor = r.headers.get("X-Next-Cursor")
+            if not cursor:
+                return seen
+            params = {"author": author, "sort": sort, "limit": 2, "cursor": cursor}
+
+    by_price = await walk("price_asc")
+    assert [(Decimal(it["price"]), it["id"]) for it in by_price] == sorted(
+        (Decimal(p), ad_id) for p, ad_id in zip(prices, created_ids)
+    )
+    assert [it["id"] for it in await walk("price_desc")] == [it["id"] for it in reversed(by_price)]
+    assert [it["id"] for it in await walk("oldest")] == created_ids
+    assert [it["id"] for it in await walk("newest")] == created_ids[::-1]
+
+    # курсор одной сортировки не подходит к другой, и не сочетается с offset
+    r = await auth_client_a.get("/advertisement", params={"author": author, "sort": "price_asc", "limit": 2})
+    cursor = r.headers["X-Next-Cursor"]
+    r = await auth_client_a.get("/advertisement", params={"author": author, "sort": "newest", "cursor": cursor})
+    assert r.status_code == 400, r.text
+    r = await auth_client_a.get("/advertisement", params={"sort": "price_asc", "cursor": cursor, "offset": 5})
+    assert r.status_code == 400, r.text
+    r = await auth_client_a.get("/advertisement", params={"sort": "cheapest"})
+    assert r.status_code == 422, r.text
+
+    for ad_id in created_ids:
+        r = await auth_client_a.delete(f"/advertisement/{ad_id}")
+        assert r.status_code == 204, r.text
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("field", ["title", "q"])
+async def test_search_treats_like_wildcards_literally(auth_client_a, field):
+    # %, _ и \ в тексте поиска — обычные символы, как в фильтре ленты и перколятора
+    author = f"wild_{uuid4().hex[:8]}"
+    titles = ["Скидка 50%_off", "500 offers", "C:\\temp", "C:/temp"]
+    ads = []
+    for title in titles:
+        r = await auth_client_a.post(
+            "/advertisement", json={"title": title, "description": "like", "price": "10.00", "author": author}
+        )
+        assert r.status_code == 201, r.text
+        ads.append(r.json())
+
+    for needle, expected in (("50%_off", {titles[0]}), ("c:\\t", {titles[2]}), ("%", {titles[0]})):
+        r = await auth_client_a.get("/advertisement", params={field: needle, "author": author})
+        assert r.status_code == 200, r.text
+        assert {it["title"] for it in r.json()} == expected, needle
+
+        stream = AdvertisementFilter(**{field: needle})
+        rows = [
+            SimpleNamespace(**{**ad, "price": Decimal(ad["price"]), "created_at": datetime.fromisoformat(ad["created_at"])})
+            for ad in ads
+        ]
+        assert {row.title for row in rows if stream.matches(row)} == expected, needle
+
+    for ad in ads:
+        r = await auth_client_a.delete(f"/advertisement/{ad['id']}")
+        assert r.status_code == 204, r.text
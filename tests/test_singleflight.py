@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.singleflight import SingleFlight
+
+
+@pytest.mark.anyio
+async def test_concurrent_calls_share_one_execution():
+    sf = SingleFlight("test")
+    calls = 0
+    release = asyncio.Event()
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return {"id": 1}
+
+    waiters = [asyncio.ensure_future(sf.do(1, load)) for _ in range(50)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters)
+
+    assert calls == 1
+    assert all(r is results[0] for r in results)
+    assert sf.stats() == {"requests": 50, "executed": 1, "collapsed": 49, "timeouts": 0, "in_flight": 0}
+
+    # ключ забыт после завершения — это не кэш
+    await sf.do(1, load)
+    assert calls == 2
+
+
+@pytest.mark.anyio
+async def test_errors_are_shared_and_not_cached():
+    sf = SingleFlight("test")
+
+    async def boom():
+        await asyncio.sleep(0)
+        raise RuntimeError("db down")
+
+    results = await asyncio.gather(*(sf.do("k", boom) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert sf.executed == 1
+    assert sf.in_flight == 0
+
+
+@pytest.mark.anyio
+async def test_timeout_forgets_key():
+    sf = SingleFlight("test")
+    never = asyncio.Event()
+
+    async def hang():
+        await never.wait()
+
+    with pytest.raises(asyncio.TimeoutError):
+        await sf.do("slow", hang, timeout=0.01)
+    assert sf.timeouts == 1
+    assert sf.in_flight == 0
+
+    async def fast():
+        return 42
+
+    # следующий вызов не присоединяется к зависшему запросу
+    assert await sf.do("slow", fast) == 42
+    never.set()
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select, update
+
+from app.db import get_sessionmaker
+from app.models import Advertisement, PurgedAdvertisement
+from app.purge import purge_once
+
+
+async def _create(client, **extra) -> dict:
+    payload = {"title": "Мягкое удаление", "description": "soft delete", "price": "10.00", "author": "Alice", **extra}
+    r = await client.post("/advertisement", json=payload)
+    assert r.status_code == 201, r.text
+    return r.json()
+
+
+async def _row(ad_id: int) -> Advertisement | None:
+    async with get_sessionmaker()() as db:
+        return (await db.execute(select(Advertisement).where(Advertisement.id == ad_id))).scalar_one_or_none()
+
+
+@pytest.mark.anyio
+async def test_delete_hides_ad_and_purge_removes_it(auth_client_a, user_a):
+    ad = await _create(auth_client_a)
+
+    r = await auth_client_a.delete(f"/advertisement/{ad['id']}")
+    assert r.status_code == 204, r.text
+
+    # строка ещё в таблице, но для API её нет
+    row = await _row(ad["id"])
+    assert row is not None and row.deleted_at is not None
+    assert (await auth_client_a.get(f"/advertisement/{ad['id']}")).status_code == 404
+    assert (await auth_client_a.delete(f"/advertisement/{ad['id']}")).status_code == 404
+    assert (await auth_client_a.patch(f"/advertisement/{ad['id']}", json={"title": "x"})).status_code == 404
+    r = await auth_client_a.get(f"/user/{user_a.id}/advertisement")
+    assert ad["id"] not in {it["id"] for it in r.json()}
+
+    result = await purge_once(retention=timedelta(0))
+    assert result["purged"] >= 1
+    assert await _row(ad["id"]) is None
+
+
+@pytest.mark.anyio
+async def test_expired_ad_is_hidden_then_marked_deleted(auth_client_a):
+    r = await auth_client_a.post(
+        "/advertisement",
+        json={
+            "title": "Истекает",
+            "description": "expires",
+            "price": "10.00",
+            "author": "Alice",
+            "expires_at": (datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat(),
+        },
+    )
+    assert r.status_code == 422, r.text
+
+    ad = await _create(auth_client_a, expires_at=(datetime.now(timezone.utc) + timedelta(hours=1)).isoformat())
+    assert (await auth_client_a.get(f"/advertisement/{ad['id']}")).status_code == 200
+
+    # срок истёк: сдвигаем expires_at в прошлое прямо в БД, без ожидания по часам
+    async with get_sessionmaker()() as db:
+        await db.execute(
+            update(Advertisement)
+            .where(Advertisement.id == ad["id"])
+            .values(expires_at=datetime.now(timezone.utc) - timedelta(minutes=1))
+        )
+        await db.commit()
+    assert (await auth_client_a.get(f"/advertisement/{ad['id']}")).status_code == 404
+
+    # purge помечает истёкшее удалённым; с retention по умолчанию физически ещё не удаляет
+    result = await purge_once()
+    assert result["expired"] >= 1
+    row = await _row(ad["id"])
+    assert row is not None and row.deleted_at == row.expires_at
+
+
+@pytest.mark.anyio
+async def test_purge_archives_max_length_author(auth_client_a):
+    # author до 120 символов (схема API) должен помещаться и в архив
+    ad = await _create(auth_client_a, author="a" * 120)
+    assert (await auth_client_a.delete(f"/advertisement/{ad['id']}")).status_code == 204
+
+    result = await purge_once(retention=timedelta(0), archive=True)
+    assert result["purged"] >= 1
+    async with get_sessionmaker()() as db:
+        archived = await db.scalar(select(PurgedAdvertisement).where(PurgedAdvertisement.id == ad["id"]))
+    assert archived is not None and archived.author == "a" * 120
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from datetime import date
+from decimal import Decimal
+from uuid import uuid4
+
+import pytest
+
+from app.crud import day_ranges
+from app.db import advisory_lock, get_engine
+from app.rollups import ROLLUP_LOCK, refresh_stats_once
+
+
+@pytest.mark.anyio
+async def test_stats_rollup_follows_changes(auth_client_a):
+    if get_engine().dialect.name != "postgresql":
+        pytest.skip("сводка статистики (percentile_cont, GROUPING SETS) — только PostgreSQL")
+    author = f"stats_{uuid4().hex[:8]}"
+    ids = []
+    for price in ("10.00", "20.00", "30.00", "40.00"):
+        payload = {"title": "Статистика", "description": "rollup", "price": price, "author": author}
+        r = await auth_client_a.post("/advertisement", json=payload)
+        assert r.status_code == 201, r.text
+        ids.append(r.json()["id"])
+
+    assert await refresh_stats_once() >= 1
+    r = await auth_client_a.get("/advertisement/stats", params={"author": author})
+    assert r.status_code == 200, r.text
+    (today,) = r.json()
+    assert today["author"] == author
+    assert today["count"] == 4
+    assert Decimal(today["price_min"]) == Decimal("10") and Decimal(today["price_max"]) == Decimal("40")
+    assert Decimal(today["price_avg"]) == Decimal("25")
+    assert Decimal(today["price_p50"]) == Decimal("25")
+
+    # все авторы за день включают наши объявления
+    r = await auth_client_a.get("/advertisement/stats")
+    assert r.status_code == 200, r.text
+    assert r.json()[-1]["author"] is None and r.json()[-1]["count"] >= 4
+
+    # изменения подхватываются следующим проходом (по водяному знаку)
+    assert (await auth_client_a.delete(f"/advertisement/{ids[-1]}")).status_code == 204
+    await refresh_stats_once()
+    (today,) = (await auth_client_a.get("/advertisement/stats", params={"author": author})).json()
+    assert today["count"] == 3
+    assert Decimal(today["price_max"]) == Decimal("30")
+
+
+@pytest.mark.anyio
+async def test_stats_rejects_bad_range(client):
+    r = await client.get("/advertisement/stats", params={"date_from": "2026-02-02", "date_to": "2026-02-01"})
+    assert r.status_code == 422, r.text
+    r = await client.get("/advertisement/stats", params={"date_from": "2024-01-01", "date_to": "2026-02-01"})
+    assert r.status_code == 422, r.text
+
+
+def test_day_ranges_merge_only_contiguous_days():
+    assert day_ranges([]) == []
+    assert day_ranges([date(2026, 3, 2), date(2026, 3, 1), date(2026, 3, 3), date(2026, 3, 2)]) == [
+        (date(2026, 3, 1), date(2026, 3, 4))
+    ]
+    # правка годовой давности и сегодняшняя — два коротких скана, а не год
+    assert day_ranges([date(2025, 10, 19), date(2026, 10, 19)]) == [
+        (date(2025, 10, 19), date(2025, 10, 20)),
+        (date(2026, 10, 19), date(2026, 10, 20)),
+    ]
+
+
+@pytest.mark.anyio
+async def test_stats_rollup_skips_pass_while_another_worker_holds_the_lock():
+    if get_engine().dialect.name != "postgresql":
+        pytest.skip("advisory lock — только PostgreSQL")
+    # другой процесс — другое соединение: его замок этот проход не получит
+    async with advisory_lock(ROLLUP_LOCK) as acquired:
+        assert acquired
+        assert await refresh_stats_once(full=True) == 0
+    assert await refresh_stats_once() >= 0
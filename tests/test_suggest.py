@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+from uuid import uuid4
+
+import pytest
+
+from app.suggest import SuggestCache, normalize_prefix
+
+
+def test_normalize_prefix():
+    assert normalize_prefix("  iPhone   15 ") == "iphone 15"
+
+
+def test_cache_is_bounded_lru():
+    cache = SuggestCache(max_entries=2, ttl=60, max_prefix_len=6)
+    cache.put("a", ["A1"])
+    cache.put("b", ["B1"])
+    assert cache.get("a") == ["A1"]  # "a" стал свежее "b"
+    cache.put("c", ["C1"])
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == ["A1"] and cache.get("c") == ["C1"]
+
+    cache.put("too-long-prefix", ["X"])  # длинные префиксы не кэшируются
+    assert cache.get("too-long-prefix") is None
+
+
+def test_cache_ttl_and_invalidation():
+    cache = SuggestCache(max_entries=10, ttl=0, max_prefix_len=6)
+    cache.put("a", ["A1"])
+    assert cache.get("a") is None  # истёк
+
+    cache = SuggestCache(max_entries=10, ttl=60, max_prefix_len=3)
+    for prefix in ("i", "ip", "iph", "x"):
+        cache.put(prefix, ["iPhone"])
+    cache.invalidate_title("iPhone 15")
+    assert len(cache) == 1 and cache.get("x") == ["iPhone"]
+    assert cache.stats()["invalidations"] == 3
+
+
+@pytest.mark.anyio
+async def test_suggest_endpoint(auth_client_a):
+    base = f"Zq{uuid4().hex[:6]}"
+    for title in (f"{base} велосипед", f"{base} велосипед", f"{base} ноутбук", f"{base.upper()} Диван"):
+        payload = {"title": title, "description": "suggest", "price": "10.00", "author": "Alice"}
+        r = await auth_client_a.post("/advertisement", json=payload)
+        assert r.status_code == 201, r.text
+
+    r = await auth_client_a.get("/advertisement/suggest", params={"prefix": base.lower()})
+    assert r.status_code == 200, r.text
+    # регистронезависимо, без дублей, по алфавиту
+    expected = [f"{base} велосипед", f"{base} диван", f"{base} ноутбук"]
+    assert [t.lower() for t in r.json()] == [t.lower() for t in expected]
+
+    r = await auth_client_a.get("/advertisement/suggest", params={"prefix": base, "limit": 1})
+    assert len(r.json()) == 1
+
+    # новое объявление сбрасывает закэшированные префиксы своего заголовка
+    r = await auth_client_a.post(
+        "/advertisement",
+        json={"title": f"{base} абажур", "description": "suggest", "price": "10.00", "author": "Alice"},
+    )
+    assert r.status_code == 201, r.text
+    r = await auth_client_a.get("/advertisement/suggest", params={"prefix": base})
+    assert r.json()[0].lower() == f"{base} абажур".lower()
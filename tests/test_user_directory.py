@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import update
+
+from app.db import get_sessionmaker
+from app.models import User
+
+
+@pytest.fixture
+async def admin_client(auth_client_a, user_a):
+    # справочник — только для admin: повышаем user_a прямо в БД (группа читается из БД на каждый запрос)
+    async with get_sessionmaker()() as db:
+        await db.execute(update(User).where(User.id == user_a.id).values(group="admin"))
+        await db.commit()
+    return auth_client_a
+
+
+@pytest.mark.anyio
+async def test_username_prefix_paged_by_cursor(admin_client, client):
+    prefix = f"dir{uuid4().hex[:6]}"
+    usernames = []
+    for i in range(5):
+        r = await client.post("/user", json={"username": f"{prefix}_{i}", "password": "pass_123"})
+        assert r.status_code == 201, r.text
+        usernames.append(r.json()["username"])
+
+    seen, cursor = [], None
+    for _ in range(5):
+        params = {"username_prefix": prefix, "sort": "username", "limit": 2, "view": "compact"}
+        if cursor:
+            params["cursor"] = cursor
+        r = await admin_client.get("/user", params=params)
+        assert r.status_code == 200, r.text
+        page = r.json()
+        assert all(set(item) == {"id", "username", "group"} for item in page)
+        seen += [item["username"] for item in page]
+        cursor = r.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert seen == sorted(usernames)
+
+
+@pytest.mark.anyio
+async def test_group_filter_and_cursor_validation(admin_client, user_a, user_b):
+    r = await admin_client.get("/user", params={"group": "admin", "limit": 200})
+    assert r.status_code == 200, r.text
+    ids = [item["id"] for item in r.json()]
+    assert user_a.id in ids and user_b.id not in ids
+    assert ids == sorted(ids)
+
+    r = await admin_client.get("/user", params={"sort": "id", "limit": 1})
+    cursor = r.headers["X-Next-Cursor"]
+    r = await admin_client.get("/user", params={"sort": "-ad_count", "cursor": cursor})
+    assert r.status_code == 400, r.text
+    r = await admin_client.get("/user", params={"cursor": cursor, "offset": 10})
+    assert r.status_code == 400, r.text
+
+
+@pytest.mark.anyio
+async def test_directory_requires_admin(auth_client_b):
+    r = await auth_client_b.get("/user", params={"username_prefix": "a"})
+    assert r.status_code == 403, r.text
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("sort", ["ad_count", "-ad_count"])
+async def test_compact_view_pages_by_ad_count(admin_client, client, sort):
+    # курсор строится из ad_count — compact-выборка обязана его читать
+    prefix = f"cmp{uuid4().hex[:6]}"
+    ids = []
+    for i in range(3):
+        r = await client.post("/user", json={"username": f"{prefix}_{i}", "password": "pass_123"})
+        assert r.status_code == 201, r.text
+        ids.append(r.json()["id"])
+
+    seen, cursor = [], None
+    for _ in range(5):
+        params = {"username_prefix": prefix, "sort": sort, "limit": 2, "view": "compact"}
+        if cursor:
+            params["cursor"] = cursor
+        r = await admin_client.get("/user", params=params)
+        assert r.status_code == 200, r.text
+        assert all(set(item) == {"id", "username", "group"} for item in r.json())
+        seen += [item["id"] for item in r.json()]
+        cursor = r.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert seen == ids  # у всех ad_count = 0 — порядок по id